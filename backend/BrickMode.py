@@ -1,6 +1,17 @@
-from flask import jsonify, send_from_directory, request
+from flask import jsonify, request
 import os
-from database.db_helper import get_connection, set_brick_completed, get_completed_bricks
+from database.db_helper import (db_connection, db_pool, set_brick_completed, get_completed_bricks, get_content_version,
+                                bump_content_version, query_bricks, get_group_words, BRICK_KEY_COLUMNS)
+from image_variants import IMMUTABLE_CACHE_CONTROL, image_sources, manifest_version
+from media import serve_media
+from media_index import media_index
+from leaderboard import leaderboard
+from write_behind import score_queue
+from response_cache import get_payload, encode_payload, payload_response, response_cache_stats
+from pagination import BadQuery, int_arg, bool_arg, page_args, fields_arg, select_fields, page_body
+
+BRICK_FIELDS = ('group_id', 'brick', 'brick_language', 'definition', 'definition_language', 'level', 'image_url',
+                'image_sources', 'image_width', 'image_height', 'words', 'completed')
 
 def register_brick_routes(app):
     @app.route('/api/test', methods=['GET'])
@@ -17,72 +28,55 @@ def register_brick_routes(app):
             'database_path': db_path,
             'database_exists': db_exists,
             'current_directory': os.getcwd(),
-            'files_in_database_dir': os.listdir(os.path.join(os.path.dirname(__file__), 'database')) if os.path.exists(os.path.join(os.path.dirname(__file__), 'database')) else 'database folder not found'
+            'files_in_database_dir': os.listdir(os.path.join(os.path.dirname(__file__), 'database')) if os.path.exists(os.path.join(os.path.dirname(__file__), 'database')) else 'database folder not found',
+            'media_index': media_index.summary(),
+            'response_cache': response_cache_stats(),
+            'db_pool': db_pool.stats(),
+            'leaderboard': leaderboard.stats(),
+            'score_write_behind': score_queue.stats()
         })
     
     # Serve images from the data/images folder
     @app.route('/data/images/<path:filename>')
     def serve_image(filename):
-        image_dir = os.path.join(os.path.dirname(__file__), 'data', 'images')
-        return send_from_directory(image_dir, filename)
+        return serve_media('images', filename)
+
+    # Content-hashed WebP/AVIF variants built by image_variants.py
+    @app.route('/data/images/derived/<filename>')
+    def serve_derived_image(filename):
+        response = serve_media('derived', filename)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
 
     @app.route('/api/bricks', methods=['GET'])
     def get_bricks():
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute('PRAGMA table_info(Brick)')
-            columns_info = cursor.fetchall()
-            column_names = [col[1] for col in columns_info]
-
-            if 'completed' not in column_names:
-                return jsonify({'error': "'completed' column missing from Brick table"}), 500
-
-            try:
-                cursor.execute('SELECT * FROM Brick')
-                bricks = cursor.fetchall()
-            except Exception as sql_err:
-                conn.close()
-                return jsonify({'error': f'SQL Error: {sql_err}'}), 500
-
-            conn.close()
-
-            brick_list = []
-            for brick in bricks:
-                try:
-                    brick_dict = dict(zip(column_names, brick))
-                    words = []
-                    for i in range(1, 9):  # word1 to word8
-                        word_text = brick_dict.get(f'word{i}')
-                        word_def = brick_dict.get(f'definition{i}')
-                        word_type = brick_dict.get(f'type{i}')
-                        if word_text and word_text.strip():
-                            words.append({
-                                'text': word_text,
-                                'definition': word_def if word_def else '',
-                                'type': word_type if word_type else ''
-                            })
-                    image_path = brick_dict.get('image')
-                    image_url = None
-                    if image_path:
-                        image_filename = os.path.basename(image_path)
-                        image_url = f'/data/images/{image_filename}'
-                    filtered_dict = {
-                        'group_id': brick_dict.get('group_id'),
-                        'brick': brick_dict.get('brick'),
-                        'brick_language': brick_dict.get('language', ''),
-                        'definition': brick_dict.get('definition', ''),
-                        'definition_language': brick_dict.get('definition_language', ''),
-                        'level': brick_dict.get('level', 1),
-                        'image_url': image_url,
-                        'words': words,
-                        'completed': brick_dict.get('completed', 0) == 1
-                    }
-                    brick_list.append(filtered_dict)
-                except Exception as row_err:
-                    continue
-
-            return jsonify(brick_list)
+            limit, after = page_args(len(BRICK_KEY_COLUMNS))
+            username = request.args.get('username') or None
+            query = dict(
+                language=request.args.get('language') or None,
+                level_min=int_arg('level_min'),
+                level_max=int_arg('level_max'),
+                completed=bool_arg('completed'),
+                after=after,
+                limit=limit,
+                fields=fields_arg(BRICK_FIELDS)
+            )
+            if query['completed'] is not None and not username:
+                raise BadQuery("'completed' needs a 'username'")
+            if username:
+                # Completion is the user's own, so the list is built per request and not cached;
+                # queued scores are written first so it includes them
+                score_queue.flush()
+                return payload_response(encode_payload(build_brick_list(username=username, **query)))
+            payload = None
+            while payload is None:
+                payload = brick_list_payload(get_content_version('bricks'), **query)
+            return payload_response(payload)
+        except BadQuery as e:
+            return jsonify({'error': str(e)}), 400
+        except LookupError as e:
+            return jsonify({'error': str(e)}), 500
         except Exception as e:
             return jsonify({'error': str(e), 'type': str(type(e).__name__)}), 500
 
@@ -98,15 +92,72 @@ def register_brick_routes(app):
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 500
 
+def brick_list_payload(version, language=None, level_min=None, level_max=None, completed=None,
+                       after=None, limit=None, fields=None):
+    """Cached, pre-serialized brick list for a content version and query; None if the content changed while it was built"""
+    query = dict(language=language, level_min=level_min, level_max=level_max, completed=completed,
+                 after=after, limit=limit, fields=fields)
+    # The serialized, compressed list is rebuilt only when the content version or image variants change
+    key = ('bricks', version, media_index.built_at, manifest_version(), tuple(sorted(query.items())))
+    return get_payload(key, lambda: build_brick_list(**query), lambda: get_content_version('bricks') == version)
+
+def build_brick_list(language=None, level_min=None, level_max=None, completed=None,
+                     after=None, limit=None, fields=None, username=None):
+    """Build the /api/bricks payload from the Brick table; paginated when limit is given"""
+    try:
+        # One extra row tells us whether there is a next page
+        bricks = query_bricks(language, level_min, level_max, completed, after,
+                              limit + 1 if limit is not None else None, username)
+    except Exception as sql_err:
+        raise LookupError(f'SQL Error: {sql_err}')
+
+    next_key = None
+    if limit is not None and len(bricks) > limit:
+        bricks = bricks[:limit]
+        next_key = tuple(bricks[-1][column] for column in BRICK_KEY_COLUMNS)
+
+    words_by_group = get_group_words('brick', [brick['group_id'] for brick in bricks])
+    brick_list = []
+    for brick_dict in bricks:
+        try:
+            words = words_by_group[brick_dict['group_id']]
+            image_path = brick_dict.get('image')
+            image_url = None
+            image_filename = None
+            if image_path and image_path.strip():
+                # Stored paths may be Windows paths, so split on both separators
+                image_filename = image_path.strip().replace('\\', '/').split('/')[-1]
+                image_url = f'/data/images/{image_filename}'
+            image_width, image_height = media_index.image_size(image_filename)
+            filtered_dict = {
+                'group_id': brick_dict.get('group_id'),
+                'brick': brick_dict.get('brick'),
+                'brick_language': brick_dict.get('language', ''),
+                'definition': brick_dict.get('definition', ''),
+                'definition_language': brick_dict.get('definition_language', ''),
+                'level': brick_dict.get('level', 1),
+                'image_url': image_url,
+                'image_sources': image_sources(image_filename) if image_filename else None,
+                # Lets the client lay out bbox overlays before the image has downloaded
+                'image_width': image_width,
+                'image_height': image_height,
+                'words': words,
+                'completed': brick_dict.get('completed', 0) == 1
+            }
+            brick_list.append(filtered_dict)
+        except Exception as row_err:
+            continue
+
+    return page_body(select_fields(brick_list, fields), limit, next_key)
+
 def reset_bricks(language=None):
-    conn = get_connection()
-    cursor = conn.cursor()
-    if language:
-        cursor.execute("UPDATE Brick SET completed = 0 WHERE language = ?", (language,))
-    else:
-        cursor.execute("UPDATE Brick SET completed = 0")
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        if language:
+            cursor.execute("UPDATE Brick SET completed = 0 WHERE language = ?", (language,))
+        else:
+            cursor.execute("UPDATE Brick SET completed = 0")
+        bump_content_version('bricks', conn)
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -1,114 +1,292 @@
 import os
 from flask import Blueprint, request, jsonify
 from werkzeug.utils import secure_filename
-from dotenv import load_dotenv
-import moondream as md
 from PIL import Image
 import io
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from lru import LRUCache
+from media_index import media_index
+from singleflight import SingleFlight
+from admission import AdmissionController, Overloaded
+from database.db_helper import get_group_image, get_precomputed_bbox
+from database.detect_cache import detect_cache, hash_image_bytes, normalize_target
+from detectors import detect_objects, detector_stats, get_detector
 
-load_dotenv()
-MOONDREAM_API_KEY = os.getenv('MOONDREAM_API_KEY')
+DETECT_IMAGE_CACHE_ENTRIES = int(os.getenv('DETECT_IMAGE_CACHE_ENTRIES', 16))
+DETECT_IMAGE_CACHE_BYTES = int(os.getenv('DETECT_IMAGE_CACHE_BYTES', 256 * 1024 * 1024))
+DETECT_BATCH_CONCURRENCY = int(os.getenv('DETECT_BATCH_CONCURRENCY', 4))
+DETECT_BATCH_MAX_TARGETS = int(os.getenv('DETECT_BATCH_MAX_TARGETS', 16))
+DETECT_MAX_CONCURRENT = int(os.getenv('DETECT_MAX_CONCURRENT', 4))
+DETECT_MAX_QUEUE = int(os.getenv('DETECT_MAX_QUEUE', 16))
+DETECT_DEADLINE_S = float(os.getenv('DETECT_DEADLINE_S', 10))
 
 detect_bp = Blueprint('detect', __name__)
 
+# Identical (image, target) detections in flight at the same time share one model call
+detect_flight = SingleFlight()
+# Requests that miss every cache are admitted here so a hint burst cannot take
+# every worker thread away from the cheap endpoints
+detect_admission = AdmissionController(DETECT_MAX_CONCURRENT, DETECT_MAX_QUEUE, DETECT_DEADLINE_S)
+
+# Decoded lesson images keyed by filename; values are (mtime, size, image, image_hash)
+image_cache = LRUCache(
+    max_entries=DETECT_IMAGE_CACHE_ENTRIES,
+    max_bytes=DETECT_IMAGE_CACHE_BYTES,
+    sizeof=lambda entry: entry[2].width * entry[2].height * len(entry[2].getbands())
+)
+
+class AssetNotFound(Exception):
+    pass
+
+def detect_response(found=False, label='', bbox=None, error='', confidence=None):
+    """Build the JSON body shared by all detection responses"""
+    return {
+        'found': found,
+        'label': label,
+        'confidence': confidence if confidence is not None else (1.0 if found else 0.0),
+        'bbox': bbox or [],
+        'error': error
+    }
+
+def load_asset_image(filename):
+    """Return (image, image_hash) for a file in data/images, decoding it at most once"""
+    media_index.ensure_built()
+    entry = media_index.get('images', secure_filename(filename or ''))
+    if entry is None:
+        raise AssetNotFound(f'Image "{filename}" not found.')
+    cached = image_cache.get(entry.name)
+    if cached is not None and cached[0] == entry.mtime and cached[1] == entry.size:
+        return cached[2], cached[3]
+    image = Image.open(entry.path)
+    image.load()
+    # The index hash is the sha256 of the file bytes, the same key an upload of it would get
+    image_cache.put(entry.name, (entry.mtime, entry.size, image, entry.hash))
+    return image, entry.hash
+
+def resolve_request_image():
+    """
+    Resolve the image for a detection request.
+
+    Lesson images are referenced by ?image=<filename> or ?group_id=<id>&mode=brick|step
+    and served from the decoded image cache. Uploaded files are only needed for
+    user-supplied photos. Returns (image_loader, image_hash, image_name) where
+    image_loader() returns the PIL image, so cache hits never decode anything.
+    image_name is None for uploads.
+    """
+    image_name = request_param('image')
+    group_id = request_param('group_id')
+    if image_name or group_id:
+        if not image_name:
+            mode = request_param('mode') or 'brick'
+            try:
+                image_name = get_group_image(mode, int(group_id))
+            except ValueError as e:
+                raise AssetNotFound(str(e))
+            if not image_name:
+                raise AssetNotFound(f'No image for {mode} group {group_id}.')
+        image, image_hash = load_asset_image(image_name)
+        return (lambda: image), image_hash, secure_filename(image_name)
+    if 'file' not in request.files:
+        return None, None, None
+    image_bytes = request.files['file'].read()
+    return decode_once(image_bytes), hash_image_bytes(image_bytes), None
+
+def request_param(name):
+    """Read a parameter from the query string, form fields or JSON body"""
+    value = request.args.get(name) or request.form.get(name)
+    if value is None and request.is_json:
+        value = (request.get_json(silent=True) or {}).get(name)
+    return value
+
+def decode_once(image_bytes):
+    """Return a loader that decodes the uploaded bytes on first use only"""
+    lock = threading.Lock()
+    decoded = []
+    def load():
+        with lock:
+            if not decoded:
+                image = Image.open(io.BytesIO(image_bytes))
+                image.load()
+                decoded.append(image)
+        return decoded[0]
+    return load
+
+def lookup_precomputed(image_name, image_hash, target):
+    """Answer from the WordBBox table filled by database/precompute_bboxes.py, if it was computed for this image content"""
+    if not image_name:
+        return None
+    row = get_precomputed_bbox(image_name, image_hash, normalize_target(target))
+    if row is None:
+        return None
+    found, x, y, w, h = row
+    if found:
+        return detect_response(True, target, [x, y, w, h])
+    return detect_response(False, target, error=f'Object "{target}" not found.')
+
+def run_detection(image, target, image_key=None):
+    """
+    Run detection for a single target with the configured backend and return a
+    detect_response dict. image_key lets the micro-batcher share one image
+    encoding between concurrent requests.
+    """
+    result = detect_objects(image, target, image_key)
+    objects = result.get('objects', [])
+    if objects:
+        obj = objects[0]
+        # Convert normalized box to [x, y, w, h]
+        x_min = obj.get('x_min', 0)
+        y_min = obj.get('y_min', 0)
+        x_max = obj.get('x_max', 0)
+        y_max = obj.get('y_max', 0)
+        bbox = [x_min, y_min, x_max - x_min, y_max - y_min]
+        return detect_response(True, target, bbox)
+    return detect_response(False, target, error=f'Object "{target}" not found.')
+
+def request_deadline():
+    """Monotonic deadline for this request: ?deadline_ms= capped at DETECT_DEADLINE_S"""
+    try:
+        seconds = float(request_param('deadline_ms')) / 1000
+    except (TypeError, ValueError):
+        seconds = DETECT_DEADLINE_S
+    return time.monotonic() + max(0.0, min(seconds, DETECT_DEADLINE_S))
+
+def overloaded_response(body, error):
+    response = jsonify(body)
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def detect_target(load_image, image_hash, image_name, target, deadline=None):
+    """
+    Detection pipeline for one target: precomputed table, then result cache,
+    then the model. Cache misses must be admitted by detect_admission before
+    the deadline (raises Overloaded otherwise); concurrent misses for the same
+    key are coalesced first, so only the leader is admitted and calls the model.
+    Returns (result, source).
+    """
+    precomputed = lookup_precomputed(image_name, image_hash, target)
+    if precomputed is not None:
+        return precomputed, 'precomputed'
+    cached = detect_cache.get(image_hash, target)
+    if cached is not None:
+        cached['label'] = target
+        return cached, 'cache'
+
+    def compute():
+        # A flight that finished just before this one started has already filled the cache;
+        # the miss was counted above, so this look does not count
+        cached = detect_cache.peek(image_hash, target)
+        if cached is not None:
+            return cached, 'cache'
+        # Only the leader takes an admission slot; followers wait on its flight
+        timeout = None if deadline is None else deadline - time.monotonic()
+        with detect_admission.admit(timeout):
+            result = run_detection(load_image(), target, image_hash)
+        detect_cache.put(image_hash, target, result)
+        return result, 'model'
+
+    (result, source), shared = detect_flight.do((image_hash, normalize_target(target)), compute)
+    result = dict(result, label=target)
+    return result, 'coalesced' if shared else source
+
 @detect_bp.route('/detect', methods=['POST'])
 def detect_object():
     target = request.args.get('target')
     if not target:
-        return jsonify({
-            'found': False,
-            'label': '',
-            'confidence': 0.0,
-            'bbox': [],
-            'error': 'Missing target parameter.'
-        }), 400
+        return jsonify(detect_response(error='Missing target parameter.')), 400
     # Use only the first definition if comma-separated
     target_first = target.split(',')[0].strip()
-    if 'file' not in request.files:
-        return jsonify({
-            'found': False,
-            'label': '',
-            'confidence': 0.0,
-            'bbox': [],
-            'error': 'Missing image file.'
-        }), 400
-    image_file = request.files['file']
     try:
-        # Read image file into PIL Image
-        image_bytes = image_file.read()
-        image = Image.open(io.BytesIO(image_bytes))
-        # Use Moondream SDK for detection
-        model = md.vl(api_key=MOONDREAM_API_KEY)
-        result = model.detect(image, target_first)
-        objects = result.get('objects', [])
-        if objects:
-            obj = objects[0]
-            x_min = obj.get('x_min', 0)
-            y_min = obj.get('y_min', 0)
-            x_max = obj.get('x_max', 0)
-            y_max = obj.get('y_max', 0)
-            bbox = [x_min, y_min, x_max - x_min, y_max - y_min]
-            return jsonify({
-                'found': True,
-                'label': target_first,
-                'confidence': 1.0,
-                'bbox': bbox,
-                'error': ''
-            })
-        else:
-            return jsonify({
-                'found': False,
-                'label': target_first,
-                'confidence': 0.0,
-                'bbox': [],
-                'error': f'Object "{target_first}" not found.'
-            })
-    except Exception as e:
-        import traceback
-        print("Error in /detect endpoint:", str(e))
-        traceback.print_exc()
-        return jsonify({
-            'found': False,
-            'label': '',
-            'confidence': 0.0,
-            'bbox': [],
-            'error': str(e)
-        }), 500
-        # Parse response
-        objects = result.get('objects', [])
-        if objects:
-            obj = objects[0]
-            # Convert normalized box to [x, y, w, h]
-            x_min = obj.get('x_min', 0)
-            y_min = obj.get('y_min', 0)
-            x_max = obj.get('x_max', 0)
-            y_max = obj.get('y_max', 0)
-            bbox = [x_min, y_min, x_max - x_min, y_max - y_min]
-            return jsonify({
-                'found': True,
-                'label': target,
-                'confidence': 1.0,
-                'bbox': bbox,
-                'error': ''
-            })
-        else:
-            return jsonify({
-                'found': False,
-                'label': target,
-                'confidence': 0.0,
-                'bbox': [],
-                'error': f'Object "{target}" not found.'
-            })
+        load_image, image_hash, image_name = resolve_request_image()
+        if load_image is None:
+            return jsonify(detect_response(error='Missing image file.')), 400
+        result, _ = detect_target(load_image, image_hash, image_name, target_first, request_deadline())
+        return jsonify(result)
+    except AssetNotFound as e:
+        return jsonify(detect_response(error=str(e))), 404
+    except Overloaded as e:
+        return overloaded_response(detect_response(label=target_first, error=str(e)), e)
     except Exception as e:
         import traceback
         print("Error in /detect endpoint:", str(e))
         traceback.print_exc()
         if hasattr(e, 'response') and e.response is not None:
             print("Response content:", getattr(e.response, 'content', None))
-        return jsonify({
-            'found': False,
-            'label': '',
-            'confidence': 0.0,
-            'bbox': [],
-            'error': str(e)
-        }), 500
+        return jsonify(detect_response(error=str(e))), 500
+
+@detect_bp.route('/detect/batch', methods=['POST'])
+def detect_batch():
+    """
+    Detect several targets on one image in a single request.
+
+    Targets come from repeated ?target= parameters or a JSON body
+    {"targets": [...], "image": "..."}; the image is resolved the same way as
+    /detect. The image is decoded once and the targets run concurrently, at most
+    DETECT_BATCH_CONCURRENCY at a time (a lower ?concurrency= is honoured).
+    """
+    targets = request.args.getlist('target') or request.form.getlist('target')
+    if not targets and request.is_json:
+        body = request.get_json(silent=True)
+        targets = (body.get('targets') if isinstance(body, dict) else None) or []
+        if not isinstance(targets, list) or not all(isinstance(t, str) for t in targets):
+            return jsonify({'results': [], 'error': "'targets' must be a list of strings."}), 400
+    # Use only the first definition of each target, keeping order and dropping duplicates
+    targets = list(dict.fromkeys(t.split(',')[0].strip() for t in targets if t and t.strip()))
+    if not targets:
+        return jsonify({'results': [], 'error': 'Missing target parameter.'}), 400
+    if len(targets) > DETECT_BATCH_MAX_TARGETS:
+        return jsonify({'results': [], 'error': f'At most {DETECT_BATCH_MAX_TARGETS} targets per request.'}), 400
+    try:
+        concurrency = int(request_param('concurrency') or DETECT_BATCH_CONCURRENCY)
+    except (TypeError, ValueError):
+        concurrency = DETECT_BATCH_CONCURRENCY
+    concurrency = max(1, min(concurrency, DETECT_BATCH_CONCURRENCY, len(targets)))
+    started = time.perf_counter()
+    deadline = request_deadline()
+    try:
+        load_image, image_hash, image_name = resolve_request_image()
+    except AssetNotFound as e:
+        return jsonify({'results': [], 'error': str(e)}), 404
+    if load_image is None:
+        return jsonify({'results': [], 'error': 'Missing image file.'}), 400
+
+    def run_one(target):
+        target_started = time.perf_counter()
+        try:
+            result, source = detect_target(load_image, image_hash, image_name, target, deadline)
+        except Overloaded as e:
+            result, source = detect_response(label=target, error=str(e)), 'rejected'
+            result['retry_after'] = e.retry_after
+        except Exception as e:
+            print(f"Error in /detect/batch for target {target!r}:", str(e))
+            result, source = detect_response(label=target, error=str(e)), 'error'
+        result['source'] = source
+        result['elapsed_ms'] = round((time.perf_counter() - target_started) * 1000, 2)
+        return result
+
+    if concurrency == 1:
+        results = [run_one(target) for target in targets]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(run_one, targets))
+    body = {
+        'results': results,
+        'concurrency': concurrency,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+    }
+    rejected = [r['retry_after'] for r in results if r['source'] == 'rejected']
+    if rejected:
+        # Partial results are still returned; the client retries the rejected targets
+        return overloaded_response(body, Overloaded('Detection overloaded.', max(rejected)))
+    return jsonify(body)
+
+@detect_bp.route('/detect/stats', methods=['GET'])
+def detect_stats():
+    return jsonify({'cache': detect_cache.stats(), 'images': image_cache.stats(), 'detector': detector_stats(), 'coalescing': detect_flight.stats(), 'admission': detect_admission.stats()})
+
+@detect_bp.route('/detect/health', methods=['GET'])
+def detect_health():
+    health = get_detector().health()
+    return jsonify(health), 200 if health['healthy'] else 503
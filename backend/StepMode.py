@@ -1,13 +1,34 @@
 import os
 from flask import jsonify, request
-from database.db_helper import get_connection, get_all_steps
+from database.db_helper import db_connection, get_all_steps, get_content_version, STEP_KEY_COLUMNS
+from image_variants import image_sources, manifest_version
+from media_index import media_index
+from leaderboard import leaderboard as leaderboard_index
+from write_behind import score_queue
+from response_cache import get_payload, payload_response
+from pagination import BadQuery, int_arg, page_args, fields_arg, select_fields, page_body
+
+STEP_FIELDS = ('group_id', 'language', 'day', 'image_url', 'words', 'video', 'image_sources', 'image_width', 'image_height')
 
 def register_step_routes(app):
     @app.route('/api/steps', methods=['GET'])
     def get_steps():
         try:
-            steps = get_all_steps()
-            return jsonify(steps)
+            limit, after = page_args(len(STEP_KEY_COLUMNS))
+            query = dict(
+                language=request.args.get('language') or None,
+                day_min=int_arg('day_min'),
+                day_max=int_arg('day_max'),
+                after=after,
+                limit=limit,
+                fields=fields_arg(STEP_FIELDS)
+            )
+            payload = None
+            while payload is None:
+                payload = step_list_payload(get_content_version('steps'), **query)
+            return payload_response(payload)
+        except BadQuery as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -19,36 +40,55 @@ def register_step_routes(app):
         username = data.get('username')
         language = data.get('language')
         try:
+            # Queued scores must land before the reset, not overwrite it afterwards
+            score_queue.flush()
             reset_user_steps(username, language)
+            leaderboard_index.record(username)
             return jsonify({'success': True})
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 500
 
+def step_list_payload(version, language=None, day_min=None, day_max=None, after=None, limit=None, fields=None):
+    """Cached, pre-serialized step list for a content version and query; None if the content changed while it was built"""
+    query = dict(language=language, day_min=day_min, day_max=day_max, after=after, limit=limit, fields=fields)
+    key = ('steps', version, media_index.built_at, manifest_version(), tuple(sorted(query.items())))
+    return get_payload(key, lambda: build_step_list(**query), lambda: get_content_version('steps') == version)
+
+def build_step_list(language=None, day_min=None, day_max=None, after=None, limit=None, fields=None):
+    """Build the /api/steps payload: steps plus their image variants and dimensions"""
+    # One extra row tells us whether there is a next page
+    steps = get_all_steps(language, day_min, day_max, after, limit + 1 if limit is not None else None)
+    next_key = None
+    if limit is not None and len(steps) > limit:
+        steps = steps[:limit]
+        next_key = tuple(steps[-1][column] for column in STEP_KEY_COLUMNS)
+    for step in steps:
+        image_filename = step['image_url'].split('/')[-1] if step.get('image_url') else None
+        step['image_sources'] = image_sources(image_filename) if image_filename else None
+        step['image_width'], step['image_height'] = media_index.image_size(image_filename)
+    return page_body(select_fields(steps, fields), limit, next_key)
+
 def reset_user_steps(username, language=None):
-    conn = get_connection()
-    cursor = conn.cursor()
-    if language:
-        print(f"Resetting UserStep for username={username}, language={language}")
-        # Show which group_ids will be affected
-        cursor.execute("SELECT group_id FROM Step WHERE language = ?", (language,))
-        group_ids = [row[0] for row in cursor.fetchall()]
-        print(f"Target group_ids for language '{language}': {group_ids}")
-        if not group_ids:
-            print("No steps found for this language.")
-        cursor.execute(
-            "UPDATE UserStep SET score = 0 WHERE username = ? AND group_id IN (SELECT group_id FROM Step WHERE language = ?)",
-            (username, language)
-        )
-        print(f"SQL params: username={username}, language={language}")
-    else:
-        print(f"Resetting UserStep for username={username}, all languages")
-        cursor.execute(
-            "UPDATE UserStep SET score = 0 WHERE username = ?",
-            (username,)
-        )
-        print(f"SQL params: username={username}")
-    conn.commit()
-    conn.close()
-    print(f"Rows affected: {cursor.rowcount}")
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        if language:
+            print(f"Resetting UserStep for username={username}, language={language}")
+            # Show which group_ids will be affected
+            cursor.execute("SELECT group_id FROM Step WHERE language = ?", (language,))
+            group_ids = [row[0] for row in cursor.fetchall()]
+            print(f"Target group_ids for language '{language}': {group_ids}")
+            if not group_ids:
+                print("No steps found for this language.")
+            cursor.execute(
+                "UPDATE UserStep SET score = 0 WHERE username = ? AND group_id IN (SELECT group_id FROM Step WHERE language = ?)",
+                (username, language)
+            )
+            print(f"SQL params: username={username}, language={language}")
+        else:
+            print(f"Resetting UserStep for username={username}, all languages")
+            cursor.execute(
+                "UPDATE UserStep SET score = 0 WHERE username = ?",
+                (username,)
+            )
+            print(f"SQL params: username={username}")
+        print(f"Rows affected: {cursor.rowcount}")
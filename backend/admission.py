@@ -0,0 +1,94 @@
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted; retry_after is in whole seconds"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounded concurrency with a fixed-size wait queue.
+
+    At most max_concurrent callers run at once and at most max_queue wait for
+    a slot. Anything beyond that, or a waiter whose deadline passes, is refused
+    immediately with Overloaded so it never ties up a worker thread.
+    """
+
+    def __init__(self, max_concurrent, max_queue, max_wait):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_observed_wait = 0.0
+        self.peak_queue = 0
+        # Exponentially weighted service time, used for the Retry-After estimate
+        self.service_time = 1.0
+
+    def retry_after(self):
+        backlog = (self.waiting + 1) / max(self.max_concurrent, 1)
+        return max(1, math.ceil(backlog * self.service_time))
+
+    @contextmanager
+    def admit(self, timeout=None):
+        timeout = self.max_wait if timeout is None else min(timeout, self.max_wait)
+        with self._cond:
+            if self.active >= self.max_concurrent:
+                if self.waiting >= self.max_queue:
+                    self.rejected += 1
+                    raise Overloaded('Detection queue is full.', self.retry_after())
+                self.waiting += 1
+                self.peak_queue = max(self.peak_queue, self.waiting)
+                started = time.monotonic()
+                deadline = started + timeout
+                try:
+                    while self.active >= self.max_concurrent:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.timed_out += 1
+                            raise Overloaded('Timed out waiting for a detection slot.', self.retry_after())
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+                waited = time.monotonic() - started
+                self.total_wait += waited
+                self.max_observed_wait = max(self.max_observed_wait, waited)
+            self.active += 1
+            self.admitted += 1
+        service_started = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                self.service_time = 0.8 * self.service_time + 0.2 * (time.monotonic() - service_started)
+                self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'active': self.active,
+                'queue_depth': self.waiting,
+                'peak_queue_depth': self.peak_queue,
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'max_wait_s': self.max_wait,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'avg_wait_ms': round(self.total_wait / self.admitted * 1000, 2) if self.admitted else 0.0,
+                'max_wait_ms': round(self.max_observed_wait * 1000, 2),
+                'avg_service_ms': round(self.service_time * 1000, 2)
+            }
@@ -0,0 +1,80 @@
+from flask import Blueprint, request, jsonify
+
+from write_behind import score_queue
+from BrickMode import brick_list_payload
+from StepMode import step_list_payload
+from response_cache import dump_json, spliced_json_response
+
+bootstrap_bp = Blueprint('bootstrap', __name__)
+
+
+def unlocked_level(groups, scores):
+    """Highest playable level: every brick of each earlier level must have a non-zero score"""
+    levels = {}
+    for group_id, level in groups:
+        levels.setdefault(level, []).append(group_id)
+    if not levels:
+        return None
+    unlocked = min(levels)
+    for level in sorted(levels):
+        if all(scores.get(group_id) for group_id in levels[level]):
+            unlocked = level + 1
+        else:
+            break
+    return unlocked
+
+
+def progress_total(groups, scores):
+    """The user's subtotal over the listed groups, not User.total_score"""
+    return sum(scores.get(group_id, 0) for group_id, _ in groups)
+
+
+def progress_items(groups, scores):
+    """Per-group progress in the shape /user_bricks and /user_steps return"""
+    return [
+        {'group_id': group_id, 'score': scores.get(group_id, 0), 'completed': bool(scores.get(group_id))}
+        for group_id, _ in groups
+    ]
+
+
+@bootstrap_bp.route('/api/bootstrap/bricks', methods=['GET'])
+def bootstrap_bricks():
+    """Everything Brick mode needs on load: the brick list plus the user's progress in one response"""
+    username = request.args.get('username') or None
+    language = request.args.get('language') or None
+    try:
+        # The list must be built from the same content version as the progress snapshot;
+        # if an import lands in between, read both again
+        payload = None
+        while payload is None:
+            version, groups, scores, _ = score_queue.user_progress('brick', username, language)
+            payload = brick_list_payload(version, language=language)
+    except Exception as e:
+        return jsonify({'error': str(e), 'type': str(type(e).__name__)}), 500
+    progress = {
+        'username': username,
+        'bricks': progress_items(groups, scores),
+        'total_score': progress_total(groups, scores),
+        'unlocked_level': unlocked_level(groups, scores)
+    }
+    return spliced_json_response([('bricks', payload.body), ('progress', dump_json(progress))])
+
+
+@bootstrap_bp.route('/api/bootstrap/steps', methods=['GET'])
+def bootstrap_steps():
+    """Everything Step mode needs on load: the step list plus the user's progress in one response"""
+    username = request.args.get('username') or None
+    language = request.args.get('language') or None
+    try:
+        payload = None
+        while payload is None:
+            version, groups, scores, _ = score_queue.user_progress('step', username, language)
+            payload = step_list_payload(version, language=language)
+    except Exception as e:
+        return jsonify({'error': str(e), 'type': str(type(e).__name__)}), 500
+    progress = {
+        'username': username,
+        'steps': progress_items(groups, scores),
+        'total_score': progress_total(groups, scores)
+    }
+    return spliced_json_response([('steps', payload.body), ('progress', dump_json(progress))])
@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db_helper
+from db_helper import db_connection, IdSampler, get_rows_by_id
+from migrations import create_user_tables, create_word_sampling
+
+# Compares random word draws with ORDER BY RANDOM() against the id sampler as
+# the word table grows, on a scratch database so duduolingo.db is never touched.
+
+LANGUAGES = ('Spanish', 'German')
+LEVELS = 6
+
+def create_scratch_words(rows):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        create_user_tables(cursor)
+        cursor.execute('''
+            CREATE TABLE word (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                word TEXT NOT NULL,
+                word_language TEXT NOT NULL,
+                definition TEXT NOT NULL,
+                definition_language TEXT NOT NULL,
+                level INTEGER NOT NULL
+            )
+        ''')
+        cursor.executemany(
+            'INSERT INTO word (word, word_language, definition, definition_language, level) VALUES (?, ?, ?, ?, ?)',
+            ((f'word{i}', LANGUAGES[i % len(LANGUAGES)], f'definition {i}', 'English', i // len(LANGUAGES) % LEVELS + 1)
+             for i in range(rows)))
+        # Created after the load so the benchmark's insert does not bump the version per row
+        create_word_sampling(cursor)
+
+def timed(function, repeats):
+    """Average milliseconds per call"""
+    started = time.perf_counter()
+    for i in range(repeats):
+        function(i)
+    return (time.perf_counter() - started) * 1000 / repeats
+
+def order_by_random(_, limit):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM word WHERE word_language = ? ORDER BY RANDOM() LIMIT ?', ('Spanish', limit))
+        return cursor.fetchall()
+
+def benchmark(rows, limit, repeats):
+    build_started = time.perf_counter()
+    create_scratch_words(rows)
+    build = time.perf_counter() - build_started
+
+    legacy = timed(lambda i: order_by_random(i, limit), max(1, repeats // 10))
+    # A fresh sampler per scratch database, so nothing cached carries over between sizes
+    word_sampler = IdSampler('word', 'id', 'word_language', 'level', 'words')
+    load = timed(lambda i: word_sampler.population('Spanish'), 1)
+    sample = timed(lambda i: get_rows_by_id('word', 'id', word_sampler.sample('Spanish', limit, seed=i)), repeats)
+    stratified = timed(lambda i: get_rows_by_id('word', 'id', word_sampler.stratified_sample('Spanish', limit, seed=i)),
+                       repeats)
+    sequence = timed(lambda i: get_rows_by_id('word', 'id', word_sampler.draw('benchmark', 'Spanish', limit, seed=1)),
+                     repeats)
+    print(f"{rows:>10} words (built in {build:.1f}s): ORDER BY RANDOM() {legacy:8.2f}ms | "
+          f"sampler: first load {load:8.2f}ms, sample {sample:.3f}ms, "
+          f"stratified {stratified:.3f}ms, draw {sequence:.3f}ms")
+    return word_sampler
+
+def check_samples(word_sampler):
+    """Seeded draws repeat, and a draw sequence covers the population before repeating"""
+    assert word_sampler.sample('Spanish', 20, seed=7) == word_sampler.sample('Spanish', 20, seed=7)
+    size = sum(len(ids) for ids in word_sampler.population('German').values())
+    seen = []
+    while len(seen) < size:
+        seen.extend(word_sampler.draw('check', 'German', 37, seed=3))
+    assert len(set(seen[:size])) == size
+    counts = {}
+    population = word_sampler.population('Spanish')
+    level_of = {row_id: level for level, ids in population.items() for row_id in ids}
+    for row_id in word_sampler.stratified_sample('Spanish', LEVELS * 5, seed=11):
+        counts[level_of[row_id]] = counts.get(level_of[row_id], 0) + 1
+    assert set(counts.values()) == {5}, counts
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark random word sampling as the word table grows')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000, 3000000],
+                        help='word table sizes to test')
+    parser.add_argument('--limit', type=int, default=10, help='words per draw')
+    parser.add_argument('--repeats', type=int, default=200, help='draws timed per size')
+    args = parser.parse_args()
+    source = db_helper.DATABASE_PATH
+    for rows in args.sizes:
+        with tempfile.TemporaryDirectory() as scratch:
+            # The pool follows DATABASE_PATH
+            db_helper.DATABASE_PATH = os.path.join(scratch, 'benchmark.db')
+            check_samples(benchmark(rows, args.limit, args.repeats))
+            db_helper.db_pool.close_idle()
+    db_helper.DATABASE_PATH = source
@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_helper import ConnectionPool, save_user_score, get_user_total
+from migrations import create_user_tables, unique_user_steps, create_score_triggers
+
+# Measures /user_brick-style score writes per second with several concurrent
+# clients, against a scratch database so duduolingo.db is never touched.
+
+def legacy_write(conn, username, group_id, score):
+    """The write path /user_brick used before: SELECT, UPDATE or INSERT, SUM, UPDATE, commit, SELECT"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM UserBrick WHERE username = ? AND group_id = ?', (username, group_id))
+    if cursor.fetchone():
+        cursor.execute('UPDATE UserBrick SET score = ? WHERE username = ? AND group_id = ?', (score, username, group_id))
+    else:
+        cursor.execute('INSERT INTO UserBrick (username, group_id, score) VALUES (?, ?, ?)', (username, group_id, score))
+    cursor.execute('SELECT SUM(score) FROM UserBrick WHERE username = ?', (username,))
+    total_score = cursor.fetchone()[0] or 0
+    cursor.execute('UPDATE User SET total_score = ? WHERE username = ?', (total_score, username))
+    conn.commit()
+    cursor.execute('SELECT score FROM UserBrick WHERE username = ? AND group_id = ?', (username, group_id))
+    return cursor.fetchone()[0]
+
+def upsert_write(conn, username, group_id, score):
+    """The current write path: one UPSERT ... RETURNING whose trigger updates the total, then a total lookup"""
+    saved = save_user_score('brick', username, group_id, score, conn)
+    get_user_total(username, conn)
+    return saved
+
+def create_scratch_db(path, users, groups, triggers):
+    pool = ConnectionPool(path, max_idle=1)
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        create_user_tables(cursor)
+        unique_user_steps(cursor)
+        if triggers:
+            create_score_triggers(cursor, 'UserBrick')
+        cursor.executemany('INSERT INTO User (username) VALUES (?)', [(f'user{i}',) for i in range(users)])
+        # Half the answers update an existing row, half insert a new one
+        cursor.executemany('INSERT INTO UserBrick (username, group_id, score) VALUES (?, ?, 0)',
+                           [(f'user{i}', g) for i in range(users) for g in range(0, groups, 2)])
+    pool.close_idle()
+
+def run(write, path, clients, writes_per_client, users, groups):
+    pool = ConnectionPool(path, max_idle=clients)
+    done = []
+    errors = []
+
+    def client(seed):
+        rng = random.Random(seed)
+        count = 0
+        for _ in range(writes_per_client):
+            try:
+                # Each write is its own transaction, like one /user_brick request
+                with pool.connection() as conn:
+                    write(conn, f'user{rng.randrange(users)}', rng.randrange(groups), rng.randrange(100))
+                count += 1
+            except Exception as e:
+                # The legacy check-then-insert races itself into UNIQUE violations
+                errors.append(e)
+        done.append(count)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    pool.close_idle()
+    return sum(done), elapsed, errors
+
+def benchmark(clients, writes_per_client, users, groups):
+    for name, write in (('legacy', legacy_write), ('upsert', upsert_write)):
+        with tempfile.TemporaryDirectory() as scratch:
+            path = os.path.join(scratch, 'bench.db')
+            # The legacy path writes totals itself
+            create_scratch_db(path, users, groups, triggers=write is upsert_write)
+            writes, elapsed, errors = run(write, path, clients, writes_per_client, users, groups)
+            print(f"{name:>6}: {writes} writes by {clients} clients in {elapsed:.2f}s "
+                  f"= {writes / elapsed:.0f} writes/sec" + (f", {len(errors)} failed ({errors[0]})" if errors else ''))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare score write throughput of the legacy and UPSERT write paths')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent writer threads')
+    parser.add_argument('--writes', type=int, default=500, help='writes per client')
+    parser.add_argument('--users', type=int, default=50, help='distinct usernames written to')
+    parser.add_argument('--groups', type=int, default=100, help='distinct group_ids written to')
+    args = parser.parse_args()
+    benchmark(args.clients, args.writes, args.users, args.groups)
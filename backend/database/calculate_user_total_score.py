@@ -1,20 +1,46 @@
-import sqlite3
+import os
 import sys
+import argparse
 
-DB_PATH = 'c:/Users/Yonatan/Desktop/Semester2/IdeaToReality/DuDuolingo/backend/database/duduolingo.db'
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_helper import db_connection, find_total_drift, rebuild_user_totals
+
+# User.total_score is maintained incrementally by triggers on UserBrick and
+# UserStep. This checks it against a full recompute and can rebuild it in bulk.
 
 def calculate_total_score(username):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('SELECT SUM(score) FROM UserBrick WHERE username = ?', (username,))
-    total_score = cursor.fetchone()[0] or 0
-    conn.close()
-    return total_score
+    """Stored and recomputed total for one user"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT total_score FROM User WHERE username = ?', (username,))
+        row = cursor.fetchone()
+        cursor.execute('''
+            SELECT COALESCE((SELECT SUM(score) FROM UserBrick WHERE username = ?), 0)
+                 + COALESCE((SELECT SUM(score) FROM UserStep WHERE username = ?), 0)
+        ''', (username, username))
+        computed = cursor.fetchone()[0]
+    return (row[0] if row else None), computed
+
+def check_totals(rebuild=False):
+    """Report every user whose stored total has drifted; rebuild all totals if asked. Returns the drift count"""
+    drift = find_total_drift()
+    for username, stored, computed in drift:
+        print(f'  {username}: stored {stored}, computed {computed}')
+    print(f'{len(drift)} users with a wrong total')
+    if drift and rebuild:
+        print(f'Rebuilt totals for {rebuild_user_totals()} users')
+        drift = find_total_drift()
+        print(f'{len(drift)} users with a wrong total after rebuild')
+    return len(drift)
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print('Usage: python calculate_user_total_score.py <username>')
-        sys.exit(1)
-    username = sys.argv[1]
-    score = calculate_total_score(username)
-    print(f'Total score for user "{username}": {score}')
+    parser = argparse.ArgumentParser(description='Check User.total_score against the UserBrick and UserStep scores')
+    parser.add_argument('username', nargs='?', help='show one user instead of checking everyone')
+    parser.add_argument('--rebuild', action='store_true', help='recompute every total if any has drifted')
+    args = parser.parse_args()
+    if args.username:
+        stored, computed = calculate_total_score(args.username)
+        print(f'Total score for user "{args.username}": {computed} (stored: {stored})')
+        sys.exit(0 if stored is not None and abs(stored - computed) <= 1e-6 else 1)
+    sys.exit(1 if check_totals(args.rebuild) else 0)
@@ -41,7 +41,9 @@ def create_scene_with_words(group_id, csv_file_path="word_groups.csv"):
         
         # Extract words and definitions - only "Good" words (words 1-4)
         word_pairs = []
-        for i in range(1, 9):
+        # However many word columns the file has
+        word_count = sum(1 for column in df.columns if column.startswith('word') and column[4:].isdigit())
+        for i in range(1, word_count + 1):
             word_col = f'word{i}'
             def_col = f'definition{i}'
             type_col = f'type{i}'
@@ -1,28 +1,20 @@
 import sys
 import os
 import csv
-sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from db_helper import get_connection
+from db_helper import word_sampler, get_rows_by_id
 
-def get_word_groups_exact(language, level, groups_count, words_per_group=8):
+def get_word_groups_exact(language, level, groups_count, words_per_group=8, seed=None):
     """
-    Get exact number of word groups from the database
+    Get exact number of word groups from the database; the same seed gives the same groups
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Get all words for this language and level
-    cursor.execute('''
-        SELECT word, definition FROM word 
-        WHERE word_language = ? AND level = ?
-        ORDER BY RANDOM()
-    ''', (language, level))
-    
-    all_words = cursor.fetchall()
-    conn.close()
-    
     needed_words = groups_count * words_per_group
+
+    # Only as many random words of this language and level as the groups need
+    ids = word_sampler.sample(language, needed_words, levels=[level], seed=seed)
+    all_words = get_rows_by_id('word', 'id', ids, 'word, definition')
     
     if len(all_words) == 0:
         print(f"Error: {language} level {level} has no words")
@@ -49,12 +41,13 @@ def get_word_groups_exact(language, level, groups_count, words_per_group=8):
     
     return groups
 
-def create_word_groups():
+def create_word_groups(seed=None):
     """
     Create all word groups as specified:
     - Spanish: 10 groups from each level 1-5 (50 groups)
     - German: 10 groups from each level 1-3 (30 groups)
     Total: 80 groups
+    With a seed, each language and level is drawn reproducibly from seed + level
     """
     all_groups = []
 
@@ -62,7 +55,7 @@ def create_word_groups():
     print("Generating Spanish word groups...")
     for level in range(1, 6):
         print(f"  Processing Spanish level {level}")
-        groups = get_word_groups_exact("Spanish", level, 10, 8)
+        groups = get_word_groups_exact("Spanish", level, 10, 8, None if seed is None else seed + level)
         for group_num, group in enumerate(groups, 1):
             group_data = {
                 'language': 'Spanish',
@@ -76,7 +69,7 @@ def create_word_groups():
     print("Generating German word groups...")
     for level in range(1, 4):
         print(f"  Processing German level {level}")
-        groups = get_word_groups_exact("German", level, 10, 8)
+        groups = get_word_groups_exact("German", level, 10, 8, None if seed is None else seed + level)
         for group_num, group in enumerate(groups, 1):
             group_data = {
                 'language': 'German',
@@ -135,12 +128,16 @@ def save_groups_to_csv(groups, filename):
             writer.writerow(row)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate word_groups.csv from random words of each level')
+    parser.add_argument('--seed', type=int, help='draw the same groups every run')
+    args = parser.parse_args()
+
     print("Creating all word groups...")
     print("Spanish: 10 groups per level for levels 1-5 (50 groups)")
     print("German: 10 groups per level for levels 1-3 (30 groups)")
     print("Expected total: 80 groups")
 
-    groups = create_word_groups()
+    groups = create_word_groups(args.seed)
     print(f"\nGenerated {len(groups)} word groups")
     
     # Save to CSV
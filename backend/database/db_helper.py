@@ -1,235 +1,1060 @@
 import sqlite3
 import os
-import sys
+import re
+import json
+import time
+import bisect
+import random
+import threading
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
 
 DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'duduolingo.db')
 
+# Called as observer(statement, seconds, fetch) after each statement or fetchall when set (see metrics.py)
+_sql_observer = None
+
+def set_sql_observer(observer):
+    global _sql_observer
+    _sql_observer = observer
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement's execute and fetchall time to the SQL observer"""
+
+    def execute(self, sql, parameters=()):
+        if _sql_observer is None:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _sql_observer(sql, time.perf_counter() - started, False)
+
+    def executemany(self, sql, seq_of_parameters):
+        if _sql_observer is None:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _sql_observer(sql, time.perf_counter() - started, False)
+
+    def fetchall(self):
+        if _sql_observer is None:
+            return super().fetchall()
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            # Rows are produced lazily, so stepping through them is part of the statement's cost
+            _sql_observer(None, time.perf_counter() - started, True)
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', 5000))
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', 64 * 1024 * 1024))
+DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', 16 * 1024))
+DB_STATEMENT_CACHE = int(os.getenv('DB_STATEMENT_CACHE', 256))
+
+def open_connection(path):
+    """Open a connection and apply the per-connection tuning once"""
+    conn = sqlite3.connect(path, factory=TimedConnection, timeout=DB_BUSY_TIMEOUT_MS / 1000,
+                           cached_statements=DB_STATEMENT_CACHE, check_same_thread=False)
+    # WAL lets readers run while /user_brick writes; NORMAL is durable across app crashes in WAL mode
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}')
+    conn.execute(f'PRAGMA mmap_size={DB_MMAP_SIZE}')
+    conn.execute(f'PRAGMA cache_size=-{DB_CACHE_SIZE_KB}')
+    return conn
+
 def get_connection():
-    """Get database connection"""
-    return sqlite3.connect(DATABASE_PATH)
+    """Get a new tuned connection that the caller owns and closes; prefer db_connection()"""
+    return open_connection(DATABASE_PATH)
 
-def get_words_by_level(level_start, level_end):
-    """Get words within a level range"""
-    conn = get_connection()
+class ConnectionPool:
+    """
+    LIFO pool of tuned connections to one database file.
+
+    Connections are opened on demand and up to max_idle are kept for reuse,
+    so their PRAGMA setup, page cache and prepared-statement cache survive
+    across requests. A connection is used by one thread at a time. When path
+    is None the pool follows DATABASE_PATH and drops its idle connections if
+    that changes.
+    """
+
+    def __init__(self, path=None, max_idle=DB_POOL_SIZE, setup=None):
+        self.path = path
+        self.max_idle = max_idle
+        self.setup = setup
+        self._idle = []
+        self._idle_path = None
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.closed = 0
+        self.acquired = 0
+        self.reused = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+
+    def _acquire(self):
+        path = self.path or DATABASE_PATH
+        stale = []
+        conn = None
+        with self._lock:
+            if self._idle_path != path:
+                stale, self._idle = self._idle, []
+                self._idle_path = path
+            if self._idle:
+                conn = self._idle.pop()
+                self.reused += 1
+            self.acquired += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+        for old in stale:
+            self._close(old)
+        if conn is None:
+            try:
+                conn = open_connection(path)
+                if self.setup:
+                    self.setup(conn)
+            except Exception:
+                with self._lock:
+                    self.in_use -= 1
+                raise
+            with self._lock:
+                self.opened += 1
+        return conn, path
+
+    def _release(self, conn, path):
+        try:
+            # Never hand the next caller an open transaction
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+            keep = True
+        except sqlite3.ProgrammingError:
+            # Closed by the caller
+            keep = False
+        with self._lock:
+            self.in_use -= 1
+            if keep and path == self._idle_path and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        if keep:
+            self._close(conn)
+
+    def _close(self, conn):
+        conn.close()
+        with self._lock:
+            self.closed += 1
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commits if the block succeeds, rolls back if it raises"""
+        conn, path = self._acquire()
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        finally:
+            self._release(conn, path)
+
+    def close_idle(self):
+        """Close every idle connection, e.g. before the database file is moved or deleted"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'idle': len(self._idle),
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'max_idle': self.max_idle,
+                'opened': self.opened,
+                'closed': self.closed,
+                'acquired': self.acquired,
+                'reused': self.reused,
+                'reuse_rate': round(self.reused / self.acquired, 4) if self.acquired else 0.0
+            }
+
+db_pool = ConnectionPool()
+
+def db_connection():
+    """Borrow a pooled connection to the main database: with db_connection() as conn: ..."""
+    return db_pool.connection()
+
+def get_content_version(name):
+    """Get the version counter of a content set ('bricks' or 'steps'); 0 if never bumped"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT version FROM ContentVersion WHERE name = ?', (name,))
+            row = cursor.fetchone()
+        except sqlite3.OperationalError:
+            row = None
+    return row[0] if row else 0
+
+def bump_content_version(name, conn=None):
+    """Increment a content version so cached API responses for it are rebuilt"""
+    if conn is None:
+        with db_connection() as conn:
+            return bump_content_version(name, conn)
     cursor = conn.cursor()
     cursor.execute('''
-        SELECT * FROM word 
-        WHERE level BETWEEN ? AND ?
-        ORDER BY level
-    ''', (level_start, level_end))
-    words = cursor.fetchall()
-    conn.close()
-    return words
+        INSERT INTO ContentVersion (name, version) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1
+    ''', (name,))
 
-def get_words_by_language(word_language):
-    """Get words by language"""
-    conn = get_connection()
+# Back the filtered, keyset-paginated /api/bricks and /api/steps queries
+CONTENT_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_brick_language_level ON Brick(language, level, group_number)',
+    'CREATE INDEX IF NOT EXISTS idx_step_language_day ON Step(language, day)'
+)
+
+def ensure_content_indexes(conn=None):
+    """Create the content indexes; tables that do not exist yet are skipped"""
+    if conn is None:
+        with db_connection() as conn:
+            return ensure_content_indexes(conn)
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM word WHERE word_language = ?', (word_language,))
-    words = cursor.fetchall()
-    conn.close()
-    return words
+    for statement in CONTENT_INDEXES:
+        try:
+            cursor.execute(statement)
+        except sqlite3.OperationalError:
+            pass
+
+def content_filter_sql(filters, key_columns, after):
+    """WHERE clause and params for equality/range filters plus a keyset cursor on key_columns"""
+    clauses, params = [], []
+    for clause, value in filters:
+        if value is not None:
+            clauses.append(clause)
+            params.append(value)
+    if after is not None:
+        clauses.append(f"({', '.join(key_columns)}) > ({', '.join(['?'] * len(key_columns))})")
+        params.extend(after)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+    return f"{where} ORDER BY {', '.join(key_columns)}", params
+
+GROUP_TABLES = {'brick': 'Brick', 'step': 'Step'}
 
-def get_random_words(language, limit=10):
-    """Get random words for practice"""
-    conn = get_connection()
+def match_vocabulary(candidates, text, definition):
+    """
+    The (id, word, definition) among candidates (rows with the same word, ignoring
+    case) that a lesson word means: same spelling and definition, then the same
+    definition ignoring case, then one of the row's comma-separated definitions
+    """
+    wanted = definition.casefold()
+    for candidate in candidates:
+        if candidate[1] == text and candidate[2] == definition:
+            return candidate
+    for candidate in candidates:
+        if candidate[2].casefold() == wanted:
+            return candidate
+    for candidate in candidates:
+        if not wanted or wanted in [meaning.strip().casefold() for meaning in candidate[2].split(',')]:
+            return candidate
+    return None
+
+def link_group_words(kind, groups, conn=None):
+    """
+    Replace the GroupWord rows of the given groups of one kind ('brick' or
+    'step'); groups maps group_id to (language, level, [(position, text,
+    definition, type)]), with any number of words. Returns rows written. Each
+    lesson word links to the vocabulary row it names (see match_vocabulary),
+    and GroupWord keeps the lesson's own spelling where it differs. Only words
+    with no vocabulary row get a row of their own, flagged lesson_only so the
+    samplers and word search skip it.
+    """
+    if conn is None:
+        with db_connection() as conn:
+            return link_group_words(kind, groups, conn)
     cursor = conn.cursor()
+    cursor.executemany('DELETE FROM GroupWord WHERE kind = ? AND group_id = ?',
+                       [(kind, group_id) for group_id in groups])
+    # (language, casefolded word) -> vocabulary rows; (language, word, definition) -> lesson-only row id
+    vocabulary = {}
+    lesson_words = {}
+    for language in {language for language, _, _ in groups.values()}:
+        cursor.execute('SELECT id, word, definition, lesson_only FROM word WHERE word_language = ? ORDER BY id',
+                       (language,))
+        for word_id, text, definition, lesson_only in cursor.fetchall():
+            if lesson_only:
+                lesson_words[(language, text, definition)] = word_id
+            else:
+                vocabulary.setdefault((language, text.casefold()), []).append((word_id, text, definition))
+    links = []
+    for group_id, (language, level, words) in groups.items():
+        for position, text, definition, word_type in words:
+            if not text or not text.strip():
+                continue
+            text, definition = text.strip(), (definition or '').strip()
+            match = match_vocabulary(vocabulary.get((language, text.casefold()), []), text, definition)
+            if match is not None:
+                word_id = match[0]
+                shown_text = text if text != match[1] else None
+                shown_definition = definition if definition != match[2] else None
+            else:
+                shown_text = shown_definition = None
+                word_id = lesson_words.get((language, text, definition))
+                if word_id is None:
+                    # Lesson definitions are all English
+                    cursor.execute('''
+                        INSERT INTO word (word, word_language, definition, definition_language, level, lesson_only)
+                        VALUES (?, ?, ?, 'English', ?, 1)
+                    ''', (text, language, definition, level))
+                    word_id = lesson_words[(language, text, definition)] = cursor.lastrowid
+            links.append((kind, group_id, position, word_id, word_type or '', shown_text, shown_definition))
+    cursor.executemany('''
+        INSERT INTO GroupWord (kind, group_id, position, word_id, type, text, definition) VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', links)
+    # Lesson-only words no group uses any more
     cursor.execute('''
-        SELECT * FROM word 
-        WHERE word_language = ? 
-        ORDER BY RANDOM() 
-        LIMIT ?
-    ''', (language, limit))
-    words = cursor.fetchall()
-    conn.close()
+        DELETE FROM word WHERE lesson_only = 1 AND NOT EXISTS (SELECT 1 FROM GroupWord WHERE word_id = word.id)
+    ''')
+    return len(links)
+
+def sync_group_words(kind, conn=None):
+    """
+    Relink every GroupWord row of one kind to the vocabulary as it is now, from
+    the words the rows show; run after vocabulary changes. GroupWord is where
+    lesson words are stored, so this never adds or drops a word. Returns rows written.
+    """
+    if conn is None:
+        with db_connection() as conn:
+            return sync_group_words(kind, conn)
+    cursor = conn.cursor()
+    # Steps have days, not levels; their lesson-only words get level 0
+    level_column = 'c.level' if kind == 'brick' else '0'
+    cursor.execute(f'''
+        SELECT gw.group_id, c.language, {level_column}, gw.position,
+               COALESCE(gw.text, w.word), COALESCE(gw.definition, w.definition), gw.type
+        FROM GroupWord gw
+        JOIN word w ON w.id = gw.word_id
+        JOIN {GROUP_TABLES[kind]} c ON c.group_id = gw.group_id
+        WHERE gw.kind = ?
+        ORDER BY gw.group_id, gw.position
+    ''', (kind,))
+    groups = {}
+    for group_id, language, level, *word in cursor.fetchall():
+        groups.setdefault(group_id, (language, level, []))[2].append(tuple(word))
+    return link_group_words(kind, groups, conn)
+
+def get_group_words(kind, group_ids, chunk_size=500):
+    """Map each group_id to its ordered words ({'text', 'definition', 'type'}) with one GroupWord/word join per chunk"""
+    words = {group_id: [] for group_id in group_ids}
+    ids = list(words)
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            cursor.execute(f'''
+                SELECT gw.group_id, COALESCE(gw.text, w.word), COALESCE(gw.definition, w.definition), gw.type
+                FROM GroupWord gw JOIN word w ON w.id = gw.word_id
+                WHERE gw.kind = ? AND gw.group_id IN ({', '.join(['?'] * len(chunk))})
+                ORDER BY gw.group_id, gw.position
+            ''', [kind, *chunk])
+            for group_id, text, definition, word_type in cursor.fetchall():
+                words[group_id].append({'text': text, 'definition': definition or '', 'type': word_type or ''})
     return words
 
-def search_words(search_term):
-    """Search words by term"""
-    conn = get_connection()
+def get_groups_with_word(word, word_language=None):
+    """Get (kind, group_id, position) of every group that contains a word"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        sql = '''
+            SELECT gw.kind, gw.group_id, gw.position
+            FROM word w JOIN GroupWord gw ON gw.word_id = w.id
+            WHERE (w.word = ? OR gw.text = ?)
+        '''
+        params = [word, word]
+        if word_language:
+            sql += ' AND w.word_language = ?'
+            params.append(word_language)
+        cursor.execute(sql + ' ORDER BY gw.kind, gw.group_id', params)
+        groups = cursor.fetchall()
+    return groups
+
+# kind -> (content table, user score table, ordering column)
+PROGRESS_TABLES = {'brick': ('Brick', 'UserBrick', 'level'), 'step': ('Step', 'UserStep', 'day')}
+
+def get_user_progress(kind, username, language=None):
+    """
+    Read a user's progress for one mode inside a single read transaction, so
+    the content version, group list and scores all come from one snapshot.
+    Returns (content version, [(group_id, level or day)], {group_id: score},
+    the user's total score across bricks and steps).
+    """
+    table, score_table, order_column = PROGRESS_TABLES[kind]
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN')
+        try:
+            try:
+                cursor.execute('SELECT version FROM ContentVersion WHERE name = ?', (f'{kind}s',))
+                row = cursor.fetchone()
+            except sqlite3.OperationalError:
+                row = None
+            version = row[0] if row else 0
+            where = ' WHERE language = ?' if language else ''
+            cursor.execute(f'SELECT group_id, {order_column} FROM {table}{where}', (language,) if language else ())
+            groups = cursor.fetchall()
+            scores = {}
+            total_score = 0
+            if username:
+                cursor.execute(f'SELECT group_id, score FROM {score_table} WHERE username = ?', (username,))
+                scores = dict(cursor.fetchall())
+                total_score = get_user_total(username, conn)
+        finally:
+            conn.rollback()
+    return version, groups, scores, total_score
+
+SCORE_UPSERT_SQL = '''
+    INSERT INTO {table} (username, group_id, score) VALUES (?, ?, ?)
+    ON CONFLICT(username, group_id) DO UPDATE SET score = excluded.score
+'''
+
+def save_user_score(kind, username, group_id, score, conn=None):
+    """
+    Store a user's score for one brick or step group and return it as saved.
+    A single UPSERT on the (username, group_id) unique key, so there is no
+    read-then-write race and no follow-up SELECT.
+    """
+    score_table = PROGRESS_TABLES[kind][1]
+    if conn is None:
+        with db_connection() as conn:
+            return save_user_score(kind, username, group_id, score, conn)
     cursor = conn.cursor()
+    cursor.execute(SCORE_UPSERT_SQL.format(table=score_table) + ' RETURNING score', (username, group_id, score))
+    return cursor.fetchone()[0]
+
+def stored_score(score):
+    """A score as the INTEGER score columns keep it: 3.0 becomes 3, 2.5 stays 2.5"""
+    return int(score) if isinstance(score, float) and score.is_integer() else score
+
+def save_user_scores(kind, rows, conn=None):
+    """Upsert many (username, group_id, score) rows of one kind in one executemany; the score triggers fire per row"""
+    score_table = PROGRESS_TABLES[kind][1]
+    if conn is None:
+        with db_connection() as conn:
+            return save_user_scores(kind, rows, conn)
+    conn.executemany(SCORE_UPSERT_SQL.format(table=score_table), rows)
+
+def get_user_score(kind, username, group_id):
+    """A user's stored score for one group, or 0 if there is none"""
+    score_table = PROGRESS_TABLES[kind][1]
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT score FROM {score_table} WHERE username = ? AND group_id = ?', (username, group_id))
+        row = cursor.fetchone()
+    return (row[0] or 0) if row else 0
+
+def get_user_total(username, conn=None):
+    """User.total_score, kept current by the UserBrick/UserStep triggers (see migrations.py)"""
+    if conn is None:
+        with db_connection() as conn:
+            return get_user_total(username, conn)
+    cursor = conn.cursor()
+    cursor.execute('SELECT total_score FROM User WHERE username = ?', (username,))
+    row = cursor.fetchone()
+    return (row[0] or 0) if row else 0
+
+# What User.total_score should be: the sum of a user's brick and step scores
+COMPUTED_TOTAL_SQL = '''
+    COALESCE((SELECT SUM(score) FROM UserBrick WHERE UserBrick.username = User.username), 0)
+    + COALESCE((SELECT SUM(score) FROM UserStep WHERE UserStep.username = User.username), 0)
+'''
+
+def find_total_drift(conn=None, tolerance=1e-6):
+    """[(username, stored total, computed total)] for every user whose stored total is wrong"""
+    if conn is None:
+        with db_connection() as conn:
+            return find_total_drift(conn, tolerance)
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT username, total_score, computed FROM (
+            SELECT username, COALESCE(total_score, 0) AS total_score, {COMPUTED_TOTAL_SQL} AS computed FROM User
+        )
+        WHERE ABS(total_score - computed) > ?
+        ORDER BY username
+    ''', (tolerance,))
+    drift = cursor.fetchall()
+    # Scores whose user has no User row have no total at all
     cursor.execute('''
-        SELECT * FROM word 
-        WHERE word LIKE ? OR definition LIKE ?
-        ORDER BY word
-    ''', (f'%{search_term}%', f'%{search_term}%'))
-    words = cursor.fetchall()
-    conn.close()
+        SELECT username, NULL, SUM(score) FROM (
+            SELECT username, score FROM UserBrick UNION ALL SELECT username, score FROM UserStep
+        )
+        WHERE username NOT IN (SELECT username FROM User)
+        GROUP BY username
+    ''')
+    return drift + cursor.fetchall()
+
+def rebuild_user_totals(conn=None):
+    """Recompute every User.total_score from UserBrick and UserStep in bulk; returns the number of users"""
+    if conn is None:
+        with db_connection() as conn:
+            return rebuild_user_totals(conn)
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT OR IGNORE INTO User (username)
+        SELECT username FROM UserBrick UNION SELECT username FROM UserStep
+    ''')
+    cursor.execute(f'UPDATE User SET total_score = {COMPUTED_TOTAL_SQL}')
+    return cursor.rowcount
+
+def rebuild_leaderboard(conn=None):
+    """
+    Recompute the 'all' and per-language LeaderboardScore boards from UserBrick
+    and UserStep; every User is on 'all'. Weekly boards only exist incrementally (scores carry no
+    timestamps) and are kept. Returns the number of rows written.
+    """
+    if conn is None:
+        with db_connection() as conn:
+            return rebuild_leaderboard(conn)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM LeaderboardScore WHERE board NOT LIKE 'week:%'")
+    scores = [
+        "SELECT 'all' AS board, username, COALESCE(score, 0) AS score FROM UserBrick",
+        "SELECT 'all', username, COALESCE(score, 0) FROM UserStep",
+        # Users without scores are on the 'all' board at 0
+        "SELECT 'all', username, 0 FROM User"
+    ]
+    # A database whose content has not been imported yet has no language boards
+    for scores_table, content_table in (('UserBrick', 'Brick'), ('UserStep', 'Step')):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (content_table,))
+        if cursor.fetchone():
+            scores.append(f'''SELECT 'lang:' || c.language, u.username, COALESCE(u.score, 0)
+                FROM {scores_table} u JOIN {content_table} c ON c.group_id = u.group_id''')
+    cursor.execute(f'''
+        INSERT INTO LeaderboardScore (board, username, score)
+        SELECT board, username, SUM(score) FROM (
+            {' UNION ALL '.join(scores)}
+        )
+        GROUP BY board, username
+    ''')
+    return cursor.rowcount
+
+def get_board_scores(board):
+    """[(username, score)] of one leaderboard board, best first"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT username, score FROM LeaderboardScore WHERE board = ?
+            ORDER BY score DESC, username
+        ''', (board,))
+        rows = cursor.fetchall()
+    return rows
+
+def get_user_board_scores(username, boards):
+    """{board: score} for one user on the given boards; boards the user has no score on are left out"""
+    boards = list(boards)
+    if not boards:
+        return {}
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT board, score FROM LeaderboardScore
+            WHERE username = ? AND board IN ({', '.join(['?'] * len(boards))})
+        ''', [username] + boards)
+        scores = dict(cursor.fetchall())
+    return scores
+
+# word rows as callers have always received them, without the bookkeeping columns
+WORD_COLUMNS = 'id, word, word_language, definition, definition_language, level'
+
+def get_words_by_level(level_start, level_end):
+    """Get words within a level range"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {WORD_COLUMNS} FROM word
+            WHERE level BETWEEN ? AND ? AND lesson_only = 0
+            ORDER BY level
+        ''', (level_start, level_end))
+        words = cursor.fetchall()
+    return words
+
+def get_words_by_language(word_language):
+    """Get words by language"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {WORD_COLUMNS} FROM word WHERE word_language = ? AND lesson_only = 0', (word_language,))
+        words = cursor.fetchall()
+    return words
+
+class IdSampler:
+    """
+    Random draws from a content table without ORDER BY RANDOM(), which sorts
+    every matching row to keep a handful. The ids of one key (a language) are
+    loaded once per content version, straight off the (language, level) index,
+    into one sorted array per level. A draw then picks positions in those
+    arrays, so its cost depends on how many rows are drawn, not on table size.
+
+    sample() and stratified_sample() take an optional seed; the same seed over
+    the same content draws the same ids. draw() continues a named sequence
+    that never repeats an id until the whole population has been drawn (a
+    Fisher-Yates shuffle done a few positions per call, remembering only the
+    positions it has swapped).
+    """
+
+    def __init__(self, table, id_column, key_column, level_column, version_name, condition=None,
+                 max_sequences=1024):
+        self.table = table
+        self.id_column = id_column
+        self.key_column = key_column
+        self.level_column = level_column
+        self.version_name = version_name
+        # Extra SQL filter on the rows that can be drawn
+        self.condition = condition
+        self.max_sequences = max_sequences
+        # key -> (content version, {level: array of ids})
+        self._populations = {}
+        # (name, key, levels) -> [content version, Random, position, swapped positions]
+        self._sequences = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.draws = 0
+
+    def population(self, key):
+        """{level: sorted array of ids} for one key, reloaded when the content version moves"""
+        version = get_content_version(self.version_name)
+        with self._lock:
+            cached = self._populations.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        levels = {}
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {self.level_column}, {self.id_column} FROM {self.table}
+                WHERE {self.key_column} = ?{f' AND {self.condition}' if self.condition else ''}
+                ORDER BY {self.level_column}, {self.id_column}
+            ''', (key,))
+            for level, row_id in cursor:
+                ids = levels.get(level)
+                if ids is None:
+                    ids = levels[level] = array('q')
+                ids.append(row_id)
+        with self._lock:
+            self._populations[key] = (version, levels)
+            self.loads += 1
+        return levels
+
+    def _strata(self, key, levels):
+        """([id arrays], [cumulative sizes]) for the chosen levels, all of them when levels is None"""
+        population = self.population(key)
+        chosen = sorted(population) if levels is None else sorted(set(levels) & set(population))
+        arrays = [population[level] for level in chosen]
+        ends, total = [], 0
+        for ids in arrays:
+            total += len(ids)
+            ends.append(total)
+        return arrays, ends
+
+    @staticmethod
+    def _id_at(arrays, ends, position):
+        """Id at a position of the levels laid end to end"""
+        index = bisect.bisect_right(ends, position)
+        start = ends[index - 1] if index else 0
+        return arrays[index][position - start]
+
+    def sample(self, key, k, levels=None, seed=None):
+        """Up to k distinct random ids of key (optionally only these levels)"""
+        arrays, ends = self._strata(key, levels)
+        total = ends[-1] if ends else 0
+        positions = random.Random(seed).sample(range(total), min(k, total))
+        self.draws += 1
+        return [self._id_at(arrays, ends, position) for position in positions]
+
+    def stratified_sample(self, key, k, levels=None, seed=None):
+        """
+        Up to k distinct ids with every level represented in proportion to its
+        size (largest remainder), so small levels are not drowned out by chance
+        """
+        rng = random.Random(seed)
+        arrays, ends = self._strata(key, levels)
+        total = ends[-1] if ends else 0
+        k = min(k, total)
+        if not k:
+            return []
+        shares = [len(ids) * k / total for ids in arrays]
+        counts = [int(share) for share in shares]
+        by_remainder = sorted(range(len(arrays)), key=lambda i: counts[i] - shares[i])
+        for i in by_remainder[:k - sum(counts)]:
+            counts[i] += 1
+        self.draws += 1
+        return [ids[position] for ids, count in zip(arrays, counts) for position in rng.sample(range(len(ids)), count)]
+
+    def draw(self, name, key, k, levels=None, seed=None):
+        """
+        The next k ids of sequence name: no id repeats until every id of the
+        population has been drawn, then a new pass starts. seed only applies
+        when the sequence starts (or restarts after the content changed).
+        """
+        arrays, ends = self._strata(key, levels)
+        total = ends[-1] if ends else 0
+        if not total:
+            return []
+        version = get_content_version(self.version_name)
+        sequence_key = (name, key, None if levels is None else tuple(sorted(set(levels))))
+        with self._lock:
+            sequence = self._sequences.get(sequence_key)
+            if sequence is None or sequence[0] != version:
+                sequence = [version, random.Random(seed), 0, {}]
+                self._sequences[sequence_key] = sequence
+            self._sequences.move_to_end(sequence_key)
+            while len(self._sequences) > self.max_sequences:
+                self._sequences.popitem(last=False)
+            _, rng, position, swapped = sequence
+            drawn = []
+            for _ in range(min(k, total)):
+                if position == total:
+                    position, swapped = 0, {}
+                pick = rng.randrange(position, total)
+                chosen = swapped.get(pick, pick)
+                swapped[pick] = swapped.pop(position, position)
+                drawn.append(chosen)
+                position += 1
+            sequence[2], sequence[3] = position, swapped
+            self.draws += 1
+        return [self._id_at(arrays, ends, p) for p in drawn]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'keys': {key: sum(len(ids) for ids in levels.values())
+                         for key, (_, levels) in self._populations.items()},
+                'sequences': len(self._sequences),
+                'loads': self.loads,
+                'draws': self.draws
+            }
+
+
+# Lesson-only words are not vocabulary to practise
+word_sampler = IdSampler('word', 'id', 'word_language', 'level', 'words', 'lesson_only = 0')
+brick_sampler = IdSampler('Brick', 'group_id', 'language', 'level', 'bricks')
+
+def get_rows_by_id(table, id_column, ids, columns='*', conn=None):
+    """Rows of table for ids, in the order of ids"""
+    if not ids:
+        return []
+    if conn is None:
+        with db_connection() as conn:
+            return get_rows_by_id(table, id_column, ids, columns, conn)
+    found = {}
+    cursor = conn.cursor()
+    # Stay under SQLite's bound-parameter limit
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        cursor.execute(f'''
+            SELECT {id_column}, {columns} FROM {table} WHERE {id_column} IN ({', '.join(['?'] * len(chunk))})
+        ''', chunk)
+        for row in cursor.fetchall():
+            found[row[0]] = row[1:]
+    return [found[row_id] for row_id in ids if row_id in found]
+
+def get_random_words(language, limit=10, seed=None):
+    """Get random words for practice; the same seed gives the same words"""
+    return get_rows_by_id('word', 'id', word_sampler.sample(language, limit, seed=seed), WORD_COLUMNS)
+
+def fts_query(search_term):
+    """
+    FTS5 MATCH expression for free text: every term must match, each as a
+    prefix. Terms are quoted so user input is never parsed as FTS syntax.
+    Returns None when the text has no searchable terms.
+    """
+    terms = re.findall(r'\w+', search_term or '')
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+# bm25 column weights: a hit on the word itself outranks one in its definition
+WORD_SEARCH_RANK = 'bm25(word_fts, 10.0, 1.0)'
+WORD_SEARCH_COLUMNS = ('id', 'word', 'word_language', 'definition', 'level', 'rank')
+
+def search_words(search_term, language=None, after=None, limit=50):
+    """
+    Vocabulary words whose text or definition matches search_term, best first,
+    from the word_fts index; lesson-only words are left out. Accents are ignored. after is the (rank, id) of the last
+    result already returned. Returns dicts with WORD_SEARCH_COLUMNS.
+    """
+    query = fts_query(search_term)
+    if query is None:
+        return []
+    sql = f'''
+        SELECT * FROM (
+            SELECT w.id, w.word, w.word_language, w.definition, w.level, {WORD_SEARCH_RANK} AS rank
+            FROM word_fts JOIN word w ON w.id = word_fts.rowid
+            WHERE word_fts MATCH ? AND w.lesson_only = 0{' AND w.word_language = ?' if language else ''}
+        )
+    '''
+    params = [query] + ([language] if language else [])
+    if after is not None:
+        sql += ' WHERE (rank, id) > (?, ?)'
+        params.extend(after)
+    sql += ' ORDER BY rank, id LIMIT ?'
+    params.append(limit)
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        words = [dict(zip(WORD_SEARCH_COLUMNS, row)) for row in cursor.fetchall()]
     return words
 
+def search_groups(kind, search_term, language=None, after=None, limit=50):
+    """
+    Brick or Step groups containing a word that matches search_term, ranked by
+    their best-matching word. after is the (rank, group_id) of the last result
+    already returned. Returns dicts with group_id, language, level or day,
+    rank and the matched words.
+    """
+    table, _, order_column = PROGRESS_TABLES[kind]
+    query = fts_query(search_term)
+    if query is None:
+        return []
+    # bm25() cannot run inside an aggregate, so rank the matching words first
+    sql = f'''
+        WITH hits AS MATERIALIZED (
+            SELECT rowid AS word_id, {WORD_SEARCH_RANK} AS rank FROM word_fts WHERE word_fts MATCH ?
+        )
+        SELECT g.group_id, g.language, g.{order_column}, MIN(hits.rank) AS rank,
+               json_group_array(DISTINCT COALESCE(gw.text, w.word))
+        FROM hits
+        JOIN word w ON w.id = hits.word_id
+        JOIN GroupWord gw ON gw.word_id = hits.word_id AND gw.kind = ?
+        JOIN {table} g ON g.group_id = gw.group_id{' WHERE g.language = ?' if language else ''}
+        GROUP BY g.group_id
+    '''
+    params = [query, kind] + ([language] if language else [])
+    if after is not None:
+        sql += ' HAVING (rank, g.group_id) > (?, ?)'
+        params.extend(after)
+    sql += ' ORDER BY rank, g.group_id LIMIT ?'
+    params.append(limit)
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        groups = [
+            {'group_id': group_id, 'language': language, order_column: order, 'rank': rank,
+             'matched_words': json.loads(words)}
+            for group_id, language, order, rank, words in cursor.fetchall()
+        ]
+    return groups
+
 def get_word_count():
     """Get total word count"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) FROM word')
-    count = cursor.fetchone()[0]
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM word')
+        count = cursor.fetchone()[0]
     return count
 
 def add_word(word, word_language, definition, definition_language, level):
     """Add a new word to the database"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO word (word, word_language, definition, definition_language, level)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (word, word_language, definition, definition_language, level))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO word (word, word_language, definition, definition_language, level)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (word, word_language, definition, definition_language, level))
 
 def get_word_by_id(word_id):
     """Get a specific word by ID"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM word WHERE id = ?', (word_id,))
-    word = cursor.fetchone()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {WORD_COLUMNS} FROM word WHERE id = ?', (word_id,))
+        word = cursor.fetchone()
     return word
 
+BRICK_KEY_COLUMNS = ('language', 'level', 'group_number', 'group_id')
+# Words come from GroupWord
+BRICK_COLUMNS = ('group_id', 'language', 'level', 'group_number', 'scene', 'image', 'completed')
+# Completion is per user: a brick is completed once the user has a non-zero score for it
+COMPLETED_BRICKS_SQL = 'SELECT group_id FROM UserBrick WHERE username = ? AND score > 0'
+
+def query_bricks(language=None, level_min=None, level_max=None, completed=None, after=None, limit=None,
+                 username=None):
+    """
+    Get Brick rows as dicts in BRICK_KEY_COLUMNS order, filtered and continuing
+    after the key 'after'. 'completed' (the column and the filter) is the given
+    user's completion; without a username the filter is not allowed.
+    """
+    if completed is not None and not username:
+        raise ValueError("Filtering on 'completed' needs a username")
+    filters = [
+        ('language = ?', language),
+        ('level >= ?', level_min),
+        ('level <= ?', level_max)
+    ]
+    if completed is not None:
+        filters.append((f"group_id {'IN' if completed else 'NOT IN'} ({COMPLETED_BRICKS_SQL})", username))
+    sql, params = content_filter_sql(filters, BRICK_KEY_COLUMNS, after)
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    columns = list(BRICK_COLUMNS)
+    if username:
+        columns[-1] = f'group_id IN ({COMPLETED_BRICKS_SQL})'
+        params.insert(0, username)
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {', '.join(columns)} FROM Brick" + sql, params)
+        rows = [dict(zip(BRICK_COLUMNS, row)) for row in cursor.fetchall()]
+    return rows
+
 def get_all_bricks():
     """Get all bricks from the database"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    # First get table info to see column names
-    cursor.execute('PRAGMA table_info(Brick)')
-    columns = cursor.fetchall()
-    print(f"Brick table columns: {columns}")
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        # First get table info to see column names
+        cursor.execute('PRAGMA table_info(Brick)')
+        columns = cursor.fetchall()
+        print(f"Brick table columns: {columns}")
     
-    # Simple SELECT without ORDER BY to avoid column name issues
-    cursor.execute('SELECT * FROM Brick')
-    bricks = cursor.fetchall()
-    conn.close()
+        # Simple SELECT without ORDER BY to avoid column name issues
+        cursor.execute('SELECT * FROM Brick')
+        bricks = cursor.fetchall()
     return bricks
 
 def get_brick_by_id(brick_id):
     """Get a specific brick by ID"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM Brick WHERE id = ?', (brick_id,))
-    brick = cursor.fetchone()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM Brick WHERE id = ?', (brick_id,))
+        brick = cursor.fetchone()
     return brick
 
 def get_bricks_by_level(level_start, level_end):
     """Get bricks within a level range"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM Brick 
-        WHERE level BETWEEN ? AND ?
-        ORDER BY level
-    ''', (level_start, level_end))
-    bricks = cursor.fetchall()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM Brick 
+            WHERE level BETWEEN ? AND ?
+            ORDER BY level
+        ''', (level_start, level_end))
+        bricks = cursor.fetchall()
     return bricks
 
 def get_bricks_by_language(brick_language):
     """Get bricks by language"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM Brick WHERE brick_language = ?', (brick_language,))
-    bricks = cursor.fetchall()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM Brick WHERE brick_language = ?', (brick_language,))
+        bricks = cursor.fetchall()
     return bricks
 
-def get_random_bricks(language, limit=10):
-    """Get random bricks for practice"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM Brick 
-        WHERE brick_language = ? 
-        ORDER BY RANDOM() 
-        LIMIT ?
-    ''', (language, limit))
-    bricks = cursor.fetchall()
-    conn.close()
-    return bricks
+def get_random_bricks(language, limit=10, seed=None):
+    """Get random bricks for practice; the same seed gives the same bricks"""
+    return get_rows_by_id('Brick', 'group_id', brick_sampler.sample(language, limit, seed=seed))
 
-def search_bricks(search_term):
-    """Search bricks by term"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM Brick 
-        WHERE brick LIKE ? OR definition LIKE ?
-        ORDER BY brick
-    ''', (f'%{search_term}%', f'%{search_term}%'))
-    bricks = cursor.fetchall()
-    conn.close()
-    return bricks
+def search_bricks(search_term, language=None, limit=50):
+    """Bricks containing a word that matches search_term, best match first"""
+    return search_groups('brick', search_term, language, limit=limit)
 
 def get_brick_count():
     """Get total brick count"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) FROM Brick')
-    count = cursor.fetchone()[0]
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM Brick')
+        count = cursor.fetchone()[0]
     return count
 
 def add_brick(brick, brick_language, definition, definition_language, level):
     """Add a new brick to the database"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO Brick (brick, brick_language, definition, definition_language, level, completed)
-        VALUES (?, ?, ?, ?, ?, 0)
-    ''', (brick, brick_language, definition, definition_language, level))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO Brick (brick, brick_language, definition, definition_language, level, completed)
+            VALUES (?, ?, ?, ?, ?, 0)
+        ''', (brick, brick_language, definition, definition_language, level))
 
 def set_brick_completed(group_id, completed=True):
     """Mark a brick as completed (requires 'completed' column in Brick table)"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('UPDATE Brick SET completed = ? WHERE group_id = ?', (int(completed), group_id))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('UPDATE Brick SET completed = ? WHERE group_id = ?', (int(completed), group_id))
+        bump_content_version('bricks', conn)
 
 def get_completed_bricks():
     """Get IDs of completed bricks"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id FROM Brick WHERE completed = 1')
-    ids = [row[0] for row in cursor.fetchall()]
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id FROM Brick WHERE completed = 1')
+        ids = [row[0] for row in cursor.fetchall()]
     return ids
 
-def get_all_steps():
-    """Get all steps from the Step table"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('PRAGMA table_info(Step)')
-    columns_info = cursor.fetchall()
-    column_names = [col[1] for col in columns_info]
-    cursor.execute('SELECT * FROM Step')
-    steps = cursor.fetchall()
-    conn.close()
+def get_group_image(kind, group_id):
+    """Get the image filename of a Brick or Step group (kind is 'brick' or 'step')"""
+    table = {'brick': 'Brick', 'step': 'Step'}.get(kind)
+    if table is None:
+        raise ValueError(f"Unknown group kind: {kind}")
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT image FROM {table} WHERE group_id = ?', (group_id,))
+        row = cursor.fetchone()
+    if not row or not row[0]:
+        return None
+    # Stored paths may be Windows paths, so split on both separators
+    return row[0].strip().replace('\\', '/').split('/')[-1]
+
+def get_precomputed_bbox(image, image_hash, target):
+    """
+    Get a precomputed detection row (found, x, y, w, h) from WordBBox, or None.
+    Rows computed for other content of the image (it was replaced) do not count.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT found, x, y, w, h FROM WordBBox WHERE image = ? AND target = ? AND image_hash = ?',
+                           (image, target, image_hash))
+            row = cursor.fetchone()
+        except sqlite3.OperationalError:
+            # WordBBox is created by precompute_bboxes.py; treat a missing table as a miss
+            row = None
+    return row
+
+STEP_KEY_COLUMNS = ('language', 'day', 'group_id')
+STEP_COLUMNS = ('group_id', 'language', 'day', 'image', 'video')
+
+def get_all_steps(language=None, day_min=None, day_max=None, after=None, limit=None):
+    """Get steps from the Step table in STEP_KEY_COLUMNS order, optionally filtered and paginated"""
+    filters = [
+        ('language = ?', language),
+        ('day >= ?', day_min),
+        ('day <= ?', day_max)
+    ]
+    sql, params = content_filter_sql(filters, STEP_KEY_COLUMNS, after)
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {', '.join(STEP_COLUMNS)} FROM Step" + sql, params)
+        steps = cursor.fetchall()
+    words_by_group = get_group_words('step', [step[0] for step in steps])
     step_list = []
-    print("DEBUG: get_all_steps called")  # Confirm function is running
-    sys.stdout.flush()
     for step in steps:
-        print("\n--- STEP DEBUG ---")
-        step_dict = dict(zip(column_names, step))
-        print("DEBUG step_dict:", step_dict)
-        sys.stdout.flush()
-        words = []
-        for i in range(1, 9):
-            word_text = step_dict.get(f'word{i}')
-            word_def = step_dict.get(f'definition{i}')
-            word_type = step_dict.get(f'type{i}')
-            if word_text and word_text.strip():
-                words.append({
-                    'text': word_text,
-                    'definition': word_def if word_def else '',
-                    'type': word_type if word_type else ''
-                })
+        step_dict = dict(zip(STEP_COLUMNS, step))
+        words = words_by_group[step_dict['group_id']]
         image_path = step_dict.get('image')
         image_url = None
-        if image_path:
-            import os
-            image_filename = os.path.basename(image_path)
+        if image_path and image_path.strip():
+            # Stored paths may be Windows paths, so split on both separators
+            image_filename = image_path.strip().replace('\\', '/').split('/')[-1]
             image_url = f'/data/images/{image_filename}'
         # Find the correct key for the video field from the debug output
         video_path = step_dict.get('video')  # Change 'video' to the actual key if needed
@@ -246,7 +1071,5 @@ def get_all_steps():
             'words': words,
             'video': video_url
         })
-    print("DEBUG: get_all_steps finished")
-    sys.stdout.flush()
     return step_list
 
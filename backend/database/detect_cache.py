@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import hashlib
+
+from lru import LRUCache
+from database.db_helper import ConnectionPool
+
+DETECT_CACHE_PATH = os.path.join(os.path.dirname(__file__), 'detect_cache.db')
+# Bump when the detection model or prompt changes so stale boxes are ignored
+DETECT_CACHE_VERSION = 1
+DETECT_CACHE_TTL = int(os.getenv('DETECT_CACHE_TTL', 30 * 24 * 3600))
+DETECT_CACHE_MEMORY_ENTRIES = int(os.getenv('DETECT_CACHE_MEMORY_ENTRIES', 4096))
+
+
+def hash_image_bytes(image_bytes):
+    """Content hash used as the image part of the cache key"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def normalize_target(target):
+    """First comma-separated definition, lower-cased with collapsed whitespace"""
+    first = (target or '').split(',')[0]
+    return ' '.join(first.lower().split())
+
+
+class DetectCache:
+    """Two-level detection result cache: in-process LRU in front of a SQLite table"""
+
+    def __init__(self, path=DETECT_CACHE_PATH, ttl=DETECT_CACHE_TTL,
+                 version=DETECT_CACHE_VERSION, max_entries=DETECT_CACHE_MEMORY_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.version = version
+        self.memory = LRUCache(max_entries=max_entries)
+        self.pool = ConnectionPool(path, setup=self._create_table)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @staticmethod
+    def _create_table(conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS detect_cache (
+                image_hash TEXT NOT NULL,
+                target TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (image_hash, target)
+            )
+        ''')
+        conn.commit()
+
+    def _is_fresh(self, version, created_at):
+        return version == self.version and (not self.ttl or created_at + self.ttl > time.time())
+
+    def get(self, image_hash, target):
+        """Return the cached result dict for (image_hash, target) or None"""
+        return self._lookup(image_hash, target, count=True)
+
+    def peek(self, image_hash, target):
+        """get() for a re-check after a counted miss: updates no hit/miss counters"""
+        return self._lookup(image_hash, target, count=False)
+
+    def _lookup(self, image_hash, target, count):
+        key = (image_hash, normalize_target(target))
+        entry = self.memory.get(key) if count else self.memory.peek(key)
+        if entry is not None:
+            result, created_at = entry
+            if self._is_fresh(self.version, created_at):
+                if count:
+                    self.memory_hits += 1
+                return dict(result)
+            self.memory.pop(key)
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                'SELECT version, result, created_at FROM detect_cache WHERE image_hash = ? AND target = ?',
+                key
+            ).fetchone()
+        if row and self._is_fresh(row[0], row[2]):
+            result = json.loads(row[1])
+            self.memory.put(key, (result, row[2]))
+            if count:
+                self.disk_hits += 1
+            return dict(result)
+        if count:
+            self.misses += 1
+        return None
+
+    def put(self, image_hash, target, result):
+        """Store a successful detection result (found or not found)"""
+        key = (image_hash, normalize_target(target))
+        created_at = time.time()
+        with self.pool.connection() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO detect_cache (image_hash, target, version, result, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', key + (self.version, json.dumps(result), created_at))
+        self.memory.put(key, (dict(result), created_at))
+        self.stores += 1
+
+    def purge_expired(self):
+        """Delete rows from older versions or past their TTL"""
+        with self.pool.connection() as conn:
+            cursor = conn.execute(
+                'DELETE FROM detect_cache WHERE version != ? OR created_at < ?',
+                (self.version, time.time() - self.ttl if self.ttl else 0)
+            )
+        self.memory.clear()
+        return cursor.rowcount
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            'memory': self.memory.stats(),
+            'pool': self.pool.stats(),
+            'version': self.version,
+            'ttl': self.ttl
+        }
+
+
+detect_cache = DetectCache()
@@ -0,0 +1,433 @@
+import os
+import re
+import sys
+import csv
+import json
+import time
+import hashlib
+import argparse
+from contextlib import contextmanager
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_helper import (get_connection, bump_content_version, sync_group_words, link_group_words, rebuild_leaderboard,
+                       CONTENT_INDEXES, GROUP_TABLES)
+from migrations import run_migrations, table_exists, create_word_search, create_word_sampling, create_word_sampling_index
+
+# One importer for every content file: the vocab CSV/JSON files (word),
+# word_groups.csv (Brick) and Steps_data.csv (Step). Rows are streamed into a
+# temp staging table with executemany, then applied to the real table with
+# three set-based statements inside one transaction. Each row carries a hash
+# of its values (row_hash), so a reload only writes the rows that changed,
+# and ids, GroupWord links and user scores survive it. A group's words (any
+# number of wordN/definitionN/typeN columns) go straight to GroupWord; they are
+# part of the group's hash, so only groups that changed are relinked.
+#
+#   python database/importer.py                    # every default file
+#   python database/importer.py bricks             # one dataset, default file
+#   python database/importer.py vocab data/vocab-ES-EN.json
+
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 5000))
+# Applied to the importer's own connection only. synchronous=OFF is safe here:
+# the import is one transaction, and a crash just means running it again.
+IMPORT_PRAGMAS = (
+    ('synchronous', 'OFF'),
+    ('temp_store', 'MEMORY'),
+    ('cache_size', -256 * 1024)
+)
+
+DATABASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(DATABASE_DIR), 'data')
+LANGUAGE_CODES = {'ES': 'Spanish', 'DE': 'German', 'EN': 'English'}
+# Vocab files are split into levels of this many words, in file order
+WORDS_PER_LEVEL = 50
+
+WORD_SCHEMA = '''
+    CREATE TABLE word (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        word TEXT NOT NULL,
+        word_language TEXT NOT NULL,
+        definition TEXT NOT NULL,
+        definition_language TEXT NOT NULL,
+        level INTEGER NOT NULL,
+        row_hash TEXT,
+        lesson_only INTEGER NOT NULL DEFAULT 0
+    )
+'''
+BRICK_SCHEMA = '''
+    CREATE TABLE Brick (
+        group_id INTEGER PRIMARY KEY,
+        language TEXT NOT NULL,
+        level INTEGER NOT NULL,
+        group_number INTEGER NOT NULL,
+        scene TEXT,
+        image TEXT,
+        completed INTEGER DEFAULT 0,
+        row_hash TEXT
+    )
+'''
+STEP_SCHEMA = '''
+    CREATE TABLE Step (
+        group_id INTEGER PRIMARY KEY,
+        language TEXT NOT NULL,
+        day INTEGER NOT NULL,
+        image TEXT,
+        video TEXT,
+        row_hash TEXT
+    )
+'''
+
+
+def open_content_file(path):
+    """Open a content file; utf-8-sig drops a BOM, and a leading // comment line is skipped"""
+    file = open(path, 'r', encoding='utf-8-sig', newline='')
+    if not file.readline().startswith('//'):
+        file.seek(0)
+    return file
+
+def vocab_languages(path):
+    """(word language, definition language) from a vocab-ES-EN*.csv/json file name, (None, None) if it has none"""
+    match = re.match(r'vocab-([A-Z]{2})-([A-Z]{2})', os.path.basename(path))
+    if not match:
+        return None, None
+    return LANGUAGE_CODES.get(match.group(1)), LANGUAGE_CODES.get(match.group(2))
+
+def read_vocab(path, language, definition_language):
+    """word rows from a vocab CSV (word,translation columns) or JSON file ([{"word", "translation"}])"""
+    with open_content_file(path) as file:
+        entries = json.load(file) if path.endswith('.json') else csv.DictReader(file)
+        count = 0
+        for entry in entries:
+            word = (entry.get('word') or '').strip().strip('"')
+            translation = (entry.get('translation') or '').strip().strip('"')
+            # Skip empty rows
+            if not word or not translation:
+                continue
+            yield word, language, translation, definition_language, count // WORDS_PER_LEVEL + 1
+            count += 1
+
+def int_field(row, name):
+    value = (row.get(name) or '').strip()
+    return int(value) if value.isdigit() else None
+
+def word_positions(fieldnames):
+    """The N of every wordN column of a group file, in order"""
+    return sorted(int(name[4:]) for name in fieldnames or () if re.fullmatch(r'word\d+', name))
+
+def read_group_words(row, positions, quoted_definitions=False):
+    """A group row's words as ((position, text, definition, type), ...); empty word columns are left out"""
+    words = []
+    for i in positions:
+        text = (row.get(f'word{i}') or '').strip()
+        if not text:
+            continue
+        definition = (row.get(f'definition{i}') or '').strip()
+        words.append((i, text, definition.strip('"') if quoted_definitions else definition,
+                      (row.get(f'type{i}') or '').strip()))
+    return tuple(words)
+
+def read_bricks(path):
+    """Brick rows, each ending with its words, from word_groups.csv; rows without a group_id, language or level are skipped"""
+    with open_content_file(path) as file:
+        reader = csv.DictReader(file)
+        positions = word_positions(reader.fieldnames)
+        for row in reader:
+            group_id, level = int_field(row, 'group_id'), int_field(row, 'level')
+            language = (row.get('language') or '').strip()
+            if group_id is None or not language or not level:
+                continue
+            yield (group_id, language, level, int_field(row, 'group_number') or 0,
+                   (row.get('scene') or '').strip().strip('"'), (row.get('image') or '').strip(),
+                   read_group_words(row, positions, quoted_definitions=True))
+
+def read_steps(path):
+    """Step rows, each ending with its words, from Steps_data.csv; rows without a group_id, language or Day are skipped"""
+    with open_content_file(path) as file:
+        reader = csv.DictReader(file)
+        positions = word_positions(reader.fieldnames)
+        for row in reader:
+            group_id, day = int_field(row, 'group_id'), int_field(row, 'Day')
+            language = (row.get('language') or '').strip()
+            if group_id is None or not language or not day:
+                continue
+            yield (group_id, language, day, (row.get('image') or '').strip(), (row.get('video') or '').strip(),
+                   read_group_words(row, positions))
+
+def finish_groups(version):
+    def finish(conn):
+        # Per-language boards follow the languages of the groups
+        rebuild_leaderboard(conn)
+        bump_content_version(version, conn)
+    return finish
+
+def relink_group_words(conn):
+    for kind, table in GROUP_TABLES.items():
+        if table_exists(conn.cursor(), table):
+            sync_group_words(kind, conn)
+
+def create_word_table(cursor):
+    cursor.execute(WORD_SCHEMA)
+    cursor.execute('CREATE INDEX idx_word_lookup ON word(word_language, word, definition)')
+    create_word_search(cursor)
+    create_word_sampling(cursor)
+    create_word_sampling_index(cursor)
+
+def create_group_table(schema, index):
+    def create(cursor):
+        cursor.execute(schema)
+        cursor.execute(index)
+    return create
+
+# table: target table; keys: columns a file row is matched on; columns: what a
+# reader yields, in order; scope: column limiting which rows a file replaces
+# (a vocab file only replaces its own language); keep: rows a reload must not
+# delete even when the file no longer has them; claim: extra assignment for
+# rows a file updates; words: the GroupWord kind of the words that end each
+# row, for the group datasets.
+DATASETS = {
+    'vocab': {
+        'table': 'word',
+        'keys': ('word_language', 'word', 'definition'),
+        'columns': ('word', 'word_language', 'definition', 'definition_language', 'level'),
+        'scope': 'word_language',
+        # Lesson words are linked from GroupWord
+        'keep': 'id IN (SELECT word_id FROM GroupWord)',
+        # A vocab entry for a word only a lesson had makes it vocabulary
+        'claim': 'lesson_only = 0',
+        'words': None,
+        'create': create_word_table,
+        # word's own triggers bump the 'words' version and update word_fts;
+        # lessons relink to new vocabulary rows
+        'finish': relink_group_words
+    },
+    'bricks': {
+        'table': 'Brick',
+        'keys': ('group_id',),
+        'columns': ('group_id', 'language', 'level', 'group_number', 'scene', 'image'),
+        'scope': None,
+        'keep': None,
+        'claim': None,
+        'words': 'brick',
+        'create': create_group_table(BRICK_SCHEMA, CONTENT_INDEXES[0]),
+        'finish': finish_groups('bricks')
+    },
+    'steps': {
+        'table': 'Step',
+        'keys': ('group_id',),
+        'columns': ('group_id', 'language', 'day', 'image', 'video'),
+        'scope': None,
+        'keep': None,
+        'claim': None,
+        'words': 'step',
+        'create': create_group_table(STEP_SCHEMA, CONTENT_INDEXES[1]),
+        'finish': finish_groups('steps')
+    }
+}
+
+DEFAULT_SOURCES = (
+    ('vocab', os.path.join(DATA_DIR, 'vocab-ES-EN-Vol1.csv')),
+    ('vocab', os.path.join(DATA_DIR, 'vocab-DE-EN-Vol1.csv')),
+    ('bricks', os.path.join(DATABASE_DIR, 'word_groups.csv')),
+    ('steps', os.path.join(DATABASE_DIR, 'Steps_data.csv'))
+)
+
+def row_hash(row):
+    return hashlib.blake2b('\x1f'.join(map(str, row)).encode('utf-8'), digest_size=8).hexdigest()
+
+def read_rows(dataset, path, language=None, definition_language=None):
+    """(rows iterator, scope value) for one file"""
+    if dataset == 'vocab':
+        named, named_definition = vocab_languages(path)
+        language = language or named
+        definition_language = definition_language or named_definition or 'English'
+        if not language:
+            raise ValueError(f"Cannot tell the language of {path}; pass --language")
+        return read_vocab(path, language, definition_language), language
+    if dataset == 'bricks':
+        return read_bricks(path), None
+    if dataset == 'steps':
+        return read_steps(path), None
+    raise ValueError(f"Unknown dataset '{dataset}', expected one of {', '.join(DATASETS)}")
+
+def staged_group_words(cursor, has_level, group_ids):
+    """{group_id: (language, level, words)} of staged groups, the shape link_group_words takes"""
+    groups = {}
+    # Steps have days, not levels; their lesson-only words get level 0
+    cursor.execute(f"SELECT group_id, language, {'level' if has_level else '0'} FROM temp.import_stage")
+    wanted = set(group_ids)
+    for group_id, language, level in cursor.fetchall():
+        if group_id in wanted:
+            groups[group_id] = (language, level, [])
+    cursor.execute('SELECT group_id, position, text, definition, type FROM temp.import_words ORDER BY group_id, position')
+    for group_id, *word in cursor.fetchall():
+        if group_id in groups:
+            groups[group_id][2].append(tuple(word))
+    return groups
+
+def apply_rows(dataset, rows, conn, scope_value=None):
+    """Stage rows and upsert the changed ones into the dataset's table; returns the counts"""
+    spec = DATASETS[dataset]
+    table, keys, columns, kind = spec['table'], spec['keys'], spec['columns'], spec['words']
+    cursor = conn.cursor()
+    if not table_exists(cursor, table):
+        spec['create'](cursor)
+    cursor.execute('DROP TABLE IF EXISTS temp.import_stage')
+    cursor.execute(f'''
+        CREATE TEMP TABLE import_stage ({', '.join(columns)}, row_hash TEXT, PRIMARY KEY ({', '.join(keys)}))
+    ''')
+    # A repeated key keeps its first row
+    insert = f'''
+        INSERT OR IGNORE INTO temp.import_stage ({', '.join(columns)}, row_hash)
+        VALUES ({', '.join(['?'] * (len(columns) + 1))})
+    '''
+    if kind:
+        cursor.execute('DROP TABLE IF EXISTS temp.import_words')
+        cursor.execute('''
+            CREATE TEMP TABLE import_words (
+                group_id INTEGER, position INTEGER, text TEXT, definition TEXT, type TEXT,
+                PRIMARY KEY (group_id, position)
+            )
+        ''')
+    seen_groups = set()
+    parsed = 0
+    batch = []
+    word_batch = []
+    for row in rows:
+        if kind:
+            row, words = row[:-1], row[-1]
+            batch.append((*row, row_hash((*row, *(value for word in words for value in word)))))
+            if row[0] not in seen_groups:
+                seen_groups.add(row[0])
+                word_batch.extend((row[0], *word) for word in words)
+        else:
+            batch.append((*row, row_hash(row)))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            cursor.executemany(insert, batch)
+            if word_batch:
+                cursor.executemany('INSERT INTO temp.import_words VALUES (?, ?, ?, ?, ?)', word_batch)
+            parsed += len(batch)
+            batch, word_batch = [], []
+    if batch:
+        cursor.executemany(insert, batch)
+        if word_batch:
+            cursor.executemany('INSERT INTO temp.import_words VALUES (?, ?, ?, ?, ?)', word_batch)
+        parsed += len(batch)
+    staged = cursor.execute('SELECT COUNT(*) FROM temp.import_stage').fetchone()[0]
+    if kind:
+        # Groups whose row or words are new or changed; their GroupWord rows are rewritten
+        cursor.execute(f'''
+            SELECT s.group_id FROM temp.import_stage AS s LEFT JOIN {table} AS t ON t.group_id = s.group_id
+            WHERE t.row_hash IS NOT s.row_hash
+        ''')
+        changed_groups = [row[0] for row in cursor.fetchall()]
+
+    matches = ' AND '.join(f'{table}.{key} = s.{key}' for key in keys)
+    values = [column for column in columns if column not in keys]
+    cursor.execute(f'''
+        UPDATE {table} SET {', '.join(f'{column} = s.{column}' for column in values)}, row_hash = s.row_hash
+            {', ' + spec['claim'] if spec['claim'] else ''}
+        FROM temp.import_stage AS s
+        WHERE {matches} AND {table}.row_hash IS NOT s.row_hash
+    ''')
+    updated = cursor.rowcount
+    cursor.execute(f'''
+        INSERT INTO {table} ({', '.join(columns)}, row_hash)
+        SELECT {', '.join(columns)}, row_hash FROM temp.import_stage AS s
+        WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {matches})
+    ''')
+    inserted = cursor.rowcount
+    # Only rows an earlier import wrote (row_hash set) are removed when the file drops them
+    conditions, params = ['row_hash IS NOT NULL'], []
+    if spec['scope']:
+        conditions.append(f"{spec['scope']} = ?")
+        params.append(scope_value)
+    if spec['keep']:
+        conditions.append(f"NOT ({spec['keep']})")
+    dropped = f'''
+        FROM {table}
+        WHERE {' AND '.join(conditions)}
+          AND NOT EXISTS (SELECT 1 FROM temp.import_stage AS s WHERE {matches})
+    '''
+    if kind:
+        cursor.execute(f'SELECT group_id {dropped}', params)
+        dropped_groups = [row[0] for row in cursor.fetchall()]
+    cursor.execute(f'DELETE {dropped}', params)
+    deleted = cursor.rowcount
+    if kind and (changed_groups or dropped_groups):
+        cursor.executemany('DELETE FROM GroupWord WHERE kind = ? AND group_id = ?',
+                           [(kind, group_id) for group_id in dropped_groups])
+        link_group_words(kind, staged_group_words(cursor, 'level' in columns, changed_groups), conn)
+    cursor.execute('DROP TABLE temp.import_stage')
+    if kind:
+        cursor.execute('DROP TABLE temp.import_words')
+
+    if (inserted or updated or deleted) and spec['finish']:
+        spec['finish'](conn)
+    return {
+        'parsed': parsed,
+        'duplicates': parsed - staged,
+        'inserted': inserted,
+        'updated': updated,
+        'unchanged': staged - inserted - updated,
+        'deleted': deleted
+    }
+
+@contextmanager
+def import_connection():
+    """A dedicated connection with the import pragmas, inside one write transaction that commits on success"""
+    conn = get_connection()
+    try:
+        for name, value in IMPORT_PRAGMAS:
+            conn.execute(f'PRAGMA {name} = {value}')
+        conn.execute('BEGIN IMMEDIATE')
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def import_file(dataset, path, conn=None, language=None, definition_language=None):
+    """Import one content file; with conn, inside the caller's transaction. Returns the counts"""
+    if conn is None:
+        with import_connection() as conn:
+            return import_file(dataset, path, conn, language, definition_language)
+    started = time.perf_counter()
+    rows, scope_value = read_rows(dataset, path, language, definition_language)
+    counts = apply_rows(dataset, rows, conn, scope_value)
+    seconds = time.perf_counter() - started
+    counts['seconds'] = seconds
+    print(f"{dataset} {os.path.basename(path)}: {counts['parsed']} rows in {seconds:.2f}s "
+          f"({counts['parsed'] / seconds if seconds else 0:.0f} rows/sec): "
+          f"{counts['inserted']} inserted, {counts['updated']} updated, {counts['unchanged']} unchanged, "
+          f"{counts['deleted']} deleted"
+          + (f", {counts['duplicates']} duplicates skipped" if counts['duplicates'] else ''))
+    return counts
+
+def import_files(sources):
+    """Import (dataset, path) pairs in order, all in one transaction; returns the counts per file"""
+    run_migrations()
+    results = []
+    with import_connection() as conn:
+        for dataset, path in sources:
+            if not os.path.exists(path):
+                print(f"Warning: {path} not found, skipping {dataset}")
+                continue
+            results.append(import_file(dataset, path, conn))
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import vocab, word_groups.csv and Steps_data.csv, writing only changed rows')
+    parser.add_argument('dataset', nargs='?', choices=['all', *DATASETS], default='all')
+    parser.add_argument('path', nargs='?', help="file to import (default: the dataset's usual files)")
+    parser.add_argument('--language', help='word language of a vocab file (default: from its name)')
+    parser.add_argument('--definition-language', help='definition language of a vocab file (default: from its name)')
+    args = parser.parse_args()
+    if args.path:
+        if args.dataset == 'all':
+            parser.error('name the dataset of the file to import')
+        run_migrations()
+        import_file(args.dataset, args.path, language=args.language, definition_language=args.definition_language)
+    else:
+        import_files([source for source in DEFAULT_SOURCES if args.dataset in ('all', source[0])])
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_helper import db_connection, sync_group_words, GROUP_TABLES
+from migrations import run_migrations, WIDE_WORD_SLOTS
+
+def migrate():
+    """Relink every GroupWord row to the vocabulary, creating lesson-only rows for unknown words"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM word')
+        words_before = cursor.fetchone()[0]
+        started = time.time()
+        for kind in GROUP_TABLES:
+            print(f"  {kind}: {sync_group_words(kind, conn)} words linked")
+        cursor.execute('SELECT COUNT(*) FROM word')
+        print(f"Migrated in {time.time() - started:.2f}s, {cursor.fetchone()[0] - words_before} new word rows")
+
+def verify_migration():
+    """
+    Compare GroupWord against the wide word columns group by group. Only
+    meaningful right after migrating: the importer writes GroupWord alone, so
+    the wide columns of an older database are not kept up to date.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        mismatches = 0
+        for kind, table in GROUP_TABLES.items():
+            cursor.execute(f'PRAGMA table_info({table})')
+            if 'word1' not in [column[1] for column in cursor.fetchall()]:
+                print(f"{table}: no word columns to compare")
+                continue
+            columns = ', '.join(f'word{i}, definition{i}, type{i}' for i in range(1, WIDE_WORD_SLOTS + 1))
+            cursor.execute(f'SELECT group_id, {columns} FROM {table}')
+            legacy = {}
+            for row in cursor.fetchall():
+                legacy[row[0]] = [
+                    (row[1 + 3 * i].strip(), (row[2 + 3 * i] or '').strip(), row[3 + 3 * i] or '')
+                    for i in range(WIDE_WORD_SLOTS) if row[1 + 3 * i] and row[1 + 3 * i].strip()
+                ]
+            cursor.execute('''
+                SELECT gw.group_id, COALESCE(gw.text, w.word), COALESCE(gw.definition, w.definition), gw.type
+                FROM GroupWord gw JOIN word w ON w.id = gw.word_id
+                WHERE gw.kind = ?
+                ORDER BY gw.group_id, gw.position
+            ''', (kind,))
+            linked = {group_id: [] for group_id in legacy}
+            for group_id, word, definition, word_type in cursor.fetchall():
+                linked.setdefault(group_id, []).append((word, definition, word_type))
+            for group_id in linked:
+                if linked[group_id] != legacy.get(group_id, []):
+                    mismatches += 1
+                    print(f"  Mismatch in {kind} group {group_id}")
+            print(f"{table}: {len(legacy)} groups checked")
+    print("GroupWord matches the word columns" if not mismatches else f"{mismatches} groups differ")
+    return mismatches == 0
+
+if __name__ == "__main__":
+    print("Migrating Brick and Step words into GroupWord...")
+    # Creates GroupWord and its indexes on a database that predates them
+    run_migrations()
+    migrate()
+    sys.exit(0 if verify_migration() else 1)
@@ -0,0 +1,564 @@
+import os
+import sys
+
+# Allow running as a script: python database/migrations.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.db_helper import db_connection
+
+# Each migration runs once, in order, in its own transaction. The number of
+# the last one applied is stored in the database itself (PRAGMA user_version),
+# so startup costs one PRAGMA read once the schema is current. Append new
+# migrations to the end; never edit or reorder one that has shipped.
+#
+# Migrations do not call db_helper: its helpers follow the current schema,
+# while a migration must keep doing what it did when it shipped, against the
+# schema of its own step. The SQL a migration needs is copied in here.
+
+# The wide word1..word8 columns Brick and Step had before GroupWord
+WIDE_WORD_SLOTS = 8
+
+def table_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+def create_user_tables(cursor):
+    """User, UserBrick, UserStep and ContentVersion, previously created on demand by request handlers"""
+    cursor.execute('CREATE TABLE IF NOT EXISTS User (username TEXT PRIMARY KEY, total_score INTEGER DEFAULT 0)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS UserBrick (
+            username TEXT,
+            group_id INTEGER,
+            score INTEGER DEFAULT 0,
+            PRIMARY KEY (username, group_id),
+            FOREIGN KEY (username) REFERENCES User(username)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS UserStep (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            group_id INTEGER NOT NULL,
+            score INTEGER DEFAULT 0,
+            FOREIGN KEY(group_id) REFERENCES Step(group_id)
+        )
+    ''')
+    cursor.execute('CREATE TABLE IF NOT EXISTS ContentVersion (name TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)')
+
+def add_brick_completed(cursor):
+    """Brick.completed, which /api/bricks used to check for with PRAGMA table_info on every call"""
+    if not table_exists(cursor, 'Brick'):
+        return
+    cursor.execute('PRAGMA table_info(Brick)')
+    if 'completed' not in [column[1] for column in cursor.fetchall()]:
+        cursor.execute('ALTER TABLE Brick ADD COLUMN completed INTEGER DEFAULT 0')
+
+def create_content_indexes(cursor):
+    """Indexes behind the filtered /api/bricks and /api/steps queries; the importers recreate them with their tables"""
+    for table, statement in (
+        ('Brick', 'CREATE INDEX IF NOT EXISTS idx_brick_language_level ON Brick(language, level, group_number)'),
+        ('Step', 'CREATE INDEX IF NOT EXISTS idx_step_language_day ON Step(language, day)')
+    ):
+        if table_exists(cursor, table):
+            cursor.execute(statement)
+
+def copy_wide_words(cursor, kind):
+    """
+    GroupWord rows of one kind from its table's wide word columns, each word
+    linked to the word row with the same spelling and definition, one created
+    if there is none (the sync migration 4 shipped with)
+    """
+    table = {'brick': 'Brick', 'step': 'Step'}[kind]
+    cursor.execute('DELETE FROM GroupWord WHERE kind = ?', (kind,))
+    level_column = 'level' if kind == 'brick' else '0'
+    columns = ', '.join(f'word{i}, definition{i}, type{i}' for i in range(1, WIDE_WORD_SLOTS + 1))
+    cursor.execute(f'SELECT group_id, language, {level_column}, {columns} FROM {table}')
+    groups = cursor.fetchall()
+    word_ids = {}
+    links = []
+    for row in groups:
+        group_id, language, level = row[:3]
+        for i in range(WIDE_WORD_SLOTS):
+            text, definition, word_type = row[3 + 3 * i:6 + 3 * i]
+            if not text or not text.strip():
+                continue
+            key = (text.strip(), language, (definition or '').strip())
+            word_id = word_ids.get(key)
+            if word_id is None:
+                cursor.execute('SELECT id FROM word WHERE word_language = ? AND word = ? AND definition = ?',
+                               (key[1], key[0], key[2]))
+                found = cursor.fetchone()
+                if found:
+                    word_id = found[0]
+                else:
+                    # Lesson definitions are all English
+                    cursor.execute(
+                        'INSERT INTO word (word, word_language, definition, definition_language, level) VALUES (?, ?, ?, ?, ?)',
+                        (key[0], language, key[2], 'English', level)
+                    )
+                    word_id = cursor.lastrowid
+                word_ids[key] = word_id
+            links.append((kind, group_id, i + 1, word_id, word_type or ''))
+    cursor.executemany('INSERT INTO GroupWord (kind, group_id, position, word_id, type) VALUES (?, ?, ?, ?, ?)', links)
+    return len(links)
+
+def create_group_words(cursor):
+    """GroupWord, the normalized (group, position) -> word link, filled from the wide word columns"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS GroupWord (
+            kind TEXT NOT NULL,
+            group_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            word_id INTEGER NOT NULL REFERENCES word(id),
+            type TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY (kind, group_id, position)
+        ) WITHOUT ROWID
+    ''')
+    # "Which groups contain word X" and the find-or-create lookup when syncing
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_groupword_word ON GroupWord(word_id)')
+    if not table_exists(cursor, 'word'):
+        return
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_word_lookup ON word(word_language, word, definition)')
+    cursor.execute('SELECT 1 FROM GroupWord LIMIT 1')
+    if cursor.fetchone() is None:
+        for kind, table in (('brick', 'Brick'), ('step', 'Step')):
+            if table_exists(cursor, table):
+                print(f"Linked {copy_wide_words(cursor, kind)} {kind} words into GroupWord")
+
+def unique_user_steps(cursor):
+    """One UserStep row per (username, group_id), and an index for the leaderboard's ORDER BY total_score"""
+    # /user_step used to check-then-insert, so concurrent saves could leave duplicates;
+    # it updated every copy, so they share a score and the newest one is kept
+    cursor.execute('''
+        DELETE FROM UserStep
+        WHERE id NOT IN (SELECT MAX(id) FROM UserStep GROUP BY username, group_id)
+    ''')
+    if cursor.rowcount:
+        print(f"Removed {cursor.rowcount} duplicate UserStep rows")
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_userstep_user_group ON UserStep(username, group_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_total_score ON User(total_score DESC)')
+
+def create_score_triggers(cursor, table):
+    """Triggers that apply each score change on table (UserBrick or UserStep) to User.total_score as a delta"""
+    # The insert trigger creates the User row if needed, so no score is ever left out of a total
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_total_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO User (username, total_score) VALUES (NEW.username, COALESCE(NEW.score, 0))
+            ON CONFLICT(username) DO UPDATE SET total_score = COALESCE(total_score, 0) + excluded.total_score;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_total_update AFTER UPDATE OF score ON {table}
+        WHEN COALESCE(NEW.score, 0) != COALESCE(OLD.score, 0)
+        BEGIN
+            UPDATE User SET total_score = COALESCE(total_score, 0) + COALESCE(NEW.score, 0) - COALESCE(OLD.score, 0)
+            WHERE username = NEW.username;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_total_delete AFTER DELETE ON {table}
+        BEGIN
+            UPDATE User SET total_score = COALESCE(total_score, 0) - COALESCE(OLD.score, 0)
+            WHERE username = OLD.username;
+        END
+    ''')
+
+def maintain_user_totals(cursor):
+    """User.total_score covers bricks and steps and is kept current by triggers instead of recomputed on read"""
+    for table in ('UserBrick', 'UserStep'):
+        create_score_triggers(cursor, table)
+    cursor.execute('''
+        INSERT OR IGNORE INTO User (username)
+        SELECT username FROM UserBrick UNION SELECT username FROM UserStep
+    ''')
+    cursor.execute('''
+        UPDATE User SET total_score =
+            COALESCE((SELECT SUM(score) FROM UserBrick WHERE UserBrick.username = User.username), 0)
+            + COALESCE((SELECT SUM(score) FROM UserStep WHERE UserStep.username = User.username), 0)
+    ''')
+
+# score table -> content table that holds each group's language
+SCORE_CONTENT_TABLES = {'UserBrick': 'Brick', 'UserStep': 'Step'}
+
+def create_leaderboard_triggers(cursor, table):
+    """
+    Triggers that apply each score change on table to its user's LeaderboardScore
+    rows: the 'all' board, the 'lang:<language>' board of the group, and, for
+    score increases, the current 'week:<YYYY-Www>' board (UTC, weeks start Monday).
+    """
+    content_table = SCORE_CONTENT_TABLES[table]
+    upsert = 'ON CONFLICT(board, username) DO UPDATE SET score = score + excluded.score'
+    for event, row, delta in (
+        ('INSERT', 'NEW', 'COALESCE(NEW.score, 0)'),
+        ('UPDATE OF score', 'NEW', 'COALESCE(NEW.score, 0) - COALESCE(OLD.score, 0)'),
+        ('DELETE', 'OLD', '-COALESCE(OLD.score, 0)'),
+    ):
+        name = f"{table}_leaderboard_{event.split()[0].lower()}"
+        # Weekly boards count points earned, so resets and deletes leave them alone
+        weekly = '' if event == 'DELETE' else f'''
+            INSERT INTO LeaderboardScore (board, username, score)
+            SELECT 'week:' || strftime('%Y-W%W', 'now'), {row}.username, {delta} WHERE {delta} > 0
+            {upsert};'''
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table}
+            BEGIN
+                INSERT INTO LeaderboardScore (board, username, score) VALUES ('all', {row}.username, {delta})
+                {upsert};
+                INSERT INTO LeaderboardScore (board, username, score)
+                SELECT 'lang:' || language, {row}.username, {delta} FROM {content_table} WHERE group_id = {row}.group_id
+                {upsert};{weekly}
+            END
+        ''')
+
+def create_leaderboard(cursor):
+    """LeaderboardScore: per-board user scores, ordered by an index and kept current by triggers"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS LeaderboardScore (
+            board TEXT NOT NULL,
+            username TEXT NOT NULL,
+            score REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (board, username)
+        ) WITHOUT ROWID
+    ''')
+    # Top-N and whole-board loads read a board in rank order straight off this index
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_leaderboard_rank ON LeaderboardScore(board, score DESC, username)')
+    for table in SCORE_CONTENT_TABLES:
+        create_leaderboard_triggers(cursor, table)
+    # The 'all' and language boards from the scores so far; a database without content yet has no language boards
+    cursor.execute("DELETE FROM LeaderboardScore WHERE board NOT LIKE 'week:%'")
+    scores = [
+        "SELECT 'all' AS board, username, COALESCE(score, 0) AS score FROM UserBrick",
+        "SELECT 'all', username, COALESCE(score, 0) FROM UserStep"
+    ]
+    for score_table, content_table in SCORE_CONTENT_TABLES.items():
+        if table_exists(cursor, content_table):
+            scores.append(f'''SELECT 'lang:' || c.language, u.username, COALESCE(u.score, 0)
+                FROM {score_table} u JOIN {content_table} c ON c.group_id = u.group_id''')
+    cursor.execute(f'''
+        INSERT INTO LeaderboardScore (board, username, score)
+        SELECT board, username, SUM(score) FROM (
+            {' UNION ALL '.join(scores)}
+        )
+        GROUP BY board, username
+    ''')
+
+def create_word_search(cursor):
+    """
+    word_fts: an FTS5 index over word.word and word.definition, stored as an
+    external-content table (the text lives only in word) and kept in sync by
+    triggers. remove_diacritics 2 folds accents on both sides, so "uber"
+    finds "über" and "nino" finds "niño"; the prefix indexes keep
+    type-ahead queries ("ni*") off a full term scan. Brick and Step words are
+    word rows linked through GroupWord, so this covers them too.
+    """
+    if not table_exists(cursor, 'word'):
+        return
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS word_fts USING fts5(
+            word, definition,
+            content='word', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS word_fts_insert AFTER INSERT ON word BEGIN
+            INSERT INTO word_fts (rowid, word, definition) VALUES (NEW.id, NEW.word, NEW.definition);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS word_fts_delete AFTER DELETE ON word BEGIN
+            INSERT INTO word_fts (word_fts, rowid, word, definition) VALUES ('delete', OLD.id, OLD.word, OLD.definition);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS word_fts_update AFTER UPDATE OF word, definition ON word BEGIN
+            INSERT INTO word_fts (word_fts, rowid, word, definition) VALUES ('delete', OLD.id, OLD.word, OLD.definition);
+            INSERT INTO word_fts (rowid, word, definition) VALUES (NEW.id, NEW.word, NEW.definition);
+        END
+    ''')
+    cursor.execute("INSERT INTO word_fts (word_fts) VALUES ('rebuild')")
+
+def create_word_sampling(cursor):
+    """
+    Index and triggers behind the random word samplers: the sampler reads a
+    language's ids level by level off idx_word_language_level, and caches them
+    until any change to word bumps the 'words' content version.
+    """
+    if not table_exists(cursor, 'word'):
+        return
+    cursor.execute('CREATE TABLE IF NOT EXISTS ContentVersion (name TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_word_language_level ON word(word_language, level)')
+    bump = '''
+        INSERT INTO ContentVersion (name, version) VALUES ('words', 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1;
+    '''
+    for name, event in (('insert', 'INSERT'), ('delete', 'DELETE'), ('update', 'UPDATE OF word_language, level')):
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS word_version_{name} AFTER {event} ON word BEGIN {bump} END')
+    cursor.execute(bump)
+
+def add_row_hashes(cursor):
+    """row_hash on the imported content tables, so importer.py only rewrites rows whose values changed"""
+    for table in ('word', 'Brick', 'Step'):
+        if not table_exists(cursor, table):
+            continue
+        cursor.execute(f'PRAGMA table_info({table})')
+        if 'row_hash' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN row_hash TEXT')
+
+def integer_leaderboard_scores(cursor):
+    """
+    LeaderboardScore.score as INTEGER, like User.total_score, so whole totals
+    come back as 120 rather than 120.0; and every User on the 'all' board from
+    login on, with 0 until they score, as when the leaderboard read User.
+    """
+    if not table_exists(cursor, 'LeaderboardScore'):
+        return
+    cursor.execute('CREATE TEMP TABLE leaderboard_copy AS SELECT board, username, score FROM LeaderboardScore')
+    cursor.execute('DROP TABLE LeaderboardScore')
+    cursor.execute('''
+        CREATE TABLE LeaderboardScore (
+            board TEXT NOT NULL,
+            username TEXT NOT NULL,
+            score INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (board, username)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_leaderboard_rank ON LeaderboardScore(board, score DESC, username)')
+    # INTEGER affinity stores 120.0 as 120 and keeps fractional step scores as they are
+    cursor.execute('INSERT INTO LeaderboardScore (board, username, score) SELECT board, username, score FROM leaderboard_copy')
+    cursor.execute('DROP TABLE temp.leaderboard_copy')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS User_leaderboard_insert AFTER INSERT ON User
+        BEGIN
+            INSERT OR IGNORE INTO LeaderboardScore (board, username, score) VALUES ('all', NEW.username, 0);
+        END
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO LeaderboardScore (board, username, score) SELECT 'all', username, 0 FROM User")
+
+def add_column(cursor, table, column, definition):
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def create_word_sampling_index(cursor):
+    """The samplers' (language, level) index, over vocabulary rows only"""
+    cursor.execute('DROP INDEX IF EXISTS idx_word_language_level')
+    cursor.execute('CREATE INDEX idx_word_language_level ON word(word_language, level) WHERE lesson_only = 0')
+
+def match_vocabulary(candidates, text, definition):
+    """
+    The (id, word, definition) among candidates (rows with the same word, ignoring
+    case) that a lesson word means: same spelling and definition, then the same
+    definition ignoring case, then one of the row's comma-separated definitions
+    """
+    wanted = definition.casefold()
+    for candidate in candidates:
+        if candidate[1] == text and candidate[2] == definition:
+            return candidate
+    for candidate in candidates:
+        if candidate[2].casefold() == wanted:
+            return candidate
+    for candidate in candidates:
+        if not wanted or wanted in [meaning.strip().casefold() for meaning in candidate[2].split(',')]:
+            return candidate
+    return None
+
+def link_wide_words(cursor, kind):
+    """
+    GroupWord rows of one kind from its table's wide word columns, each word
+    linked to the vocabulary row it names (see match_vocabulary) with the
+    lesson's own spelling kept where it differs; a word with no vocabulary row
+    gets a lesson_only row. Lesson-only rows no group uses are deleted.
+    """
+    table = {'brick': 'Brick', 'step': 'Step'}[kind]
+    cursor.execute('DELETE FROM GroupWord WHERE kind = ?', (kind,))
+    level_column = 'level' if kind == 'brick' else '0'
+    columns = ', '.join(f'word{i}, definition{i}, type{i}' for i in range(1, WIDE_WORD_SLOTS + 1))
+    cursor.execute(f'SELECT group_id, language, {level_column}, {columns} FROM {table}')
+    groups = cursor.fetchall()
+    # (language, casefolded word) -> vocabulary rows; (language, word, definition) -> lesson-only row id
+    vocabulary = {}
+    lesson_words = {}
+    for language in {row[1] for row in groups}:
+        cursor.execute('SELECT id, word, definition, lesson_only FROM word WHERE word_language = ? ORDER BY id',
+                       (language,))
+        for word_id, text, definition, lesson_only in cursor.fetchall():
+            if lesson_only:
+                lesson_words[(language, text, definition)] = word_id
+            else:
+                vocabulary.setdefault((language, text.casefold()), []).append((word_id, text, definition))
+    links = []
+    for row in groups:
+        group_id, language, level = row[:3]
+        for i in range(WIDE_WORD_SLOTS):
+            text, definition, word_type = row[3 + 3 * i:6 + 3 * i]
+            if not text or not text.strip():
+                continue
+            text, definition = text.strip(), (definition or '').strip()
+            match = match_vocabulary(vocabulary.get((language, text.casefold()), []), text, definition)
+            if match is not None:
+                word_id = match[0]
+                shown_text = text if text != match[1] else None
+                shown_definition = definition if definition != match[2] else None
+            else:
+                shown_text = shown_definition = None
+                word_id = lesson_words.get((language, text, definition))
+                if word_id is None:
+                    # Lesson definitions are all English
+                    cursor.execute('''
+                        INSERT INTO word (word, word_language, definition, definition_language, level, lesson_only)
+                        VALUES (?, ?, ?, 'English', ?, 1)
+                    ''', (text, language, definition, level))
+                    word_id = lesson_words[(language, text, definition)] = cursor.lastrowid
+            links.append((kind, group_id, i + 1, word_id, word_type or '', shown_text, shown_definition))
+    cursor.executemany('''
+        INSERT INTO GroupWord (kind, group_id, position, word_id, type, text, definition) VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', links)
+    cursor.execute('''
+        DELETE FROM word WHERE lesson_only = 1 AND NOT EXISTS (SELECT 1 FROM GroupWord WHERE word_id = word.id)
+    ''')
+    return len(links)
+
+def link_lesson_words(cursor):
+    """
+    Link lesson words to the vocabulary rows they name instead of duplicates.
+    Syncing used to add a word row for every lesson word without an exact
+    match, so 'Casa'/'House' sat next to 'casa'/'house' and showed up in
+    random practice and search. word.lesson_only now marks the rows only a
+    lesson uses, and GroupWord.text/definition keep a lesson's own spelling.
+    """
+    add_column(cursor, 'GroupWord', 'text', 'TEXT')
+    add_column(cursor, 'GroupWord', 'definition', 'TEXT')
+    if not table_exists(cursor, 'word'):
+        return
+    add_column(cursor, 'word', 'lesson_only', 'INTEGER NOT NULL DEFAULT 0')
+    create_word_sampling_index(cursor)
+    # The rows earlier syncs created: linked words with step level 0, or
+    # repeating an earlier row's spelling up to case
+    cursor.execute('SELECT DISTINCT word_id FROM GroupWord')
+    linked = {row[0] for row in cursor.fetchall()}
+    cursor.execute('SELECT id, word_language, word, level FROM word ORDER BY id')
+    seen, created = set(), []
+    for word_id, language, text, level in cursor.fetchall():
+        key = (language, text.casefold())
+        if word_id in linked and (level == 0 or key in seen):
+            created.append((word_id,))
+        seen.add(key)
+    cursor.executemany('UPDATE word SET lesson_only = 1 WHERE id = ?', created)
+    # Relinking drops the created rows that now have a vocabulary match
+    for kind, table in (('brick', 'Brick'), ('step', 'Step')):
+        if table_exists(cursor, table):
+            print(f"Linked {link_wide_words(cursor, kind)} {kind} words into GroupWord")
+    # The samplers cache ids per 'words' version
+    cursor.execute('''
+        INSERT INTO ContentVersion (name, version) VALUES ('words', 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1
+    ''')
+
+def weekly_best_scores(cursor):
+    """
+    Weekly boards keyed by the date of the week's Monday ('week:2026-10-12',
+    UTC), and counting each (user, group) at most once a week. 'week:%Y-W%W'
+    was not an ISO week and split the first days of January off as week 00;
+    and with only positive deltas counted, resetting and replaying a lesson
+    earned its points again every time. WeeklyScore keeps the highest score
+    each group had during the week, including the score a reset wiped, and
+    the weekly board only gains what a new score adds above it.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS WeeklyScore (
+            week TEXT NOT NULL,
+            username TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            group_id INTEGER NOT NULL,
+            score INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (week, username, kind, group_id)
+        ) WITHOUT ROWID
+    ''')
+    week = "date('now', 'weekday 0', '-6 days')"
+    # Points earned so far keep their place on this week's board; older weeks are never ranked again
+    cursor.execute(f'''
+        UPDATE LeaderboardScore SET board = 'week:' || {week} WHERE board = 'week:' || strftime('%Y-W%W', 'now')
+    ''')
+    cursor.execute(f"DELETE FROM LeaderboardScore WHERE board LIKE 'week:%' AND board != 'week:' || {week}")
+    upsert = 'ON CONFLICT(board, username) DO UPDATE SET score = score + excluded.score'
+    for table, kind, content_table in (('UserBrick', 'brick', 'Brick'), ('UserStep', 'step', 'Step')):
+        for event, row, delta, old in (
+            ('INSERT', 'NEW', 'COALESCE(NEW.score, 0)', '0'),
+            ('UPDATE OF score', 'NEW', 'COALESCE(NEW.score, 0) - COALESCE(OLD.score, 0)', 'COALESCE(OLD.score, 0)'),
+        ):
+            name = f"{table}_leaderboard_{event.split()[0].lower()}"
+            # The same 'all' and language upserts as before, without the weekly one
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'''
+                CREATE TRIGGER {name} AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO LeaderboardScore (board, username, score) VALUES ('all', {row}.username, {delta})
+                    {upsert};
+                    INSERT INTO LeaderboardScore (board, username, score)
+                    SELECT 'lang:' || language, {row}.username, {delta} FROM {content_table} WHERE group_id = {row}.group_id
+                    {upsert};
+                END
+            ''')
+            best = f'''COALESCE((SELECT score FROM WeeklyScore
+                WHERE week = {week} AND username = NEW.username AND kind = '{kind}' AND group_id = NEW.group_id), 0)'''
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_weekly_{event.split()[0].lower()} AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO LeaderboardScore (board, username, score)
+                    SELECT 'week:' || {week}, NEW.username, COALESCE(NEW.score, 0) - MAX({old}, {best})
+                    WHERE COALESCE(NEW.score, 0) > MAX({old}, {best})
+                    {upsert};
+                    INSERT INTO WeeklyScore (week, username, kind, group_id, score)
+                    VALUES ({week}, NEW.username, '{kind}', NEW.group_id, MAX(COALESCE(NEW.score, 0), {old}))
+                    ON CONFLICT(week, username, kind, group_id) DO UPDATE SET score = MAX(score, excluded.score);
+                    DELETE FROM WeeklyScore WHERE week < {week};
+                END
+            ''')
+
+MIGRATIONS = (
+    create_user_tables,
+    add_brick_completed,
+    create_content_indexes,
+    create_group_words,
+    unique_user_steps,
+    maintain_user_totals,
+    create_leaderboard,
+    create_word_search,
+    create_word_sampling,
+    add_row_hashes,
+    integer_leaderboard_scores,
+    link_lesson_words,
+    weekly_best_scores,
+)
+
+def schema_version(conn=None):
+    if conn is None:
+        with db_connection() as conn:
+            return schema_version(conn)
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def run_migrations():
+    """Apply every migration newer than the database's user_version; returns the resulting version"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        for version, migration in enumerate(MIGRATIONS, start=1):
+            if schema_version(conn) >= version:
+                continue
+            # IMMEDIATE takes the write lock up front, so a second worker starting
+            # at the same time waits here and then sees the bumped version
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                if schema_version(conn) < version:
+                    migration(cursor)
+                    cursor.execute(f'PRAGMA user_version = {version}')
+                    print(f"Applied migration {version}: {migration.__name__}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return schema_version(conn)
+
+if __name__ == "__main__":
+    print(f"Schema version {run_migrations()} of {len(MIGRATIONS)}")
@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_helper import db_connection
+from detect_cache import normalize_target
+from media_index import media_index
+from MoonDream import load_asset_image, run_detection
+
+def create_bbox_table():
+    """Create the WordBBox table if it does not exist (kept across runs so the job can resume)"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS WordBBox (
+                image TEXT NOT NULL,
+                target TEXT NOT NULL,
+                found INTEGER NOT NULL,
+                x REAL,
+                y REAL,
+                w REAL,
+                h REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                image_hash TEXT,
+                PRIMARY KEY (image, target)
+            )
+        ''')
+        # The sha256 of the image a row was computed on; tables from before it have the rows redone
+        cursor.execute('PRAGMA table_info(WordBBox)')
+        if 'image_hash' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE WordBBox ADD COLUMN image_hash TEXT')
+
+def collect_pairs(good_only=False):
+    """Collect the distinct (image filename, normalized definition) pairs from Brick and Step"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        pairs = set()
+        for table, kind in (('Brick', 'brick'), ('Step', 'step')):
+            cursor.execute(f'''
+                SELECT g.image, COALESCE(gw.definition, w.definition), gw.type
+                FROM {table} g
+                JOIN GroupWord gw ON gw.kind = ? AND gw.group_id = g.group_id
+                JOIN word w ON w.id = gw.word_id
+            ''', (kind,))
+            for image, definition, word_type in cursor.fetchall():
+                if not image or not image.strip():
+                    continue
+                if good_only and word_type != 'Good':
+                    continue
+                target = normalize_target(definition)
+                if target:
+                    pairs.add((image.strip().replace('\\', '/').split('/')[-1], target))
+        # Rows for an image that has since been replaced are redone
+        media_index.ensure_built()
+        cursor.execute('SELECT image, target, image_hash FROM WordBBox')
+        done = set()
+        for image, target, image_hash in cursor.fetchall():
+            entry = media_index.get('images', image)
+            if entry is not None and entry.hash == image_hash:
+                done.add((image, target))
+    return sorted(pairs), done
+
+def detect_pair(image_name, target):
+    """Run detection for one pair and return the WordBBox row values"""
+    image, image_hash = load_asset_image(image_name)
+    result = run_detection(image, target)
+    x, y, w, h = result['bbox'] if result['found'] else (None, None, None, None)
+    return (image_name, target, int(result['found']), x, y, w, h, image_hash)
+
+def precompute_bboxes(workers=4, good_only=False, limit=None):
+    """Detect every pending pair with a worker pool, committing rows as they complete"""
+    create_bbox_table()
+    pairs, done = collect_pairs(good_only)
+    pending = [pair for pair in pairs if pair not in done]
+    print(f"{len(pairs)} pairs total, {len(pairs) - len(pending)} already done, {len(pending)} to detect")
+    if limit:
+        pending = pending[:limit]
+    if not pending:
+        return
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        completed = 0
+        failed = 0
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(detect_pair, image, target): (image, target) for image, target in pending}
+            for future in as_completed(futures):
+                image, target = futures[future]
+                try:
+                    row = future.result()
+                except Exception as e:
+                    # Leave the pair missing so the next run retries it
+                    failed += 1
+                    print(f"  Failed {image} / {target}: {e}")
+                    continue
+                cursor.execute('''
+                    INSERT OR REPLACE INTO WordBBox (image, target, found, x, y, w, h, image_hash)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', row)
+                conn.commit()
+                completed += 1
+                if completed % 25 == 0:
+                    print(f"  {completed}/{len(pending)} done ({completed / (time.time() - started):.1f} pairs/sec)")
+    print(f"Finished: {completed} detected, {failed} failed in {time.time() - started:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Precompute bounding boxes for every Brick and Step word')
+    parser.add_argument('--workers', type=int, default=4, help='number of concurrent detection calls')
+    parser.add_argument('--good-only', action='store_true', help='only detect words of type "Good"')
+    parser.add_argument('--limit', type=int, default=None, help='stop after this many pairs')
+    args = parser.parse_args()
+    precompute_bboxes(args.workers, args.good_only, args.limit)
@@ -1,29 +1,20 @@
 from flask import Blueprint, request, jsonify
 import sqlite3
 import os
-from database.db_helper import get_connection
+from database.db_helper import db_connection, save_user_score, get_user_total, stored_score
+from leaderboard import leaderboard as leaderboard_index, board_name
+from pagination import BadQuery, int_arg
+from write_behind import score_queue
+from bootstrap import unlocked_level, progress_total
 
 user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/user_steps/<username>', methods=['GET'])
 def user_steps(username):
-    conn = get_db()
-    cursor = conn.cursor()
-    # Get all steps
-    cursor.execute('SELECT group_id FROM Step')
-    step_ids = [row[0] for row in cursor.fetchall()]
-    # Get user scores
-    cursor.execute('SELECT group_id, score FROM UserStep WHERE username = ?', (username,))
-    user_scores = {row[0]: row[1] for row in cursor.fetchall()}
-    # Build result
-    result = []
-    total_score = 0
-    for group_id in step_ids:
-        score = user_scores.get(group_id, 0)
-        total_score += score
-        result.append({'group_id': group_id, 'score': score})
-    conn.close()
-    return jsonify({'username': username, 'steps': result, 'total_score': total_score})
+    _, steps, user_scores, _ = score_queue.user_progress('step', username)
+    result = [{'group_id': group_id, 'score': user_scores.get(group_id, 0)} for group_id, _ in steps]
+    # total_score here is the user's step subtotal, not User.total_score
+    return jsonify({'username': username, 'steps': result, 'total_score': progress_total(steps, user_scores)})
 
 @user_bp.route('/user_step', methods=['POST'])
 def update_user_step():
@@ -36,46 +27,36 @@ def update_user_step():
         score = 0.0
     if not username or group_id is None:
         return jsonify({'error': 'Missing username or group_id'}), 400
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM UserStep WHERE username = ? AND group_id = ?', (username, group_id))
-    exists = cursor.fetchone()
-    if exists:
-        cursor.execute('UPDATE UserStep SET score = ? WHERE username = ? AND group_id = ?', (score, username, group_id))
-    else:
-        cursor.execute('INSERT INTO UserStep (username, group_id, score) VALUES (?, ?, ?)', (username, group_id, score))
-    conn.commit()
-    cursor.execute('SELECT score FROM UserStep WHERE username = ? AND group_id = ?', (username, group_id))
-    updated_score = cursor.fetchone()[0]
-    conn.close()
-    return jsonify({'success': True, 'score': updated_score})
+    if score_queue.enabled:
+        total_score = score_queue.submit('step', username, group_id, score)
+        return jsonify({'success': True, 'score': stored_score(score), 'total_score': total_score})
+    with db_connection() as conn:
+        updated_score = save_user_score('step', username, group_id, score, conn)
+        total_score = get_user_total(username, conn)
+    leaderboard_index.record(username)
+    return jsonify({'success': True, 'score': updated_score, 'total_score': total_score})
 
 # Leaderboard route (now after user_bp definition)
 @user_bp.route('/leaderboard', methods=['GET'])
 def leaderboard():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT username, total_score FROM User ORDER BY total_score DESC LIMIT 10')
-    top_users = [{'username': row[0], 'total_score': row[1]} for row in cursor.fetchall()]
-    conn.close()
-    return jsonify({'leaderboard': top_users})
-
-def ensure_user_tables(conn):
-    cursor = conn.cursor()
-    cursor.execute('''CREATE TABLE IF NOT EXISTS User (username TEXT PRIMARY KEY, total_score INTEGER DEFAULT 0)''')
-    cursor.execute('''CREATE TABLE IF NOT EXISTS UserBrick (
-        username TEXT,
-        group_id INTEGER,
-        score INTEGER DEFAULT 0,
-        PRIMARY KEY (username, group_id),
-        FOREIGN KEY (username) REFERENCES User(username)
-    )''')
-    conn.commit()
-
-def get_db():
-    conn = get_connection()
-    ensure_user_tables(conn)
-    return conn
+    """
+    Top users of a window (?window=all|language|week, ?language= for language),
+    plus the rank and neighbors of ?username= when given. Answered from the
+    in-memory rank index, not by sorting User.
+    """
+    window = request.args.get('window', 'all')
+    try:
+        board = board_name(window, request.args.get('language'))
+        limit = int_arg('limit')
+        neighbors = int_arg('neighbors')
+    except (BadQuery, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    limit = 10 if limit is None else limit
+    if not 1 <= limit <= 100:
+        return jsonify({'error': "'limit' must be between 1 and 100"}), 400
+    neighbors = 2 if neighbors is None else max(0, min(neighbors, 50))
+    standings = leaderboard_index.standings(board, limit, request.args.get('username') or None, neighbors)
+    return jsonify(dict(standings, window=window))
 
 @user_bp.route('/login', methods=['POST'])
 def login():
@@ -83,41 +64,32 @@ def login():
     username = data.get('username', '').strip()
     if not username:
         return jsonify({'error': 'Username required'}), 400
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT username FROM User WHERE username = ?', (username,))
-    user = cursor.fetchone()
-    if user:
-        status = 'existing'
-    else:
-        cursor.execute('INSERT INTO User (username) VALUES (?)', (username,))
-        conn.commit()
-        status = 'new'
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT username FROM User WHERE username = ?', (username,))
+        user = cursor.fetchone()
+        if user:
+            status = 'existing'
+        else:
+            cursor.execute('INSERT INTO User (username) VALUES (?)', (username,))
+            conn.commit()
+            status = 'new'
+    if status == 'new':
+        # The User insert trigger put them on the 'all' board at 0
+        leaderboard_index.record(username)
     return jsonify({'status': status, 'username': username})
 
 @user_bp.route('/user_bricks/<username>', methods=['GET'])
 def user_bricks(username):
-    conn = get_db()
-    cursor = conn.cursor()
-    # Get all bricks
-    cursor.execute('SELECT group_id FROM Brick')
-    brick_ids = [row[0] for row in cursor.fetchall()]
-    # Get user scores
-    cursor.execute('SELECT group_id, score FROM UserBrick WHERE username = ?', (username,))
-    user_scores = {row[0]: row[1] for row in cursor.fetchall()}
-    # Build result
-    result = []
-    total_score = 0
-    for group_id in brick_ids:
-        score = user_scores.get(group_id, 0)
-        total_score += score
-        result.append({'group_id': group_id, 'score': score})
-    # Update total_score in User table
-    cursor.execute('UPDATE User SET total_score = ? WHERE username = ?', (total_score, username))
-    conn.commit()
-    conn.close()
-    return jsonify({'username': username, 'bricks': result, 'total_score': total_score})
+    language = request.args.get('language') or None
+    _, bricks, user_scores, _ = score_queue.user_progress('brick', username, language)
+    result = [{'group_id': group_id, 'score': user_scores.get(group_id, 0)} for group_id, _ in bricks]
+    # total_score here is the user's brick subtotal (of the language, if given), as in /user_steps
+    body = {'username': username, 'bricks': result, 'total_score': progress_total(bricks, user_scores)}
+    if language:
+        # Levels unlock per language, as in the bootstrap progress
+        body['unlocked_level'] = unlocked_level(bricks, user_scores)
+    return jsonify(body)
 
 @user_bp.route('/user_brick', methods=['POST'])
 def update_user_brick():
@@ -130,23 +102,15 @@ def update_user_brick():
         score = 0.0
     if not username or group_id is None:
         return jsonify({'error': 'Missing username or group_id'}), 400
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM UserBrick WHERE username = ? AND group_id = ?', (username, group_id))
-    exists = cursor.fetchone()
-    if exists:
-        cursor.execute('UPDATE UserBrick SET score = ? WHERE username = ? AND group_id = ?', (score, username, group_id))
-    else:
-        cursor.execute('INSERT INTO UserBrick (username, group_id, score) VALUES (?, ?, ?)', (username, group_id, score))
-    # Recalculate total_score
-    cursor.execute('SELECT SUM(score) FROM UserBrick WHERE username = ?', (username,))
-    total_score = cursor.fetchone()[0] or 0
-    cursor.execute('UPDATE User SET total_score = ? WHERE username = ?', (total_score, username))
-    conn.commit()
-    # Return the updated score and total_score
-    cursor.execute('SELECT score FROM UserBrick WHERE username = ? AND group_id = ?', (username, group_id))
-    updated_score = cursor.fetchone()[0]
-    conn.close()
+    if score_queue.enabled:
+        # Acknowledged from memory; written with the next batch
+        total_score = score_queue.submit('brick', username, group_id, score)
+        return jsonify({'success': True, 'score': stored_score(score), 'total_score': total_score})
+    # The score triggers apply the change to total_score in the same transaction
+    with db_connection() as conn:
+        updated_score = save_user_score('brick', username, group_id, score, conn)
+        total_score = get_user_total(username, conn)
+    leaderboard_index.record(username)
     return jsonify({'success': True, 'score': updated_score, 'total_score': total_score})
 
 @user_bp.route('/user_bricks/reset', methods=['POST'])
@@ -157,25 +121,27 @@ def reset_user_bricks():
     print(f"[DEBUG] Resetting user bricks for username={username}, language={language}")
     if not username:
         return jsonify({'error': 'Missing username'}), 400
-    conn = get_db()
-    cursor = conn.cursor()
-    # Get all group_ids for the selected language
-    # Only reset existing UserBrick rows for this user and language
-    if language:
-        cursor.execute('SELECT group_id FROM Brick WHERE language = ?', (language,))
-        valid_group_ids = set(row[0] for row in cursor.fetchall())
-        cursor.execute('SELECT group_id FROM UserBrick WHERE username = ?', (username,))
-        user_group_ids = [row[0] for row in cursor.fetchall()]
-        group_ids_to_reset = [gid for gid in user_group_ids if gid in valid_group_ids]
-    else:
-        cursor.execute('SELECT group_id FROM UserBrick WHERE username = ?', (username,))
-        group_ids_to_reset = [row[0] for row in cursor.fetchall()]
-    print(f"[DEBUG] Found group_ids to reset: {group_ids_to_reset}")
-    for group_id in group_ids_to_reset:
-        cursor.execute('UPDATE UserBrick SET score = 0 WHERE username = ? AND group_id = ?', (username, group_id))
-        print(f"[DEBUG] Updated UserBrick: username={username}, group_id={group_id}")
-    # Reset total_score
-    cursor.execute('UPDATE User SET total_score = 0 WHERE username = ?', (username,))
-    conn.commit()
-    conn.close()
+    # Queued scores must land before the reset, not overwrite it afterwards
+    try:
+        score_queue.flush()
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Could not save queued scores, nothing was reset: {e}'}), 500
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        # Get all group_ids for the selected language
+        # Only reset existing UserBrick rows for this user and language
+        if language:
+            cursor.execute('SELECT group_id FROM Brick WHERE language = ?', (language,))
+            valid_group_ids = set(row[0] for row in cursor.fetchall())
+            cursor.execute('SELECT group_id FROM UserBrick WHERE username = ?', (username,))
+            user_group_ids = [row[0] for row in cursor.fetchall()]
+            group_ids_to_reset = [gid for gid in user_group_ids if gid in valid_group_ids]
+        else:
+            cursor.execute('SELECT group_id FROM UserBrick WHERE username = ?', (username,))
+            group_ids_to_reset = [row[0] for row in cursor.fetchall()]
+        print(f"[DEBUG] Found group_ids to reset: {group_ids_to_reset}")
+        for group_id in group_ids_to_reset:
+            cursor.execute('UPDATE UserBrick SET score = 0 WHERE username = ? AND group_id = ?', (username, group_id))
+            print(f"[DEBUG] Updated UserBrick: username={username}, group_id={group_id}")
+    leaderboard_index.record(username)
     return jsonify({'success': True})
\ No newline at end of file
@@ -0,0 +1,257 @@
+import os
+import abc
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+from moondream_client import client_pool
+from metrics import moondream_latency
+
+DETECTOR_BACKEND = os.getenv('DETECTOR_BACKEND', 'cloud')
+LOCAL_MODEL_ID = os.getenv('LOCAL_MODEL_ID', 'vikhyatk/moondream2')
+LOCAL_MODEL_REVISION = os.getenv('LOCAL_MODEL_REVISION', '2025-01-09')
+LOCAL_MODEL_THREADS = int(os.getenv('LOCAL_MODEL_THREADS', 0))
+# Micro-batching defaults to on for the local backend, where one worker owns the model
+DETECT_MICRO_BATCH = os.getenv('DETECT_MICRO_BATCH', '1' if DETECTOR_BACKEND == 'local' else '0') == '1'
+DETECT_BATCH_MAX_SIZE = int(os.getenv('DETECT_BATCH_MAX_SIZE', 8))
+DETECT_BATCH_MAX_WAIT_MS = float(os.getenv('DETECT_BATCH_MAX_WAIT_MS', 15))
+
+
+class Detector(abc.ABC):
+    """
+    Detection backend interface.
+
+    detect() returns the Moondream result shape {'objects': [{'x_min', ...}]}.
+    detect_batch() takes (image_key, image, target) tuples and returns one
+    result or exception per item; backends override it when they can share
+    work across items.
+    """
+    name = 'base'
+
+    @abc.abstractmethod
+    def detect(self, image, target):
+        """Detect target in a PIL image; every backend implements this"""
+
+    def detect_batch(self, items):
+        results = []
+        for _, image, target in items:
+            try:
+                results.append(self.detect(image, target))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def health(self):
+        return {'healthy': True, 'backend': self.name}
+
+    def stats(self):
+        return {'backend': self.name}
+
+
+class CloudDetector(Detector):
+    """Hosted Moondream API through the shared keep-alive client pool"""
+    name = 'cloud'
+
+    def detect(self, image, target):
+        with client_pool.client() as client:
+            return client.detect(image, target)
+
+    def health(self):
+        return dict(client_pool.health(), backend=self.name)
+
+    def stats(self):
+        return {'backend': self.name, 'clients': client_pool.stats()}
+
+
+class LocalDetector(Detector):
+    """
+    Moondream 2 running on the local CPU through torch.
+
+    The model is loaded on first use. Items in a batch that share an image are
+    encoded once, so the vision encoder (the expensive part) runs once per
+    image rather than once per target.
+    """
+    name = 'local'
+
+    def __init__(self, model_id=LOCAL_MODEL_ID, revision=LOCAL_MODEL_REVISION, threads=LOCAL_MODEL_THREADS):
+        self.model_id = model_id
+        self.revision = revision
+        self.threads = threads
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._infer_lock = threading.Lock()
+        self.images_encoded = 0
+        self.targets_detected = 0
+
+    def _load(self):
+        with self._load_lock:
+            if self._model is None:
+                # Imported lazily so the cloud backend does not need torch/transformers
+                import torch
+                from transformers import AutoModelForCausalLM
+                if self.threads:
+                    torch.set_num_threads(self.threads)
+                started = time.perf_counter()
+                model = AutoModelForCausalLM.from_pretrained(
+                    self.model_id,
+                    revision=self.revision,
+                    trust_remote_code=True,
+                    device_map={'': 'cpu'}
+                )
+                model.eval()
+                self._model = model
+                print(f"Loaded local detector {self.model_id} in {time.perf_counter() - started:.1f}s")
+        return self._model
+
+    def detect(self, image, target):
+        return self.detect_batch([(None, image, target)])[0]
+
+    def detect_batch(self, items):
+        import torch
+        model = self._load()
+        encoded = {}
+        results = []
+        with self._infer_lock, torch.inference_mode():
+            for image_key, image, target in items:
+                try:
+                    key = image_key if image_key is not None else id(image)
+                    if key not in encoded:
+                        encoded[key] = model.encode_image(image)
+                        self.images_encoded += 1
+                    results.append(model.detect(encoded[key], target))
+                    self.targets_detected += 1
+                except Exception as e:
+                    results.append(e)
+        return results
+
+    def health(self):
+        return {'healthy': True, 'backend': self.name, 'loaded': self._model is not None}
+
+    def stats(self):
+        return {
+            'backend': self.name,
+            'model': self.model_id,
+            'loaded': self._model is not None,
+            'images_encoded': self.images_encoded,
+            'targets_detected': self.targets_detected
+        }
+
+
+class MicroBatchScheduler:
+    """
+    Groups concurrent detection calls into batches for one worker thread.
+
+    A batch closes when it reaches max_batch_size items or max_wait_ms after
+    its first item arrived, whichever comes first.
+    """
+
+    def __init__(self, detector, max_batch_size=DETECT_BATCH_MAX_SIZE, max_wait_ms=DETECT_BATCH_MAX_WAIT_MS):
+        self.detector = detector
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='detect-batcher', daemon=True)
+                self._thread.start()
+
+    def submit(self, image_key, image, target):
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((image_key, image, target, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            try:
+                results = self.detector.detect_batch([item[:3] for item in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            for item, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    item[3].set_exception(result)
+                else:
+                    item[3].set_result(result)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'largest_batch': self.largest_batch,
+            'average_batch': round(self.items / self.batches, 2) if self.batches else 0.0,
+            'queued': self._queue.qsize(),
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000
+        }
+
+
+DETECTOR_BACKENDS = {
+    'cloud': CloudDetector,
+    'local': LocalDetector
+}
+
+_detector = None
+_scheduler = None
+_init_lock = threading.Lock()
+
+
+def get_detector():
+    """Return the process-wide detector (and scheduler) selected by DETECTOR_BACKEND"""
+    global _detector, _scheduler
+    with _init_lock:
+        if _detector is None:
+            if DETECTOR_BACKEND not in DETECTOR_BACKENDS:
+                raise ValueError(f"Unknown DETECTOR_BACKEND: {DETECTOR_BACKEND}")
+            _detector = DETECTOR_BACKENDS[DETECTOR_BACKEND]()
+            if DETECT_MICRO_BATCH:
+                _scheduler = MicroBatchScheduler(_detector)
+    return _detector
+
+
+def detect_objects(image, target, image_key=None):
+    """Detect target in image with the configured backend, micro-batched if enabled"""
+    detector = get_detector()
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        if _scheduler is not None:
+            result = _scheduler.submit(image_key, image, target).result()
+        else:
+            result = detector.detect(image, target)
+        outcome = 'ok'
+        return result
+    finally:
+        moondream_latency.observe(time.perf_counter() - started, detector.name, outcome)
+
+
+def detector_stats():
+    detector = get_detector()
+    stats = detector.stats()
+    if _scheduler is not None:
+        stats['scheduler'] = _scheduler.stats()
+    return stats
@@ -0,0 +1,148 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+
+from PIL import Image, features
+
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'images')
+DERIVED_DIR = os.path.join(IMAGE_DIR, 'derived')
+MANIFEST_PATH = os.path.join(DERIVED_DIR, 'manifest.json')
+DERIVED_URL_PREFIX = '/data/images/derived/'
+VARIANT_WIDTHS = (320, 640, 1024)
+VARIANT_QUALITY = {'webp': 80, 'avif': 60}
+SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+# Derived file names embed their content hash, so they can be cached forever
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_manifest = {}
+_manifest_mtime = None
+_manifest_lock = threading.Lock()
+
+
+def variant_formats():
+    """Formats this Pillow build can encode, best compression first"""
+    return [fmt for fmt in ('avif', 'webp') if features.check(fmt)]
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_variants(filename, source_hash, formats):
+    """Write every width/format variant of one image and return its manifest entry"""
+    stem = os.path.splitext(filename)[0]
+    with Image.open(os.path.join(IMAGE_DIR, filename)) as image:
+        image = image.convert('RGB')
+        width, height = image.size
+        # Never upscale; the largest variant is capped at the original width
+        widths = sorted({min(w, width) for w in VARIANT_WIDTHS})
+        variants = []
+        for target_width in widths:
+            resized = image if target_width == width else image.resize(
+                (target_width, round(height * target_width / width)), Image.LANCZOS
+            )
+            for fmt in formats:
+                tmp_path = os.path.join(DERIVED_DIR, f'.{stem}-{target_width}.{fmt}.tmp')
+                resized.save(tmp_path, format=fmt.upper(), quality=VARIANT_QUALITY[fmt])
+                digest = file_hash(tmp_path)[:12]
+                name = f'{stem}-{target_width}.{digest}.{fmt}'
+                os.replace(tmp_path, os.path.join(DERIVED_DIR, name))
+                variants.append({
+                    'width': target_width,
+                    'format': fmt,
+                    'file': name,
+                    'bytes': os.path.getsize(os.path.join(DERIVED_DIR, name))
+                })
+    return {'hash': source_hash, 'width': width, 'height': height, 'variants': variants}
+
+
+def build_all(force=False):
+    """Build derivatives for every source image, skipping images whose hash is unchanged"""
+    os.makedirs(DERIVED_DIR, exist_ok=True)
+    formats = variant_formats()
+    previous = {}
+    if os.path.exists(MANIFEST_PATH) and not force:
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            previous = json.load(f).get('images', {})
+    images = {}
+    built = 0
+    started = time.time()
+    for filename in sorted(os.listdir(IMAGE_DIR)):
+        if not filename.lower().endswith(SOURCE_EXTENSIONS):
+            continue
+        source_hash = file_hash(os.path.join(IMAGE_DIR, filename))
+        entry = previous.get(filename)
+        if (entry and entry['hash'] == source_hash
+                and {v['format'] for v in entry['variants']} == set(formats)
+                and all(os.path.exists(os.path.join(DERIVED_DIR, v['file'])) for v in entry['variants'])):
+            images[filename] = entry
+            continue
+        images[filename] = build_variants(filename, source_hash, formats)
+        built += 1
+        print(f"  Built {len(images[filename]['variants'])} variants for {filename}")
+
+    # Remove derived files no longer referenced by the manifest
+    referenced = {v['file'] for entry in images.values() for v in entry['variants']}
+    for name in os.listdir(DERIVED_DIR):
+        if name != os.path.basename(MANIFEST_PATH) and name not in referenced:
+            os.remove(os.path.join(DERIVED_DIR, name))
+
+    tmp_path = MANIFEST_PATH + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'formats': formats, 'widths': list(VARIANT_WIDTHS), 'images': images}, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+    source_bytes = sum(os.path.getsize(os.path.join(IMAGE_DIR, name)) for name in images)
+    derived_bytes = sum(v['bytes'] for entry in images.values() for v in entry['variants'])
+    print(f"Built {built} of {len(images)} images in {time.time() - started:.1f}s "
+          f"({source_bytes / 1e6:.1f} MB of sources, {derived_bytes / 1e6:.1f} MB of variants)")
+
+
+def get_manifest():
+    """Return the manifest images map, reloading it when the file changes"""
+    global _manifest, _manifest_mtime
+    try:
+        mtime = os.path.getmtime(MANIFEST_PATH)
+    except OSError:
+        return {}
+    if mtime != _manifest_mtime:
+        with _manifest_lock:
+            if mtime != _manifest_mtime:
+                with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+                    _manifest = json.load(f).get('images', {})
+                _manifest_mtime = mtime
+    return _manifest
+
+
+def manifest_version():
+    """mtime of the manifest, or None without one; part of cache keys for anything built from image_sources()"""
+    try:
+        return os.path.getmtime(MANIFEST_PATH)
+    except OSError:
+        return None
+
+
+def image_sources(filename):
+    """
+    srcset strings per format for a source image, e.g.
+    {'webp': '/data/images/derived/ES-1-1-320.ab12.webp 320w, ...'}, or None
+    when the image has no derivatives yet.
+    """
+    entry = get_manifest().get(filename)
+    if not entry:
+        return None
+    sources = {}
+    for variant in entry['variants']:
+        sources.setdefault(variant['format'], []).append(f"{DERIVED_URL_PREFIX}{variant['file']} {variant['width']}w")
+    return {fmt: ', '.join(urls) for fmt, urls in sources.items()}
+
+
+if __name__ == '__main__':
+    print(f"Building image derivatives in {DERIVED_DIR}...")
+    build_all(force='--force' in sys.argv)
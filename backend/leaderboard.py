@@ -0,0 +1,153 @@
+import os
+import time
+import bisect
+import datetime
+import threading
+
+from database.db_helper import get_board_scores, get_user_board_scores
+
+# Boards not written through this process (other workers, offline scripts) are reloaded after this many seconds
+LEADERBOARD_MAX_AGE = float(os.getenv('LEADERBOARD_MAX_AGE', 60))
+WINDOWS = ('all', 'language', 'week')
+
+
+def week_board(now=None):
+    """Name of the weekly board: its Monday's date, as date('now', 'weekday 0', '-6 days') in the weekly triggers (UTC)"""
+    today = datetime.datetime.fromtimestamp(time.time() if now is None else now, datetime.timezone.utc).date()
+    return 'week:' + (today - datetime.timedelta(days=today.weekday())).isoformat()
+
+
+def board_name(window, language=None):
+    """LeaderboardScore board for a ?window= (and ?language=) query; raises ValueError for unknown windows"""
+    if window == 'all':
+        return 'all'
+    if window == 'language':
+        if not language:
+            raise ValueError("window=language needs a language")
+        return f'lang:{language}'
+    if window == 'week':
+        return week_board()
+    raise ValueError(f"Unknown window '{window}', expected one of {', '.join(WINDOWS)}")
+
+
+class RankIndex:
+    """
+    One board's scores in rank order. keys holds (-score, username) sorted
+    ascending, so a rank is one bisect (O(log n)) and top-N or "me plus
+    neighbors" is a slice. Moving a user is two bisects and a list memmove,
+    which stays in the microseconds at hundreds of thousands of users.
+    """
+
+    def __init__(self, rows):
+        self.scores = dict(rows)
+        self.keys = sorted((-score, username) for username, score in self.scores.items())
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def set(self, username, score):
+        """Move username to score, or drop them from the board when score is None"""
+        old = self.scores.pop(username, None)
+        if old is not None:
+            del self.keys[bisect.bisect_left(self.keys, (-old, username))]
+        if score is not None:
+            self.scores[username] = score
+            bisect.insort(self.keys, (-score, username))
+
+    def rank(self, username):
+        """1-based rank; users with the same score share it. None if the user has no score on this board"""
+        score = self.scores.get(username)
+        if score is None:
+            return None
+        # (-score,) sorts before every (-score, name), so this counts strictly higher scores
+        return bisect.bisect_left(self.keys, (-score,)) + 1
+
+    def entries(self, start, stop):
+        return [
+            {'rank': bisect.bisect_left(self.keys, (negated,)) + 1, 'username': username, 'total_score': -negated}
+            for negated, username in self.keys[max(start, 0):stop]
+        ]
+
+    def top(self, limit):
+        return self.entries(0, limit)
+
+    def around(self, username, neighbors):
+        """The user's entry with up to neighbors entries on each side"""
+        score = self.scores.get(username)
+        if score is None:
+            return []
+        index = bisect.bisect_left(self.keys, (-score, username))
+        return self.entries(index - neighbors, index + neighbors + 1)
+
+
+class Leaderboard:
+    """
+    In-memory rank indexes over the LeaderboardScore table, loaded per board on
+    first use. The table is the source of truth (its triggers apply every score
+    write); record() replays a user's new scores into the loaded indexes right
+    after a write so this process never shows a stale rank for its own writes.
+    """
+
+    def __init__(self, max_age=LEADERBOARD_MAX_AGE):
+        self.max_age = max_age
+        self._boards = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.updates = 0
+
+    def _board(self, name):
+        with self._lock:
+            index = self._boards.get(name)
+        if index is not None and time.time() - index.loaded_at < self.max_age:
+            return index
+        # Built outside the lock; a concurrent load of the same board just wins or loses the swap
+        index = RankIndex(get_board_scores(name))
+        with self._lock:
+            if name.startswith('week:'):
+                # Only the current week is ranked
+                for old in [board for board in self._boards if board.startswith('week:') and board != name]:
+                    del self._boards[old]
+            self._boards[name] = index
+            self.loads += 1
+        return index
+
+    def standings(self, name, limit=10, username=None, neighbors=2):
+        """Top entries of a board, plus the user's own entry and neighbors when username is given"""
+        index = self._board(name)
+        with self._lock:
+            result = {'board': name, 'users': len(index), 'leaderboard': index.top(limit)}
+            if username:
+                rank = index.rank(username)
+                result['me'] = {
+                    'username': username,
+                    'rank': rank,
+                    'total_score': index.scores.get(username, 0)
+                }
+                result['neighbors'] = index.around(username, neighbors)
+        return result
+
+    def record(self, username):
+        """Refresh one user on every loaded board after their scores changed"""
+        with self._lock:
+            boards = list(self._boards)
+        if not boards:
+            return
+        scores = get_user_board_scores(username, boards)
+        with self._lock:
+            for name in boards:
+                index = self._boards.get(name)
+                if index is not None:
+                    index.set(username, scores.get(name))
+            self.updates += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'boards': {name: len(index) for name, index in self._boards.items()},
+                'loads': self.loads,
+                'updates': self.updates
+            }
+
+
+leaderboard = Leaderboard()
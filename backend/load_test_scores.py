@@ -0,0 +1,88 @@
+import os
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+
+import database.db_helper as db_helper
+
+# Classroom-burst load test for POST /user_brick: many clients answering at
+# once, with and without the score write-behind queue. Runs the real app
+# in-process against a scratch copy of duduolingo.db.
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+def run(app, group_ids, clients, answers, write_behind):
+    from write_behind import score_queue
+    score_queue.enabled = write_behind
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+
+    def student(number):
+        rng = random.Random(number)
+        client = app.test_client()
+        username = f'loadtest{number}'
+        client.post('/login', json={'username': username})
+        mine = []
+        for _ in range(answers):
+            started = time.perf_counter()
+            response = client.post('/user_brick', json={
+                'username': username, 'group_id': rng.choice(group_ids), 'score': rng.randrange(1, 100)
+            })
+            mine.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                failures.append(response.status_code)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=student, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    acknowledged = time.perf_counter() - started
+    # Written means durable in the database, so the drain counts
+    score_queue.flush()
+    written = time.perf_counter() - started
+    stats = score_queue.stats()
+    mode = 'write-behind' if write_behind else 'synchronous'
+    print(f"{mode:>12}: {len(latencies)} answers by {clients} clients, "
+          f"{len(latencies) / acknowledged:.0f} acks/sec, {len(latencies) / written:.0f} writes/sec, "
+          f"p50 {percentile(latencies, 0.5) * 1000:.1f}ms, p99 {percentile(latencies, 0.99) * 1000:.1f}ms"
+          + (f", {stats['batches']} batches" if write_behind else '')
+          + (f", {len(failures)} failed" if failures else ''))
+
+def load_test(clients, answers):
+    from main import create_app
+    from database.migrations import run_migrations
+    source = db_helper.DATABASE_PATH
+    app = None
+    for write_behind in (False, True):
+        with tempfile.TemporaryDirectory() as scratch:
+            # The pool follows DATABASE_PATH, so each mode starts from a fresh copy
+            db_helper.DATABASE_PATH = os.path.join(scratch, 'duduolingo.db')
+            shutil.copy(source, db_helper.DATABASE_PATH)
+            if app is None:
+                app = create_app()
+            run_migrations()
+            with db_helper.db_connection() as conn:
+                group_ids = [row[0] for row in conn.execute('SELECT group_id FROM Brick').fetchall()]
+            run(app, group_ids, clients, answers, write_behind)
+            drift = db_helper.find_total_drift()
+            if drift:
+                print(f"  {len(drift)} users with a wrong total afterwards")
+            db_helper.db_pool.close_idle()
+    db_helper.DATABASE_PATH = source
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test score submissions with and without write-behind')
+    parser.add_argument('--clients', type=int, default=30, help='concurrent students')
+    parser.add_argument('--answers', type=int, default=100, help='answers per student')
+    args = parser.parse_args()
+    load_test(args.clients, args.answers)
@@ -1,32 +1,62 @@
-from flask import Flask, send_from_directory
+import os
+from flask import Flask, jsonify
 from flask_cors import CORS
 from BrickMode import register_brick_routes
 from database.user import user_bp
 from MoonDream import detect_bp
+from moondream_client import client_pool
+from detectors import DETECTOR_BACKEND
+from media import serve_media, media_stats
+from media_index import media_index
 from StepMode import register_step_routes
+from bootstrap import bootstrap_bp
+from search import search_bp
+from metrics import install_metrics
+from database.migrations import run_migrations
 
 def create_app():
     app = Flask(__name__)
     CORS(app)
+    # Request, SQL and Moondream timings, exported at /metrics
+    install_metrics(app)
+    # Bring the schema up to date once, so request handlers never check it
+    run_migrations()
+    # Index media once; file lookups and validators read from it
+    media_index.reload()
+    media_index.start_watcher()
     # Register route modules
     register_brick_routes(app)
     register_step_routes(app)
     # Register user routes
     app.register_blueprint(user_bp)
     app.register_blueprint(detect_bp)
+    app.register_blueprint(bootstrap_bp)
+    app.register_blueprint(search_bp)
+    # Open Moondream connections before the first hint request if asked to
+    if os.getenv('MOONDREAM_WARMUP') and DETECTOR_BACKEND == 'cloud':
+        client_pool.warm_up(int(os.getenv('MOONDREAM_WARMUP_CLIENTS', 1)))
 
     # --- Serve video files ---
     @app.route('/data/videos/<filename>')
     def serve_video(filename):
-        return send_from_directory('data/videos', filename)
+        return serve_media('videos', filename)
     # ------------------------
 
     # --- Serve sound files ---
     @app.route('/sound/<filename>')
     def serve_sound(filename):
-        return send_from_directory('data/sounds', filename)
+        return serve_media('sounds', filename)
     # ------------------------
 
+    @app.route('/media/stats', methods=['GET'])
+    def media_stats_endpoint():
+        return jsonify(media_stats())
+
+    @app.route('/api/media/reload', methods=['POST'])
+    def reload_media_index():
+        count = media_index.reload()
+        return jsonify({'success': True, 'files': count, 'build_ms': media_index.build_ms})
+
     return app
 
 if __name__ == '__main__':
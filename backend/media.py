@@ -0,0 +1,55 @@
+import os
+import mimetypes
+
+from flask import request, send_file, Response, abort
+
+from lru import LRUCache
+from media_index import media_index
+
+MEDIA_MAX_AGE = int(os.getenv('MEDIA_MAX_AGE', 3600))
+# Files up to this size are served from memory; larger ones stream from disk
+MEDIA_MEMORY_MAX_FILE = int(os.getenv('MEDIA_MEMORY_MAX_FILE', 512 * 1024))
+MEDIA_MEMORY_BYTES = int(os.getenv('MEDIA_MEMORY_BYTES', 32 * 1024 * 1024))
+
+# path -> (size, mtime, bytes) for small, hot files such as the answer sounds
+_hot_files = LRUCache(max_entries=256, max_bytes=MEDIA_MEMORY_BYTES, sizeof=lambda entry: len(entry[2]))
+
+
+def serve_media(kind, filename, max_age=MEDIA_MAX_AGE):
+    """
+    Serve an indexed media file with a strong content ETag, Range/206 support and 304s.
+
+    The file is looked up in the media index, so validators come from the
+    precomputed hash; a name the index does not have yet is stat'ed once and
+    added, so files written after startup (new image variants) are served
+    without a reload. Small files come from a size-bounded in-memory LRU. Large files go
+    through send_file, which hands the open file to the server's
+    wsgi.file_wrapper (sendfile where the server supports it) instead of
+    copying it through Python.
+    """
+    entry = media_index.lookup(kind, filename)
+    if entry is None:
+        abort(404)
+    etag = entry.hash[:32]
+
+    if entry.size > MEDIA_MEMORY_MAX_FILE:
+        response = send_file(entry.path, conditional=True, etag=etag, max_age=max_age, last_modified=entry.mtime)
+        response.headers['Accept-Ranges'] = 'bytes'
+        return response
+
+    cached = _hot_files.get(entry.path)
+    if cached is None or cached[0] != entry.size or cached[1] != entry.mtime:
+        with open(entry.path, 'rb') as f:
+            cached = (entry.size, entry.mtime, f.read())
+        _hot_files.put(entry.path, cached)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = Response(cached[2], mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = entry.mtime
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request, accept_ranges=True, complete_length=entry.size)
+
+
+def media_stats():
+    return {'index': media_index.summary(), 'hot_files': _hot_files.stats()}
@@ -0,0 +1,185 @@
+import os
+import time
+import hashlib
+import threading
+from collections import namedtuple
+
+from PIL import Image
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BACKEND_DIR, 'data')
+MEDIA_WATCH_INTERVAL = float(os.getenv('MEDIA_WATCH_INTERVAL', 0))
+
+# kind -> (directory, hash contents)
+MEDIA_KINDS = {
+    'images': (os.path.join(DATA_DIR, 'images'), True),
+    'derived': (os.path.join(DATA_DIR, 'images', 'derived'), True),
+    'videos': (os.path.join(DATA_DIR, 'videos'), True),
+    'sounds': (os.path.join(DATA_DIR, 'sounds'), True)
+}
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.avif')
+
+MediaEntry = namedtuple('MediaEntry', 'name path size mtime hash width height')
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaIndex:
+    """
+    In-memory index of every media file: path, size, mtime, sha256 and, for
+    images, pixel dimensions.
+
+    Built once at startup and swapped atomically on reload(). Request handlers
+    only read the current snapshot, so serving a file never lists or stats the
+    directory. Files whose size and mtime are unchanged keep their previous
+    hash, so reloads only re-hash what actually changed. A file added after the
+    last reload (a new image variant, say) is indexed on its first lookup.
+    """
+
+    def __init__(self, kinds=MEDIA_KINDS):
+        self.kinds = kinds
+        self._entries = {}
+        self._signature = None
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self.built_at = None
+        self.build_ms = 0.0
+        self.reloads = 0
+
+    def _scan_signature(self):
+        """Cheap change detector: (name, size, mtime) of every file"""
+        signature = []
+        for kind, (directory, _) in self.kinds.items():
+            if not os.path.isdir(directory):
+                continue
+            with os.scandir(directory) as it:
+                for item in it:
+                    if item.is_file():
+                        stat = item.stat()
+                        signature.append((kind, item.name, stat.st_size, stat.st_mtime))
+        return tuple(sorted(signature))
+
+    def reload(self):
+        """Rebuild the index; returns the number of files indexed"""
+        with self._reload_lock:
+            started = time.perf_counter()
+            previous = self._entries
+            entries = {}
+            for kind, (directory, hashed) in self.kinds.items():
+                files = {}
+                if os.path.isdir(directory):
+                    with os.scandir(directory) as it:
+                        for item in it:
+                            if not item.is_file() or item.name.startswith('.'):
+                                continue
+                            stat = item.stat()
+                            old = previous.get(kind, {}).get(item.name)
+                            if old and old.size == stat.st_size and old.mtime == stat.st_mtime:
+                                files[item.name] = old
+                                continue
+                            files[item.name] = self._entry(item.name, item.path, stat, hashed)
+                entries[kind] = files
+            self._entries = entries
+            self._signature = self._scan_signature()
+            self.built_at = time.time()
+            self.build_ms = round((time.perf_counter() - started) * 1000, 2)
+            self.reloads += 1
+            return sum(len(files) for files in entries.values())
+
+    @staticmethod
+    def _entry(name, path, stat, hashed):
+        width = height = None
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            try:
+                # Only reads the header, not the pixel data
+                with Image.open(path) as image:
+                    width, height = image.size
+            except Exception as e:
+                print(f"Media index: cannot read dimensions of {name}: {e}")
+        return MediaEntry(name, path, stat.st_size, stat.st_mtime, sha256_file(path) if hashed else None, width, height)
+
+    def ensure_built(self):
+        if self.built_at is None:
+            self.reload()
+
+    def get(self, kind, name):
+        """MediaEntry for kind/name, or None if it is not indexed"""
+        return self._entries.get(kind, {}).get(name)
+
+    def lookup(self, kind, name):
+        """
+        MediaEntry for kind/name, indexing the file if it was added since the
+        last reload; None if there is no such file. Only plain file names in
+        the kind's own directory are looked up.
+        """
+        entry = self.get(kind, name)
+        if entry is not None or kind not in self.kinds:
+            return entry
+        if os.path.basename(name) != name or name.startswith('.'):
+            return None
+        directory, hashed = self.kinds[kind]
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        with self._reload_lock:
+            entry = self._entry(name, path, stat, hashed)
+            # Copy-on-write, so readers keep seeing a consistent snapshot
+            entries = dict(self._entries)
+            entries[kind] = dict(entries.get(kind, {}), **{name: entry})
+            self._entries = entries
+        return entry
+
+    def image_size(self, name):
+        """(width, height) of a lesson image, or (None, None) if unknown"""
+        entry = self.get('images', name)
+        return (entry.width, entry.height) if entry else (None, None)
+
+    def names(self, kind):
+        return sorted(self._entries.get(kind, {}))
+
+    def check_for_changes(self):
+        """Reload if any indexed directory changed; returns True when it did"""
+        if self._scan_signature() != self._signature:
+            self.reload()
+            return True
+        return False
+
+    def start_watcher(self, interval=MEDIA_WATCH_INTERVAL):
+        """Poll the media directories every interval seconds and reload on change"""
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self.check_for_changes():
+                        print("Media index reloaded after a file change")
+                except Exception as e:
+                    print(f"Media index watcher error: {e}")
+
+        self._watcher = threading.Thread(target=watch, name='media-index-watcher', daemon=True)
+        self._watcher.start()
+
+    def summary(self):
+        return {
+            'files': {kind: len(files) for kind, files in self._entries.items()},
+            'bytes': {kind: sum(e.size for e in files.values()) for kind, files in self._entries.items()},
+            'built_at': self.built_at,
+            'build_ms': self.build_ms,
+            'reloads': self.reloads,
+            'watching': self._watcher is not None
+        }
+
+
+media_index = MediaIndex()
@@ -0,0 +1,191 @@
+import os
+import time
+import bisect
+import threading
+
+from flask import Response, g, request, has_request_context
+
+from database.db_helper import set_sql_observer, db_pool
+from write_behind import score_queue
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SQL_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{format_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. observe() is a bisect and three additions under
+    a lock; buckets are only made cumulative when rendered.
+    """
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for label_values, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                labels = format_labels(self.labels + ('le',), label_values + (bound,))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {values[-2]}')
+            lines.append(f'{self.name}_count{labels} {values[-1]}')
+        return lines
+
+
+class GaugeFunction:
+    """Gauge read at scrape time from a callable returning {label values: value}"""
+
+    def __init__(self, name, help_text, labels, read):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.read = read
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        for label_values, value in sorted(self.read().items()):
+            lines.append(f'{self.name}{format_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+http_requests = Counter('http_requests_total', 'HTTP requests by route, method and status.',
+                        ('route', 'method', 'status'))
+http_exceptions = Counter('http_request_exceptions_total', 'Requests that raised an unhandled exception.',
+                          ('route', 'method'))
+http_latency = Histogram('http_request_duration_seconds', 'Request latency by route.', ('route', 'method'))
+request_sql_statements = Histogram('http_request_sql_statements', 'SQL statements executed per request.',
+                                   ('route',), COUNT_BUCKETS)
+request_sql_seconds = Histogram('http_request_sql_seconds', 'Time spent in SQL per request.', ('route',), SQL_BUCKETS)
+sql_statements = Counter('sql_statements_total', 'SQL statements by leading keyword.', ('op',))
+# op is the statement's leading keyword, or FETCH for time spent in fetchall
+sql_latency = Histogram('sql_statement_duration_seconds', 'SQL statement latency by leading keyword.',
+                        ('op',), SQL_BUCKETS)
+moondream_latency = Histogram('moondream_call_duration_seconds', 'Moondream detection call latency.',
+                              ('backend', 'outcome'))
+
+db_pool_connections = GaugeFunction(
+    'db_pool_connections', 'SQLite connection pool state and lifetime counts.', ('state',),
+    lambda: {(name,): value for name, value in db_pool.stats().items() if name != 'reuse_rate'}
+)
+
+score_write_queue = GaugeFunction(
+    'score_write_behind', 'Score write-behind queue depth and lifetime counts.', ('state',),
+    lambda: {(name,): value for name, value in score_queue.stats().items()
+             if name in ('pending', 'inflight', 'submitted', 'flushed', 'batches', 'failed_batches')}
+)
+
+REGISTRY = (http_requests, http_exceptions, http_latency, request_sql_statements, request_sql_seconds,
+            sql_statements, sql_latency, moondream_latency, db_pool_connections, score_write_queue)
+
+
+def observe_sql(statement, seconds, fetch):
+    """SQL observer installed into db_helper: global per-keyword metrics plus per-request totals"""
+    if fetch:
+        op = 'FETCH'
+    else:
+        op = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'EMPTY'
+        sql_statements.inc(op)
+    sql_latency.observe(seconds, op)
+    if has_request_context() and 'request_started' in g:
+        g.sql_statements += 0 if fetch else 1
+        g.sql_seconds += seconds
+
+
+def route_label():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def install_metrics(app):
+    """Time every request on app, route SQL timings into it and expose /metrics"""
+    if not METRICS_ENABLED:
+        return
+    set_sql_observer(observe_sql)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.sql_statements = 0
+        g.sql_seconds = 0.0
+
+    @app.after_request
+    def record_request(response):
+        if 'request_started' not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_started
+        route = route_label()
+        http_requests.inc(route, request.method, response.status_code)
+        http_latency.observe(elapsed, route, request.method)
+        request_sql_statements.observe(g.sql_statements, route)
+        request_sql_seconds.observe(g.sql_seconds, route)
+        # Lets browser devtools show the split without scraping /metrics
+        response.headers.add('Server-Timing', f'app;dur={elapsed * 1000:.1f}, db;dur={g.sql_seconds * 1000:.1f}')
+        return response
+
+    @app.teardown_request
+    def record_exception(error):
+        if error is not None:
+            http_exceptions.inc(route_label(), request.method)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,167 @@
+import os
+import time
+import queue
+import threading
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from moondream.cloud_vl import CloudVL
+
+load_dotenv()
+MOONDREAM_API_KEY = os.getenv('MOONDREAM_API_KEY')
+MOONDREAM_ENDPOINT = os.getenv('MOONDREAM_ENDPOINT', 'https://api.moondream.ai/v1')
+MOONDREAM_POOL_SIZE = int(os.getenv('MOONDREAM_POOL_SIZE', 8))
+MOONDREAM_TIMEOUT = float(os.getenv('MOONDREAM_TIMEOUT', 30))
+
+
+class KeepAliveCloudVL(CloudVL):
+    """
+    CloudVL that sends detect calls over a persistent requests.Session.
+
+    The SDK opens a fresh urllib connection (TCP + TLS handshake) per call;
+    this keeps one HTTP connection alive per client instead. Image encoding is
+    inherited from the SDK so the payload is identical.
+    """
+
+    def __init__(self, api_key=None, endpoint=MOONDREAM_ENDPOINT, timeout=MOONDREAM_TIMEOUT):
+        super().__init__(api_key=api_key, endpoint=endpoint)
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.session.headers['Content-Type'] = 'application/json'
+        if api_key:
+            self.session.headers['X-Moondream-Auth'] = api_key
+
+    def detect(self, image, object, settings=None):
+        payload = {'image_url': self.encode_image(image).image_url, 'object': object}
+        if self.model is not None:
+            payload['model'] = self.model
+        if settings is not None:
+            payload['settings'] = settings
+        response = self.session.post(f'{self.endpoint}/detect', json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return {'objects': response.json()['objects']}
+
+    def ping(self):
+        """Open (or reuse) the connection to the API host and return the round trip in ms"""
+        started = time.perf_counter()
+        self.session.head(self.endpoint, timeout=self.timeout)
+        return (time.perf_counter() - started) * 1000
+
+    def close(self):
+        self.session.close()
+
+
+class ClientPool:
+    """
+    Process-wide pool of Moondream clients shared by all request threads.
+
+    Clients are created lazily up to max_size and handed out one thread at a
+    time. The LIFO order keeps the most recently used (warmest) connection busy.
+    """
+
+    def __init__(self, factory, max_size=MOONDREAM_POOL_SIZE):
+        self.factory = factory
+        self.max_size = max_size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.acquired = 0
+        self.reused = 0
+        self.waited = 0
+        self.discarded = 0
+
+    def _acquire(self):
+        try:
+            client = self._idle.get_nowait()
+            with self._lock:
+                self.acquired += 1
+                self.reused += 1
+            return client
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self.created < self.max_size
+            if create:
+                self.created += 1
+        if create:
+            try:
+                client = self.factory()
+            except Exception:
+                with self._lock:
+                    self.created -= 1
+                raise
+            with self._lock:
+                self.acquired += 1
+            return client
+        # Pool exhausted: wait for another thread to return a client
+        client = self._idle.get()
+        with self._lock:
+            self.acquired += 1
+            self.reused += 1
+            self.waited += 1
+        return client
+
+    def _release(self, client, healthy=True):
+        if healthy:
+            self._idle.put(client)
+            return
+        # Drop clients whose connection failed so the next caller gets a fresh one
+        with self._lock:
+            self.created -= 1
+            self.discarded += 1
+        if hasattr(client, 'close'):
+            client.close()
+
+    @contextmanager
+    def client(self):
+        client = self._acquire()
+        healthy = True
+        try:
+            yield client
+        except requests.ConnectionError:
+            healthy = False
+            raise
+        finally:
+            self._release(client, healthy)
+
+    def warm_up(self, count=1):
+        """Create up to count clients and open their connections ahead of the first request"""
+        clients = []
+        try:
+            for _ in range(min(count, self.max_size)):
+                clients.append(self._acquire())
+            for client in clients:
+                if hasattr(client, 'ping'):
+                    client.ping()
+        finally:
+            for client in clients:
+                self._release(client)
+        print(f"Moondream client pool warmed up with {len(clients)} client(s)")
+
+    def health(self):
+        """Round-trip one pooled client to the API host"""
+        try:
+            with self.client() as client:
+                latency = client.ping() if hasattr(client, 'ping') else 0.0
+            return {'healthy': True, 'latency_ms': round(latency, 2), 'api_key_configured': bool(MOONDREAM_API_KEY)}
+        except Exception as e:
+            return {'healthy': False, 'error': str(e), 'api_key_configured': bool(MOONDREAM_API_KEY)}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.created,
+                'max_size': self.max_size,
+                'idle': self._idle.qsize(),
+                'acquired': self.acquired,
+                'reused': self.reused,
+                'waited': self.waited,
+                'discarded': self.discarded,
+                'reuse_rate': round(self.reused / self.acquired, 4) if self.acquired else 0.0
+            }
+
+
+client_pool = ClientPool(lambda: KeepAliveCloudVL(api_key=MOONDREAM_API_KEY))
@@ -0,0 +1,93 @@
+import os
+import json
+import base64
+
+from flask import request
+
+DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', 50))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 200))
+
+
+class BadQuery(ValueError):
+    """A filter, cursor or field list in the query string could not be used; answered with 400"""
+
+
+def int_arg(name):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise BadQuery(f"'{name}' must be an integer")
+
+
+def bool_arg(name):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise BadQuery(f"'{name}' must be true or false")
+
+
+def page_args(key_length):
+    """
+    (limit, after) from ?limit= and ?cursor=, or (None, None) when the request
+    is not paginated. after is the decoded sort key of the last item already
+    returned; queries continue strictly after it (keyset pagination), so pages
+    stay stable while rows are added and cost the same at any depth.
+    """
+    limit = int_arg('limit')
+    token = request.args.get('cursor')
+    if limit is None and not token:
+        return None, None
+    limit = DEFAULT_PAGE_SIZE if limit is None else limit
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise BadQuery(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+    return limit, decode_cursor(token, key_length) if token else None
+
+
+def fields_arg(allowed):
+    """Requested output fields from ?fields=a,b as a tuple, or None for all fields"""
+    value = request.args.get('fields')
+    if not value:
+        return None
+    fields = tuple(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise BadQuery(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, key_length):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        raise BadQuery('Invalid cursor')
+    if not isinstance(values, list) or len(values) != key_length:
+        raise BadQuery('Invalid cursor')
+    # Sort keys are plain column values; anything else cannot be compared or used in a cache key
+    if not all(value is None or isinstance(value, (str, int, float)) for value in values):
+        raise BadQuery('Invalid cursor')
+    return tuple(values)
+
+
+def select_fields(items, fields):
+    if fields is None:
+        return items
+    return [{field: item.get(field) for field in fields} for item in items]
+
+
+def page_body(items, limit, next_key):
+    """Paginated responses are wrapped so they can carry the next cursor; unpaginated ones stay a bare list"""
+    if limit is None:
+        return items
+    return {'items': items, 'next_cursor': encode_cursor(next_key) if next_key is not None else None}
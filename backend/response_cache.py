@@ -0,0 +1,103 @@
+import json
+import gzip
+import hashlib
+from collections import namedtuple
+
+from flask import request, Response
+
+from lru import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    # Optional; responses fall back to gzip when it is not installed
+    brotli = None
+
+CachedPayload = namedtuple('CachedPayload', 'body gzip br etag')
+
+_payloads = LRUCache(max_entries=256)
+
+
+def dump_json(data):
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def encode_payload(data):
+    """Serialize once and pre-compress; the ETags are derived from the JSON bytes"""
+    body = dump_json(data)
+    return CachedPayload(
+        body=body,
+        gzip=gzip.compress(body, compresslevel=9),
+        br=brotli.compress(body, quality=11) if brotli else None,
+        etag=hashlib.sha256(body).hexdigest()[:32]
+    )
+
+
+def get_payload(key, build, is_current=None):
+    """
+    Return the CachedPayload for key, calling build() on a miss.
+
+    key must change whenever the underlying content changes (it includes the
+    content version), so entries never need explicit invalidation; stale
+    versions simply age out of the LRU. The version in key is read before the
+    build, so is_current() is asked after it: if the content changed in
+    between, the result is not stored under the old key and None is returned,
+    and the caller reads the version again.
+    """
+    payload = _payloads.get(key)
+    if payload is None:
+        payload = encode_payload(build())
+        if is_current is not None and not is_current():
+            return None
+        _payloads.put(key, payload)
+    return payload
+
+
+def payload_response(payload):
+    """
+    Serve a CachedPayload with the best accepted encoding, 304s and a strong
+    ETag per content-coding: the br and gzip bodies are different
+    representations, so they get '<hash>-br' and '<hash>-gz'.
+    """
+    accepted = request.accept_encodings
+    if payload.br is not None and accepted['br']:
+        encoding, body, etag = 'br', payload.br, f'{payload.etag}-br'
+    elif accepted['gzip']:
+        encoding, body, etag = 'gzip', payload.gzip, f'{payload.etag}-gz'
+    else:
+        encoding, body, etag = None, payload.body, payload.etag
+    # Any coding's tag means the client has the current content
+    if any(tag in request.if_none_match for tag in (payload.etag, f'{payload.etag}-br', f'{payload.etag}-gz')):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Clients may keep the body but must revalidate, since content changes on upload
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def spliced_json_response(fields):
+    """
+    Respond with a JSON object built from (name, serialized value) pairs.
+
+    Cached payload bodies are embedded as-is, so only the per-request parts
+    are encoded. The result is user-specific, so it is compressed per request
+    at a fast level and never stored by shared caches.
+    """
+    body = b'{' + b','.join(dump_json(name) + b':' + value for name, value in fields) + b'}'
+    if request.accept_encodings['gzip']:
+        response = Response(gzip.compress(body, compresslevel=5), mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(body, mimetype='application/json')
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
+
+
+def response_cache_stats():
+    return _payloads.stats()
@@ -0,0 +1,48 @@
+from flask import Blueprint, request, jsonify
+
+from database.db_helper import fts_query, search_words, search_groups
+from pagination import BadQuery, DEFAULT_PAGE_SIZE, page_args, page_body
+
+search_bp = Blueprint('search', __name__)
+
+# ?type= -> (search function, id field used as the cursor tie-breaker)
+SEARCH_TYPES = {
+    'words': (search_words, 'id'),
+    'bricks': (lambda *args, **kwargs: search_groups('brick', *args, **kwargs), 'group_id'),
+    'steps': (lambda *args, **kwargs: search_groups('step', *args, **kwargs), 'group_id')
+}
+
+
+@search_bp.route('/api/search', methods=['GET'])
+def search():
+    """
+    Accent-insensitive prefix search. ?q= is free text; every term must match.
+    ?type=words (default) returns matching words, bricks or steps the groups
+    containing them. Best matches first, paginated with ?limit= and ?cursor=.
+    """
+    text = request.args.get('q', '')
+    search_type = request.args.get('type', 'words')
+    language = request.args.get('language') or None
+    try:
+        if search_type not in SEARCH_TYPES:
+            raise BadQuery(f"'type' must be one of {', '.join(SEARCH_TYPES)}")
+        if fts_query(text) is None:
+            raise BadQuery("'q' must contain at least one word")
+        limit, after = page_args(2)
+    except BadQuery as e:
+        return jsonify({'error': str(e)}), 400
+    limit = limit or DEFAULT_PAGE_SIZE
+    search_fn, id_field = SEARCH_TYPES[search_type]
+    # One extra row tells us whether there is a next page
+    results = search_fn(text, language, after=after, limit=limit + 1)
+    next_key = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_key = (results[-1]['rank'], results[-1][id_field])
+    items = []
+    for result in results:
+        item = dict(result)
+        # bm25 ranks are negative, lower is better; expose a score where higher is better
+        item['score'] = round(-item.pop('rank'), 4)
+        items.append(item)
+    return jsonify(page_body(items, limit, next_key))
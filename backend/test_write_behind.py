@@ -0,0 +1,136 @@
+import os
+import time
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import database.db_helper as db_helper
+
+# Runs the score write-behind queue against a scratch copy of duduolingo.db:
+#   python -m unittest test_write_behind
+
+
+class ScoreWriteBehindTest(unittest.TestCase):
+
+    def setUp(self):
+        from database.migrations import run_migrations
+        self.source = db_helper.DATABASE_PATH
+        self.scratch = tempfile.mkdtemp()
+        # The pool follows DATABASE_PATH
+        db_helper.DATABASE_PATH = os.path.join(self.scratch, 'duduolingo.db')
+        shutil.copy(self.source, db_helper.DATABASE_PATH)
+        run_migrations()
+        with db_helper.db_connection() as conn:
+            self.group_id = conn.execute('SELECT MIN(group_id) FROM Brick').fetchone()[0]
+            self.step_id = conn.execute('SELECT MIN(group_id) FROM Step').fetchone()[0]
+
+    def tearDown(self):
+        db_helper.db_pool.close_idle()
+        db_helper.DATABASE_PATH = self.source
+        shutil.rmtree(self.scratch)
+
+    def wait_for_flush(self, queue, flushed):
+        """Seconds until queue.flushed reaches flushed; fails after a second"""
+        started = time.monotonic()
+        while queue.stats()['flushed'] < flushed:
+            elapsed = time.monotonic() - started
+            if elapsed > 1:
+                self.fail(f"still {queue.stats()['pending']} scores pending after {elapsed:.2f}s")
+            time.sleep(0.005)
+        return time.monotonic() - started
+
+    def test_single_score_after_a_flush_is_written_on_time(self):
+        from write_behind import ScoreWriteBehind
+        queue = ScoreWriteBehind(enabled=True, max_size=256, max_wait_ms=50)
+        try:
+            queue.submit('brick', 'writebehind1', self.group_id, 10)
+            self.wait_for_flush(queue, 1)
+            # The flusher is now idle with nothing pending; one score must still go out on the timer
+            queue.submit('brick', 'writebehind2', self.group_id, 20)
+            waited = self.wait_for_flush(queue, 2)
+            # The flush interval plus scheduling slack
+            self.assertLess(waited, queue.max_wait + 0.2)
+            self.assertEqual(db_helper.get_user_score('brick', 'writebehind2', self.group_id), 20)
+        finally:
+            queue.close()
+
+    def test_reads_see_queued_and_committing_scores(self):
+        import write_behind
+        from write_behind import ScoreWriteBehind
+        queue = ScoreWriteBehind(enabled=True, max_size=256, max_wait_ms=60000)
+        saving, release = threading.Event(), threading.Event()
+        save_user_scores = write_behind.save_user_scores
+
+        def slow_save(kind, rows, conn=None):
+            save_user_scores(kind, rows, conn)
+            saving.set()
+            release.wait(1)
+
+        try:
+            self.assertEqual(queue.submit('brick', 'readwrites', self.group_id, 7.0), 7)
+            _, _, scores, total = queue.user_progress('brick', 'readwrites')
+            self.assertEqual((scores[self.group_id], total), (7, 7))
+            with mock.patch('write_behind.save_user_scores', slow_save):
+                flusher = threading.Thread(target=queue.flush)
+                flusher.start()
+                self.assertTrue(saving.wait(1))
+                # Written but not committed: the batch is read from the in-flight overlay
+                self.assertEqual(queue.stats()['inflight'], 1)
+                self.assertEqual(queue.user_total('readwrites'), 7)
+                # Readers racing the commit count the batch once, never twice or not at all
+                totals = []
+                readers = [threading.Thread(target=lambda: totals.extend(queue.user_total('readwrites')
+                                                                         for _ in range(50)))
+                           for _ in range(4)]
+                for reader in readers:
+                    reader.start()
+                release.set()
+                flusher.join()
+                for reader in readers:
+                    reader.join()
+            self.assertEqual(set(totals), {7})
+            self.assertEqual(queue.stats()['inflight'], 0)
+            self.assertEqual(db_helper.get_user_total('readwrites'), 7)
+        finally:
+            release.set()
+            queue.close()
+
+    def test_close_drains_the_queue(self):
+        from write_behind import ScoreWriteBehind
+        queue = ScoreWriteBehind(enabled=True, max_size=256, max_wait_ms=60000)
+        queue.submit('brick', 'drained', self.group_id, 4)
+        queue.submit('step', 'drained', self.step_id, 6)
+        queue.close()
+        self.assertEqual(queue.stats()['pending'], 0)
+        self.assertEqual(db_helper.get_user_score('brick', 'drained', self.group_id), 4)
+        self.assertEqual(db_helper.get_user_score('step', 'drained', self.step_id), 6)
+        self.assertEqual(db_helper.get_user_total('drained'), 10)
+        with self.assertRaises(RuntimeError):
+            queue.submit('brick', 'drained', self.group_id, 5)
+
+    def test_failed_batch_is_requeued_with_its_base(self):
+        from write_behind import ScoreWriteBehind
+        db_helper.save_user_score('brick', 'requeued', self.group_id, 5)
+        queue = ScoreWriteBehind(enabled=True, max_size=256, max_wait_ms=60000)
+        try:
+            queue.submit('brick', 'requeued', self.group_id, 10)
+            with mock.patch('write_behind.save_user_scores', side_effect=sqlite3.OperationalError('database is locked')):
+                with self.assertRaises(sqlite3.OperationalError):
+                    queue.flush()
+            self.assertEqual(queue.stats()['failed_batches'], 1)
+            self.assertEqual(queue._pending[('brick', 'requeued', self.group_id)], (10, 5))
+            # A newer answer replaces the score but keeps the stored score the batch was based on
+            self.assertEqual(queue.submit('brick', 'requeued', self.group_id, 12), 12)
+            self.assertEqual(queue._pending[('brick', 'requeued', self.group_id)], (12, 5))
+            self.assertEqual(queue.flush(), 1)
+            self.assertEqual(db_helper.get_user_score('brick', 'requeued', self.group_id), 12)
+            self.assertEqual(db_helper.get_user_total('requeued'), 12)
+        finally:
+            queue.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,249 @@
+import os
+import time
+import atexit
+import threading
+
+from database.db_helper import (db_connection, save_user_scores, get_user_score, get_user_total, get_user_progress,
+                                stored_score, PROGRESS_TABLES)
+from leaderboard import leaderboard
+
+# Off by default: every /user_brick and /user_step commits before it answers
+SCORE_WRITE_BEHIND = os.getenv('SCORE_WRITE_BEHIND', '0') == '1'
+SCORE_FLUSH_SIZE = int(os.getenv('SCORE_FLUSH_SIZE', 256))
+SCORE_FLUSH_MS = float(os.getenv('SCORE_FLUSH_MS', 50))
+
+
+class ScoreWriteBehind:
+    """
+    Write-behind queue for score submissions.
+
+    submit() records the score in memory and answers at once; a flusher thread
+    writes everything queued in one transaction when max_size scores are
+    waiting or max_wait_ms after the first one arrived. Repeated answers to the
+    same group before a flush collapse into one row.
+
+    Reads see their own writes: user_progress() and the totals submit() returns
+    overlay the queued and in-flight scores on what is in the database. Each
+    queued score remembers the stored score it replaces (its base), so the
+    total is the stored total plus the sum of (score - base). A generation
+    counter, odd while a batch is committing, lets readers retry instead of
+    counting a batch both in the database and in the overlay.
+
+    Queued scores are lost if the process dies without running close(), which
+    atexit does on a normal shutdown; that is at most one flush interval of
+    answers. A batch that fails to commit goes back in the queue and flush()
+    raises, so callers that need the scores written (resets) can stop.
+    """
+
+    def __init__(self, enabled=SCORE_WRITE_BEHIND, max_size=SCORE_FLUSH_SIZE, max_wait_ms=SCORE_FLUSH_MS):
+        self.enabled = enabled
+        self.max_size = max_size
+        self.max_wait = max_wait_ms / 1000
+        # (kind, username, group_id) -> (score, base)
+        self._pending = {}
+        self._inflight = {}
+        self._first_pending_at = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.submitted = 0
+        self.flushed = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.failed_batches = 0
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='score-write-behind', daemon=True)
+                self._thread.start()
+
+    def _stable_generation(self):
+        """Current generation once no batch is committing; call with the lock held"""
+        while self._generation % 2:
+            self._changed.wait()
+        return self._generation
+
+    def submit(self, kind, username, group_id, score):
+        """Queue a score and return the user's total including it"""
+        if kind not in PROGRESS_TABLES:
+            raise ValueError(f"Unknown score kind '{kind}'")
+        # Kept as the database will store it, so reads see the same values before and after the flush
+        score = stored_score(score)
+        key = (kind, username, group_id)
+        self._ensure_worker()
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError('Score write queue is closed')
+                queued = self._pending.get(key)
+                if queued is None and key in self._inflight:
+                    # Once the batch commits, the stored score is the in-flight one
+                    queued = (None, self._inflight[key][0])
+                if queued is not None:
+                    self._enqueue(key, score, queued[1])
+                    break
+                generation = self._stable_generation()
+            # Read outside the lock; retried if a batch committed meanwhile
+            base = get_user_score(kind, username, group_id)
+            with self._lock:
+                if self._generation == generation and key not in self._pending and key not in self._inflight:
+                    self._enqueue(key, score, base)
+                    break
+        return self.user_total(username)
+
+    def _enqueue(self, key, score, base):
+        """Call with the lock held"""
+        self._pending[key] = (score, base)
+        self.submitted += 1
+        if self._first_pending_at is None:
+            self._first_pending_at = time.monotonic()
+            # Wake the flusher from its untimed wait so it starts the max_wait timer
+            self._changed.notify_all()
+        elif len(self._pending) >= self.max_size:
+            self._changed.notify_all()
+
+    def user_total(self, username):
+        """get_user_total() with the user's queued scores applied"""
+        total, overlay = self._consistent(username, lambda: get_user_total(username))
+        return total + sum(score - base for _, score, base in overlay)
+
+    def user_progress(self, kind, username, language=None):
+        """get_user_progress() with the user's queued scores applied"""
+        if not username:
+            return get_user_progress(kind, username, language)
+        (version, groups, scores, total), overlay = self._consistent(
+            username, lambda: get_user_progress(kind, username, language))
+        if overlay:
+            scores = dict(scores)
+            for (score_kind, group_id), score, base in overlay:
+                total += score - base
+                if score_kind == kind:
+                    scores[group_id] = score
+        return version, groups, scores, total
+
+    def _consistent(self, username, read):
+        """(read(), [((kind, group_id), score, base)] for the user's in-flight then queued scores)"""
+        while True:
+            with self._lock:
+                generation = self._stable_generation()
+                overlay = [
+                    ((kind, group_id), score, base)
+                    for entries in (self._inflight, self._pending)
+                    for (kind, name, group_id), (score, base) in entries.items() if name == username
+                ]
+            result = read()
+            with self._lock:
+                if self._generation == generation:
+                    return result, overlay
+
+    def flush(self):
+        """
+        Write every queued score now, in one transaction; returns how many were
+        written. If the write fails, the batch is queued again and the error is raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+                self._first_pending_at = None
+            try:
+                with db_connection() as conn:
+                    for kind in PROGRESS_TABLES:
+                        rows = [(username, group_id, score)
+                                for (score_kind, username, group_id), (score, _) in batch.items() if score_kind == kind]
+                        if rows:
+                            save_user_scores(kind, rows, conn)
+                    with self._lock:
+                        self._generation += 1
+                    committed = False
+                    try:
+                        conn.commit()
+                        committed = True
+                    finally:
+                        with self._lock:
+                            # The batch leaves the overlay in the same step it becomes visible in the database
+                            if committed:
+                                self._inflight = {}
+                            self._generation += 1
+                            self._changed.notify_all()
+            except Exception as e:
+                with self._lock:
+                    # Put the batch back under anything queued since; keep the older base
+                    for key, (score, base) in batch.items():
+                        newer = self._pending.get(key)
+                        self._pending[key] = (newer[0], base) if newer else (score, base)
+                    self._inflight = {}
+                    if self._first_pending_at is None:
+                        self._first_pending_at = time.monotonic()
+                    self.failed_batches += 1
+                print(f"Score write-behind flush of {len(batch)} scores failed, will retry: {e}")
+                raise
+            with self._lock:
+                self.flushed += len(batch)
+                self.batches += 1
+                self.largest_batch = max(self.largest_batch, len(batch))
+        for username in {key[1] for key in batch}:
+            leaderboard.record(username)
+        return len(batch)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._closed:
+                    if len(self._pending) >= self.max_size:
+                        break
+                    if self._first_pending_at is not None:
+                        remaining = self._first_pending_at + self.max_wait - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._changed.wait(remaining)
+                    else:
+                        self._changed.wait()
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception:
+                # Requeued; back off instead of spinning on a locked database
+                time.sleep(self.max_wait)
+
+    def close(self):
+        """Stop accepting scores and drain the queue; registered with atexit"""
+        with self._lock:
+            self._closed = True
+            self._changed.notify_all()
+        for _ in range(5):
+            if not self._pending:
+                break
+            try:
+                self.flush()
+            except Exception:
+                time.sleep(self.max_wait)
+        if self._pending:
+            print(f"Score write-behind closed with {len(self._pending)} scores unwritten")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'pending': len(self._pending),
+                'inflight': len(self._inflight),
+                'submitted': self.submitted,
+                'flushed': self.flushed,
+                'batches': self.batches,
+                'largest_batch': self.largest_batch,
+                'average_batch': round(self.flushed / self.batches, 2) if self.batches else 0.0,
+                'failed_batches': self.failed_batches,
+                'max_size': self.max_size,
+                'max_wait_ms': self.max_wait * 1000
+            }
+
+
+score_queue = ScoreWriteBehind()
+atexit.register(score_queue.close)
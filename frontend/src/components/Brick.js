@@ -1,5 +1,6 @@
 import React, { useState, useEffect, useRef, useCallback } from 'react';
 import './Brick.css';
+import { requestDetection } from './detection';
 
 const Brick = ({ brickData, onWordClick, onContinue, onBrickCompleted, onBackToBricksList }) => {
   const [randomizedWords, setRandomizedWords] = useState([]);
@@ -206,22 +207,7 @@ const Brick = ({ brickData, onWordClick, onContinue, onBrickCompleted, onBackToB
     // Detection logic for Good words only
     if (word.type === 'Good' && imageRef.current && word.definition) {
       try {
-        let blob;
-        if (imageRef.current.src.startsWith('data:')) {
-          const res = await fetch(imageRef.current.src);
-          blob = await res.blob();
-        } else {
-          const canvas = document.createElement('canvas');
-          canvas.width = imageRef.current.naturalWidth;
-          canvas.height = imageRef.current.naturalHeight;
-          const ctx = canvas.getContext('2d');
-          ctx.drawImage(imageRef.current, 0, 0);
-          blob = await new Promise(resolve => canvas.toBlob(resolve, 'image/png'));
-        }
-        const formData = new FormData();
-        formData.append('file', blob, 'scene.png');
-        const url = `http://localhost:5000/detect?target=${encodeURIComponent(word.definition)}`;
-        const resp = await fetch(url, { method: 'POST', body: formData });
+        const resp = await requestDetection(imageRef.current, brickData && brickData.image_url, word.definition);
         const data = await resp.json();
         if (!resp.ok || typeof data !== 'object') throw new Error('Invalid response');
         if (data.found && Array.isArray(data.bbox) && data.bbox.length === 4) {
@@ -249,22 +235,7 @@ const Brick = ({ brickData, onWordClick, onContinue, onBrickCompleted, onBackToB
       const word = randomizedWords[idx];
       if (imageRef.current && word.definition) {
         try {
-          let blob;
-          if (imageRef.current.src.startsWith('data:')) {
-            const res = await fetch(imageRef.current.src);
-            blob = await res.blob();
-          } else {
-            const canvas = document.createElement('canvas');
-            canvas.width = imageRef.current.naturalWidth;
-            canvas.height = imageRef.current.naturalHeight;
-            const ctx = canvas.getContext('2d');
-            ctx.drawImage(imageRef.current, 0, 0);
-            blob = await new Promise(resolve => canvas.toBlob(resolve, 'image/png'));
-          }
-          const formData = new FormData();
-          formData.append('file', blob, 'scene.png');
-          const url = `http://localhost:5000/detect?target=${encodeURIComponent(word.definition)}`;
-          const resp = await fetch(url, { method: 'POST', body: formData });
+          const resp = await requestDetection(imageRef.current, brickData && brickData.image_url, word.definition);
           const data = await resp.json();
           if (resp.ok && typeof data === 'object' && data.found && Array.isArray(data.bbox) && data.bbox.length === 4) {
             drawBox(data.bbox, data.confidence, '', true); // Hide label
@@ -340,6 +311,10 @@ const Brick = ({ brickData, onWordClick, onContinue, onBrickCompleted, onBackToB
           <img 
             ref={imageRef}
             src={brickData.image_url} 
+            srcSet={brickData.image_sources ? brickData.image_sources.webp : undefined}
+            sizes="(max-width: 1024px) 100vw, 1024px"
+            width={brickData.image_width || undefined}
+            height={brickData.image_height || undefined}
             alt={brickData.brick}
             className="brick-image"
             onError={(e) => {
@@ -1,5 +1,6 @@
 import React, { useState, useEffect, useRef, useCallback } from 'react';
 import './Step.css';
+import { requestDetection } from './detection';
 
 const Step = ({ stepData, onWordClick, onContinue, onStepCompleted }) => {
   const [lockedScore, setLockedScore] = useState(null);
@@ -184,22 +185,7 @@ const Step = ({ stepData, onWordClick, onContinue, onStepCompleted }) => {
     }
     if (word.type === 'Good' && imageRef.current && word.definition) {
       try {
-        let blob;
-        if (imageRef.current.src.startsWith('data:')) {
-          const res = await fetch(imageRef.current.src);
-          blob = await res.blob();
-        } else {
-          const canvas = document.createElement('canvas');
-          canvas.width = imageRef.current.naturalWidth;
-          canvas.height = imageRef.current.naturalHeight;
-          const ctx = canvas.getContext('2d');
-          ctx.drawImage(imageRef.current, 0, 0);
-          blob = await new Promise(resolve => canvas.toBlob(resolve, 'image/png'));
-        }
-        const formData = new FormData();
-        formData.append('file', blob, 'scene.png');
-        const url = `http://localhost:5000/detect?target=${encodeURIComponent(word.definition)}`;
-        const resp = await fetch(url, { method: 'POST', body: formData });
+        const resp = await requestDetection(imageRef.current, stepData && stepData.image_url, word.definition);
         const data = await resp.json();
         if (!resp.ok || typeof data !== 'object') throw new Error('Invalid response');
         if (data.found && Array.isArray(data.bbox) && data.bbox.length === 4) {
@@ -227,22 +213,7 @@ const Step = ({ stepData, onWordClick, onContinue, onStepCompleted }) => {
       const word = randomizedWords[idx];
       if (imageRef.current && word.definition) {
         try {
-          let blob;
-          if (imageRef.current.src.startsWith('data:')) {
-            const res = await fetch(imageRef.current.src);
-            blob = await res.blob();
-          } else {
-            const canvas = document.createElement('canvas');
-            canvas.width = imageRef.current.naturalWidth;
-            canvas.height = imageRef.current.naturalHeight;
-            const ctx = canvas.getContext('2d');
-            ctx.drawImage(imageRef.current, 0, 0);
-            blob = await new Promise(resolve => canvas.toBlob(resolve, 'image/png'));
-          }
-          const formData = new FormData();
-          formData.append('file', blob, 'scene.png');
-          const url = `http://localhost:5000/detect?target=${encodeURIComponent(word.definition)}`;
-          const resp = await fetch(url, { method: 'POST', body: formData });
+          const resp = await requestDetection(imageRef.current, stepData && stepData.image_url, word.definition);
           const data = await resp.json();
           if (resp.ok && typeof data === 'object' && data.found && Array.isArray(data.bbox) && data.bbox.length === 4) {
             drawBox(data.bbox, data.confidence, '', true); // Hide label
@@ -329,6 +300,8 @@ const Step = ({ stepData, onWordClick, onContinue, onStepCompleted }) => {
           <img 
             ref={imageRef}
             src={stepData.image_url} 
+            srcSet={stepData.image_sources ? stepData.image_sources.webp : undefined}
+            sizes="320px"
             alt={`Step ${stepData.day}`}
             className="step-image"
             onError={(e) => {
@@ -392,6 +365,8 @@ const Step = ({ stepData, onWordClick, onContinue, onStepCompleted }) => {
           <img 
             ref={imageRef}
             src={stepData.image_url} 
+            srcSet={stepData.image_sources ? stepData.image_sources.webp : undefined}
+            sizes="320px"
             alt={`Step ${stepData.day}`}
             className="step-image"
             onError={(e) => {
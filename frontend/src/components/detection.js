@@ -0,0 +1,24 @@
+// Lesson images are referenced by filename so the server can reuse its decoded copy;
+// anything else (e.g. user-supplied data: URLs) is still uploaded.
+export const requestDetection = async (image, imageUrl, definition) => {
+  const target = encodeURIComponent(definition);
+  if (imageUrl && imageUrl.startsWith('/data/images/') && !image.src.startsWith('data:')) {
+    const name = encodeURIComponent(imageUrl.split('/').pop());
+    return fetch(`http://localhost:5000/detect?target=${target}&image=${name}`, { method: 'POST' });
+  }
+  let blob;
+  if (image.src.startsWith('data:')) {
+    const res = await fetch(image.src);
+    blob = await res.blob();
+  } else {
+    const canvas = document.createElement('canvas');
+    canvas.width = image.naturalWidth;
+    canvas.height = image.naturalHeight;
+    const ctx = canvas.getContext('2d');
+    ctx.drawImage(image, 0, 0);
+    blob = await new Promise(resolve => canvas.toBlob(resolve, 'image/png'));
+  }
+  const formData = new FormData();
+  formData.append('file', blob, 'scene.png');
+  return fetch(`http://localhost:5000/detect?target=${target}`, { method: 'POST', body: formData });
+};
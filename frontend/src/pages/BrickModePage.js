@@ -19,15 +19,12 @@ const BrickModePage = () => {
   const [language, setLanguage] = useState('Spanish');
 
   const [userBricks, setUserBricks] = useState([]);
+  // Highest playable level, computed by the server from the user's scores
+  const [unlockedLevel, setUnlockedLevel] = useState(null);
+  // The server filters by language, so refetch whenever it changes
   useEffect(() => {
-    fetchBricks();
-    const username = localStorage.getItem('username');
-    if (username) {
-      fetch(`http://localhost:5000/user_bricks/${username}`)
-        .then(res => res.json())
-        .then(data => setUserBricks(data.bricks || []));
-    }
-  }, []);
+    fetchBricks(language);
+  }, [language]);
 
   // Debug: log bricks and their brick_language property
   useEffect(() => {
@@ -45,12 +42,16 @@ const BrickModePage = () => {
     }
   }, [bricks, language]);
 
-  const fetchBricks = async () => {
+  // Bricks and the user's progress arrive together in one bootstrap response
+  const fetchBricks = async (brickLanguage) => {
     try {
       setLoading(true);
       console.log('Attempting to fetch bricks from backend...');
       
-      const response = await fetch('http://localhost:5000/api/bricks');
+      const username = localStorage.getItem('username') || '';
+      const response = await fetch(
+        `http://localhost:5000/api/bootstrap/bricks?language=${encodeURIComponent(brickLanguage)}&username=${encodeURIComponent(username)}`
+      );
       console.log('Response status:', response.status);
       
       if (!response.ok) {
@@ -61,7 +62,9 @@ const BrickModePage = () => {
       
       const data = await response.json();
       console.log('Fetched bricks data:', data);
-      setBricks(data);
+      setBricks(data.bricks);
+      setUserBricks(data.progress.bricks);
+      setUnlockedLevel(data.progress.unlocked_level);
     } catch (err) {
       console.error('Fetch error:', err);
       setError(err.message);
@@ -83,9 +86,10 @@ const BrickModePage = () => {
     const username = localStorage.getItem('username');
     if (username) {
       try {
-        const res = await fetch(`http://localhost:5000/user_bricks/${username}`);
+        const res = await fetch(`http://localhost:5000/user_bricks/${username}?language=${encodeURIComponent(language)}`);
         const data = await res.json();
         setUserBricks(data.bricks || []);
+        setUnlockedLevel(data.unlocked_level);
       } catch (err) {
         // Optionally handle error
       }
@@ -120,15 +124,8 @@ const BrickModePage = () => {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ username, language: validLanguage })
       });
-      setUserBricks(prev =>
-        prev.map(ub => {
-          const brick = bricks.find(b => b.group_id === ub.group_id);
-          if (brick && ((brick.brick_language && brick.brick_language === validLanguage) || (!brick.brick_language && brick.language === validLanguage))) {
-            return { ...ub, score: 0 };
-          }
-          return ub;
-        })
-      );
+      // Reload scores and the unlocked level after the reset
+      await refreshUserBricks();
       setSelectedBrick(null);
       setError(null);
       setShowResetMsg(true);
@@ -199,21 +196,7 @@ const BrickModePage = () => {
     );
   }
 
-  // Determine unlocked level
   const levels = Array.from(new Set(filteredBricks.map(b => b.level))).sort((a, b) => a - b);
-  let unlockedLevel = levels[0];
-  for (let lvl of levels) {
-    const bricksInLevel = filteredBricks.filter(b => b.level === lvl);
-    const allCompleted = bricksInLevel.every(b => {
-      const userBrick = userBricks.find(ub => ub.group_id === b.group_id);
-      return userBrick && userBrick.score && userBrick.score !== 0;
-    });
-    if (allCompleted) {
-      unlockedLevel = lvl + 1;
-    } else {
-      break;
-    }
-  }
 
   // Show bricks list view
 
@@ -6,19 +6,23 @@ const LeaderboardPage = () => {
   const [leaderboard, setLeaderboard] = useState([]);
   const [currentUser, setCurrentUser] = useState('');
   const [currentUserScore, setCurrentUserScore] = useState(null);
+  const [currentUserRank, setCurrentUserRank] = useState(null);
   const navigate = useNavigate();
 
   useEffect(() => {
     const storedUsername = localStorage.getItem('username');
     setCurrentUser(storedUsername);
-    fetch('/leaderboard')
+    // One request: the top 10 plus the current user's own rank and score
+    const query = storedUsername ? `?username=${encodeURIComponent(storedUsername)}` : '';
+    fetch(`/leaderboard${query}`)
       .then(res => res.json())
-      .then(data => setLeaderboard(data.leaderboard || []));
-    if (storedUsername) {
-      fetch(`/user_bricks/${storedUsername}`)
-        .then(res => res.json())
-        .then(data => setCurrentUserScore(data.total_score));
-    }
+      .then(data => {
+        setLeaderboard(data.leaderboard || []);
+        if (data.me) {
+          setCurrentUserScore(data.me.total_score);
+          setCurrentUserRank(data.me.rank);
+        }
+      });
   }, []);
 
   const handleReturnHome = () => {
@@ -46,9 +50,9 @@ const LeaderboardPage = () => {
             </tr>
           </thead>
           <tbody>
-            {leaderboard.map((user, idx) => (
+            {leaderboard.map(user => (
               <tr key={user.username} className={user.username === currentUser ? 'current-user-row' : ''}>
-                <td>{idx + 1}</td>
+                <td>{user.rank}</td>
                 <td>{user.username}</td>
                 <td>{user.total_score}</td>
               </tr>
@@ -56,7 +60,7 @@ const LeaderboardPage = () => {
             {/* If current user is not in top 10, show their row below */}
             {!userInLeaderboard && currentUser && currentUserScore !== null && (
               <tr className="current-user-row">
-                <td>-</td>
+                <td>{currentUserRank || '-'}</td>
                 <td>{currentUser}</td>
                 <td>{currentUserScore}</td>
               </tr>
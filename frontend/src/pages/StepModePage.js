@@ -15,18 +15,22 @@ const StepModePage = () => {
 
   useEffect(() => {
     fetchSteps();
-    fetchUserSteps();
   }, []);
 
+  // Steps and the user's progress arrive together in one bootstrap response
   const fetchSteps = async () => {
     try {
       setLoading(true);
-      const response = await fetch('http://localhost:5000/api/steps');
+      const username = localStorage.getItem('username') || '';
+      const response = await fetch(
+        `http://localhost:5000/api/bootstrap/steps?language=${encodeURIComponent(language)}&username=${encodeURIComponent(username)}`
+      );
       if (!response.ok) {
         throw new Error(`Failed to fetch steps: ${response.status} ${response.statusText}`);
       }
       const data = await response.json();
-      setSteps(data);
+      setSteps(data.steps);
+      setUserSteps(data.progress.steps);
     } catch (err) {
       setError(err.message);
     } finally {
@@ -194,6 +198,8 @@ const StepModePage = () => {
                   {step.image_url && (
                     <img 
                       src={step.image_url} 
+                      srcSet={step.image_sources ? step.image_sources.webp : undefined}
+                      sizes="100px"
                       alt={`Day ${step.day}`} 
                       className="stepmode-day-image" 
                     />